@@ -1,11 +1,26 @@
-from flask import Flask, render_template, request, make_response, jsonify, redirect, url_for
+from flask import Flask, render_template, request, make_response, jsonify, redirect, url_for, Response, send_file
 import sqlite3
 from datetime import datetime, timedelta
+import csv
+import io
 import json
 import math
+import numpy as np
 import yaml
 import time
 import os
+import tempfile
+import base64
+import hmac
+import zlib
+import urllib.request
+import urllib.error
+from urllib.parse import quote
+
+from src.core.heatmap import accumulate, load_heatmap, render_heatmap
+from src.core.inspection import ensure_inspection_table
+from src.core.partitions import (BOX_SCALE, box_rows, count_rows, create_partitions, ensure_box_table, ensure_count_tables,
+                                 ensure_detection_indexes, month_of, month_of_id)
 
 class Config:
     def __init__(self, config_path='config.yaml'):
@@ -17,28 +32,79 @@ class Config:
             self.config = yaml.safe_load(f)
 
     def save_config(self):
-        with open(self.config_path, 'w') as f:
-            yaml.dump(self.config, f)
+        """Grava o config de forma atômica; o app principal recarrega a mudança."""
+        directory = os.path.dirname(os.path.abspath(self.config_path))
+        fd, temp_path = tempfile.mkstemp(prefix='.config-', suffix='.yaml', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                yaml.dump(self.config, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.config_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
     
     @property
     def database_path(self):
         return self.config['paths']['database']
 
+    @property
+    def camera_name(self):
+        return self.config['camera'].get('name', 'camera_01')
+
+    @property
+    def stream_base_url(self):
+        streaming = self.config.get('streaming') or {}
+        host = streaming.get('host', '127.0.0.1')
+        port = streaming.get('port', 8090)
+        return f"http://{host}:{port}"
+
+    @property
+    def storage(self):
+        settings = {'partitioning': 'monthly', 'partition_dir': 'database/partitions'}
+        settings.update(self.config.get('storage') or {})
+        return settings
+
+    @property
+    def heatmap(self):
+        settings = {'directory': 'database/heatmaps', 'width': 64, 'height': 36}
+        settings.update(self.config.get('heatmap') or {})
+        return settings
+
+    @property
+    def ingest_token(self):
+        return (self.config.get('ingest') or {}).get('token') or None
+
 config = Config()
 DATABASE_PATH = config.database_path
+STREAM_BASE_URL = config.stream_base_url
+# Partições mensais das detecções (None se o banco não for particionado)
+PARTITIONS = create_partitions(config.storage)
 
 app = Flask(__name__)
 
-def get_db_connection():
+def get_db_connection(start_time=None, end_time=None, months=None, include_main=True):
     """
     Cria uma conexão com o banco de dados com timeout e configurações de segurança.
-    
+
+    Com partições mensais, anexa só as partições que se sobrepõem ao
+    intervalo (ou os meses em `months`) e une tudo nas views temporárias
+    detections, snapshots e detection_counts.
+
     Returns:
         sqlite3.Connection: Conexão com o banco de dados
     """
-    return sqlite3.connect(DATABASE_PATH, timeout=20, isolation_level=None)
+    conn = sqlite3.connect(DATABASE_PATH, timeout=20, isolation_level=None)
+    if PARTITIONS is not None:
+        if months is None:
+            months = PARTITIONS.months_between(start_time, end_time)
+        PARTITIONS.attach(conn, months, include_main)
+    return conn
 
-def execute_db_query(query, params=None, fetch_all=True):
+def execute_db_query(query, params=None, fetch_all=True, start_time=None, end_time=None, months=None,
+                     include_main=True):
     """
     Executa uma query no banco de dados com retry em caso de falha.
     
@@ -46,6 +112,9 @@ def execute_db_query(query, params=None, fetch_all=True):
         query (str): Query SQL a ser executada
         params (tuple): Parâmetros para a query
         fetch_all (bool): Se True, retorna fetchall(), se False, fetchone()
+        start_time, end_time (str): Intervalo consultado, para anexar só as partições necessárias
+        months (list): Meses a anexar, em vez do intervalo
+        include_main (bool): Se False, as views de linhas não incluem o banco principal
     
     Returns:
         list/tuple: Resultado da query
@@ -55,7 +124,7 @@ def execute_db_query(query, params=None, fetch_all=True):
     
     while retry_count < max_retries:
         try:
-            with get_db_connection() as conn:
+            with get_db_connection(start_time, end_time, months, include_main) as conn:
                 conn.execute("PRAGMA busy_timeout = 5000")  # 5 segundos de timeout
                 cursor = conn.cursor()
                 if params:
@@ -73,7 +142,90 @@ def execute_db_query(query, params=None, fetch_all=True):
                 raise e
             time.sleep(1)  # Espera 1 segundo antes de tentar novamente
 
-def get_data(limit=100, start_time=None, end_time=None, offset=0):
+def query_all_partitions(query, params=None, start_time=None, end_time=None):
+    """
+    Executa uma consulta de linhas em todas as partições do intervalo.
+
+    O SQLite anexa poucos bancos por conexão; com mais meses que o limite,
+    a consulta é executada grupo a grupo (cada linha aparece uma única vez)
+    e os resultados são concatenados. Cabe a quem chama combinar ordenação,
+    limites e somas entre os grupos.
+
+    Returns:
+        list: As linhas de todos os grupos
+    """
+    if PARTITIONS is None:
+        return execute_db_query(query, params)
+    rows = []
+    for months, include_main in PARTITIONS.groups(PARTITIONS.months_between(start_time, end_time)):
+        rows.extend(execute_db_query(query, params, months=months, include_main=include_main))
+    return rows
+
+def ensure_schema():
+    """
+    Garante as colunas, a tabela de totais arquivados e a view das análises.
+
+    O app principal cria o mesmo esquema, mas o servidor pode ser iniciado
+    antes dele em um banco de uma versão anterior. A retenção apaga
+    detecções antigas depois de somá-las em detection_rollups; a view
+    detection_counts une esses totais às detecções ativas para que os
+    relatórios cubram os meses arquivados. Os totais são por câmera e site,
+    para que os filtros das análises valham também para os meses arquivados.
+    """
+    with sqlite3.connect(DATABASE_PATH, timeout=20, isolation_level=None) as conn:
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(detections)")}
+        for name, definition in (('source_file', 'TEXT'), ('frame_time', 'REAL'), ('clip_path', 'TEXT'),
+                                 ('snapshot_id', 'INTEGER'), ('event_uid', 'TEXT'), ('camera_id', 'TEXT'),
+                                 ('site', 'TEXT')):
+            if existing and name not in existing:
+                conn.execute(f"ALTER TABLE detections ADD COLUMN {name} {definition}")
+        if existing:
+            ensure_detection_indexes(conn)
+        conn.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            camera TEXT,
+            timestamp DATETIME,
+            image_hash INTEGER,
+            image BLOB
+        )""")
+        if 'thumbnail' not in {row[1] for row in conn.execute("PRAGMA table_info(snapshots)")}:
+            conn.execute("ALTER TABLE snapshots ADD COLUMN thumbnail BLOB")
+        ensure_box_table(conn)
+        # Eventos recebidos das estações (/ingest); o uid descarta reenvios
+        conn.execute("""CREATE TABLE IF NOT EXISTS ingested_events (
+            uid TEXT PRIMARY KEY,
+            site TEXT,
+            camera TEXT,
+            timestamp DATETIME,
+            received_at DATETIME
+        )""")
+        # Totais arquivados, contagens das partições mensais e a view detection_counts
+        # (ver src/core/partitions.py)
+        ensure_count_tables(conn)
+        # Contadores de frames inspecionados, gravados pelo app principal
+        ensure_inspection_table(conn)
+
+def dimension_filter(camera=None, site=None):
+    """
+    Filtro opcional por câmera e por site, acrescentado ao WHERE das consultas.
+
+    Vale para detections, detection_counts e inspection_counts (todas têm
+    camera_id e site); sem filtros, retorna um trecho vazio.
+
+    Returns:
+        tuple: (trecho SQL começando com AND, lista de parâmetros)
+    """
+    clause = ""
+    params = []
+    if camera:
+        clause += " AND camera_id = ?"
+        params.append(camera)
+    if site:
+        clause += " AND site = ?"
+        params.append(site)
+    return clause, params
+
+def get_data(limit=100, start_time=None, end_time=None, offset=0, camera=None, site=None):
     """
     Obtém os dados de detecção de EPIs do banco de dados.
 
@@ -82,34 +234,47 @@ def get_data(limit=100, start_time=None, end_time=None, offset=0):
         start_time (str): Data e hora de início para filtrar os resultados.
         end_time (str): Data e hora de fim para filtrar os resultados.
         offset (int): Deslocamento para a paginação.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
 
     Returns:
-        list: Uma lista de tuplas contendo os dados das detecções.
+        list: Tuplas (id, timestamp, tem imagem, nome do EPI, câmera, site).
     """
+    # Só indica se há imagem; o conteúdo é servido por /image/<id>
     query = """
-        SELECT detections.id, timestamp, frame_data, epis.nome
+        SELECT detections.id, timestamp, frame_data IS NOT NULL OR snapshot_id IS NOT NULL, epis.nome,
+               camera_id, site
         FROM detections
         JOIN epis ON detections.epi_id = epis.id
+        WHERE 1 = 1
     """
     params = []
     if start_time:
-        query += " WHERE timestamp >= ?"
+        query += " AND timestamp >= ?"
         params.append(start_time)
     if end_time:
-        query += " AND timestamp <= ?" if start_time else " WHERE timestamp <= ?"
+        query += " AND timestamp <= ?"
         params.append(end_time)
-    query += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
-    
-    return execute_db_query(query, params)
+    clause, dimension_params = dimension_filter(camera, site)
+    query += clause
+    params.extend(dimension_params)
+    query += " ORDER BY timestamp DESC, detections.id DESC LIMIT ?"
+    # Cada grupo de partições devolve as suas primeiras offset + limit linhas; a página sai da junção
+    params.append(limit + offset)
 
-def get_evolution_data(start_time=None, end_time=None):
+    rows = query_all_partitions(query, params, start_time, end_time)
+    rows.sort(key=lambda row: (row[1] or '', row[0]), reverse=True)
+    return rows[offset:offset + limit]
+
+def get_evolution_data(start_time=None, end_time=None, camera=None, site=None):
     """
     Obtém os dados de evolução das detecções por dia.
 
     Args:
         start_time (str): Data e hora de início para filtrar os resultados.
         end_time (str): Data e hora de fim para filtrar os resultados.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
 
     Returns:
         list: Uma lista de tuplas contendo a data e a contagem de detecções.
@@ -119,15 +284,17 @@ def get_evolution_data(start_time=None, end_time=None):
     if not end_time:
         end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    query = """
-        SELECT strftime('%Y-%m-%d', timestamp) AS date, COUNT(*)
-        FROM detections
-        WHERE timestamp >= ? AND timestamp <= ?
+    clause, dimension_params = dimension_filter(camera, site)
+    query = f"""
+        SELECT strftime('%Y-%m-%d', timestamp) AS date, SUM(total)
+        FROM detection_counts
+        WHERE timestamp >= ? AND timestamp <= ?{clause}
         GROUP BY date
         ORDER BY date
     """
     
-    results = execute_db_query(query, (start_time, end_time))
+    results = execute_db_query(query, [start_time, end_time] + dimension_params,
+                               start_time=start_time, end_time=end_time)
     
     # Converte o formato da data para o padrão brasileiro
     formatted_results = []
@@ -138,13 +305,15 @@ def get_evolution_data(start_time=None, end_time=None):
     
     return formatted_results
 
-def get_epi_counts(start_time=None, end_time=None):
+def get_epi_counts(start_time=None, end_time=None, camera=None, site=None):
     """
     Obtém a contagem de detecções por tipo de EPI.
 
     Args:
         start_time (str): Data e hora de início para filtrar os resultados.
         end_time (str): Data e hora de fim para filtrar os resultados.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
 
     Returns:
         list: Uma lista de tuplas contendo o nome do EPI e a contagem de detecções.
@@ -155,23 +324,57 @@ def get_epi_counts(start_time=None, end_time=None):
     if not end_time:
         end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    query = """
-        SELECT epis.nome, COUNT(*)
-        FROM detections
-        JOIN epis ON detections.epi_id = epis.id
-        WHERE timestamp >= ? AND timestamp <= ?
+    clause, dimension_params = dimension_filter(camera, site)
+    query = f"""
+        SELECT epis.nome, SUM(total)
+        FROM detection_counts
+        JOIN epis ON detection_counts.epi_id = epis.id
+        WHERE timestamp >= ? AND timestamp <= ?{clause}
         GROUP BY epis.nome
-        ORDER BY COUNT(*) DESC
+        ORDER BY SUM(total) DESC
+    """
+    return execute_db_query(query, [start_time, end_time] + dimension_params,
+                            start_time=start_time, end_time=end_time)
+
+def get_camera_counts(start_time=None, end_time=None, camera=None, site=None):
+    """
+    Obtém a contagem de detecções por site e câmera.
+
+    Args:
+        start_time (str): Data e hora de início para filtrar os resultados.
+        end_time (str): Data e hora de fim para filtrar os resultados.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
+
+    Returns:
+        list: Tuplas (site, câmera, contagem); '' quando a detecção não tem site ou câmera.
+    """
+    if not start_time:
+        start_time = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    if not end_time:
+        end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    clause, dimension_params = dimension_filter(camera, site)
+    query = f"""
+        SELECT COALESCE(site, '') AS site_name, COALESCE(camera_id, '') AS camera_name, SUM(total)
+        FROM detection_counts
+        WHERE timestamp >= ? AND timestamp <= ?{clause}
+        GROUP BY site_name, camera_name
+        ORDER BY SUM(total) DESC
     """
-    return execute_db_query(query, (start_time, end_time))
+    return execute_db_query(query, [start_time, end_time] + dimension_params,
+                            start_time=start_time, end_time=end_time)
 
-def get_total_count(start_time=None, end_time=None):
+def get_total_count(start_time=None, end_time=None, include_archived=True, camera=None, site=None):
     """
     Obtém a contagem total de detecções.
 
     Args:
         start_time (str): Data e hora de início para filtrar os resultados.
         end_time (str): Data e hora de fim para filtrar os resultados.
+        include_archived (bool): Se True, soma os totais dos meses arquivados.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
 
     Returns:
         int: A contagem total de detecções.
@@ -182,8 +385,14 @@ def get_total_count(start_time=None, end_time=None):
     if not end_time:
         end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    query = "SELECT COUNT(*) FROM detections WHERE timestamp >= ? AND timestamp <= ?"
-    result = execute_db_query(query, (start_time, end_time), fetch_all=False)
+    clause, dimension_params = dimension_filter(camera, site)
+    params = [start_time, end_time] + dimension_params
+    if not include_archived:
+        # Linhas ativas: contadas em todas as partições do período, grupo a grupo
+        query = "SELECT COUNT(*) FROM detections WHERE timestamp >= ? AND timestamp <= ?"
+        return sum(row[0] for row in query_all_partitions(query + clause, params, start_time, end_time))
+    query = "SELECT COALESCE(SUM(total), 0) FROM detection_counts WHERE timestamp >= ? AND timestamp <= ?"
+    result = execute_db_query(query + clause, params, fetch_all=False, start_time=start_time, end_time=end_time)
     return result[0] if result else 0
 
 def get_detection_image(detection_id):
@@ -196,11 +405,43 @@ def get_detection_image(detection_id):
     Returns:
         bytes: Os dados da imagem, ou None se a imagem não for encontrada.
     """
-    query = "SELECT frame_data FROM detections WHERE id = ?"
-    result = execute_db_query(query, (detection_id,), fetch_all=False)
+    # Detecções novas guardam a imagem em snapshots (uma por evento);
+    # as antigas ainda têm a imagem em frame_data
+    query = """
+        SELECT COALESCE(detections.frame_data, snapshots.image)
+        FROM detections
+        LEFT JOIN snapshots ON snapshots.id = detections.snapshot_id
+        WHERE detections.id = ?
+    """
+    result = execute_db_query(query, (detection_id,), fetch_all=False, months=detection_months(detection_id))
+    return result[0] if result else None
+
+def detection_months(detection_id):
+    """Partição que contém a detecção (nenhuma, para detecções do banco principal)."""
+    month = month_of_id(detection_id)
+    return [month] if month and PARTITIONS is not None and month in PARTITIONS.months() else []
+
+def get_detection_thumbnail(detection_id):
+    """
+    Obtém a miniatura da imagem de uma detecção.
+
+    Args:
+        detection_id (int): O ID da detecção.
+
+    Returns:
+        bytes: A miniatura, a imagem completa se a detecção não tiver
+        miniatura (registros antigos), ou None se não houver imagem.
+    """
+    query = """
+        SELECT COALESCE(snapshots.thumbnail, detections.frame_data, snapshots.image)
+        FROM detections
+        LEFT JOIN snapshots ON snapshots.id = detections.snapshot_id
+        WHERE detections.id = ?
+    """
+    result = execute_db_query(query, (detection_id,), fetch_all=False, months=detection_months(detection_id))
     return result[0] if result else None
 
-def get_data_json(limit=100, start_time=None, end_time=None, offset=0):
+def get_data_json(limit=100, start_time=None, end_time=None, offset=0, camera=None, site=None):
     """
     Obtém os dados de detecção de EPIs do banco de dados e os formata para JSON.
 
@@ -209,20 +450,22 @@ def get_data_json(limit=100, start_time=None, end_time=None, offset=0):
         start_time (str): Data e hora de início para filtrar os resultados.
         end_time (str): Data e hora de fim para filtrar os resultados.
         offset (int): Deslocamento para a paginação.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
 
     Returns:
         list: Uma lista de tuplas contendo os dados das detecções.
     """
-    data = get_data(limit, start_time, end_time, offset)
+    data = get_data(limit, start_time, end_time, offset, camera, site)
     processed_data = []
     for row in data:
-        if row[2] and not isinstance(row[2], str):
+        if row[2] and isinstance(row[2], bytes):
             row = list(row)
             row[2] = row[2].decode('utf-8', errors='ignore')
         processed_data.append(row)
     return processed_data
 
-def get_monthly_comparison(start_time=None, end_time=None):
+def get_monthly_comparison(start_time=None, end_time=None, camera=None, site=None):
     """
     Obtém o total de detecções por mês para o período selecionado.
     Se nenhum período for especificado, mostra os últimos 12 meses.
@@ -230,33 +473,38 @@ def get_monthly_comparison(start_time=None, end_time=None):
     Args:
         start_time (str): Data e hora de início para filtrar os resultados.
         end_time (str): Data e hora de fim para filtrar os resultados.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
     """
+    clause, dimension_params = dimension_filter(camera, site)
     if not start_time and not end_time:
         # Se não houver datas especificadas, usa os últimos 12 meses
-        query = """
+        query = f"""
             SELECT 
                 strftime('%m', timestamp) as mes,
                 strftime('%Y', timestamp) as ano,
-                COUNT(*) as total
-            FROM detections
-            WHERE timestamp >= date('now', '-11 months')
+                SUM(total) as total
+            FROM detection_counts
+            WHERE timestamp >= date('now', '-11 months'){clause}
             GROUP BY ano, mes
             ORDER BY ano, mes
         """
-        results = execute_db_query(query)
+        since = (datetime.now().replace(day=1) - timedelta(days=31 * 11)).strftime('%Y-%m-%d %H:%M:%S')
+        results = execute_db_query(query, dimension_params, start_time=since)
     else:
         # Se houver datas especificadas, usa o período selecionado
-        query = """
+        query = f"""
             SELECT 
                 strftime('%m', timestamp) as mes,
                 strftime('%Y', timestamp) as ano,
-                COUNT(*) as total
-            FROM detections
-            WHERE timestamp >= ? AND timestamp <= ?
+                SUM(total) as total
+            FROM detection_counts
+            WHERE timestamp >= ? AND timestamp <= ?{clause}
             GROUP BY ano, mes
             ORDER BY ano, mes
         """
-        results = execute_db_query(query, (start_time, end_time))
+        results = execute_db_query(query, [start_time, end_time] + dimension_params,
+                                   start_time=start_time, end_time=end_time)
     
     meses = {
         '01': 'JAN', '02': 'FEV', '03': 'MAR', 
@@ -277,37 +525,53 @@ def get_monthly_comparison(start_time=None, end_time=None):
     
     return labels, values
 
-def get_compliance_rate(start_time=None, end_time=None):
+def get_compliance_rate(start_time=None, end_time=None, camera=None, site=None):
     """
-    Calcula a taxa de conformidade (detecções sem violações).
+    Calcula a taxa de conformidade: a porcentagem dos frames com pessoas ou
+    EPIs detectados que não tinham nenhuma violação.
+
+    Usa os contadores por minuto gravados pelo app principal
+    (inspection_counts), então o custo não depende da quantidade de frames.
+
+    Args:
+        start_time (str): Data e hora de início para filtrar os resultados.
+        end_time (str): Data e hora de fim para filtrar os resultados.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
     """
     query = """
-        SELECT 
-            COUNT(*) as total,
-            COUNT(CASE WHEN epi_id IS NULL THEN 1 END) as compliant
-        FROM detections
+        SELECT
+            COALESCE(SUM(frames_detected), 0) as detected,
+            COALESCE(SUM(frames_violation), 0) as violations
+        FROM inspection_counts
         WHERE 1=1
     """
     params = []
     if start_time:
-        query += " AND timestamp >= ?"
+        query += " AND minute >= ?"
         params.append(start_time)
     if end_time:
-        query += " AND timestamp <= ?"
+        query += " AND minute <= ?"
         params.append(end_time)
+    clause, dimension_params = dimension_filter(camera, site)
+    query += clause
+    params.extend(dimension_params)
     
-    result = execute_db_query(query, params, fetch_all=False)
+    # Tabela do banco principal: não precisa anexar partições
+    result = execute_db_query(query, params, fetch_all=False, months=[])
     if result and result[0] > 0:
-        return (result[1] / result[0]) * 100
+        return ((result[0] - result[1]) / result[0]) * 100
     return 100
 
-def get_most_common_epi(start_time=None, end_time=None):
+def get_most_common_epi(start_time=None, end_time=None, camera=None, site=None):
     """
     Obtém o EPI mais frequentemente ausente.
 
     Args:
         start_time (str): Data e hora de início para filtrar os resultados.
         end_time (str): Data e hora de fim para filtrar os resultados.
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
     """
     # Se não houver data de início especificada, usa os últimos 30 dias
     if not start_time:
@@ -315,34 +579,43 @@ def get_most_common_epi(start_time=None, end_time=None):
     if not end_time:
         end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    query = """
-        SELECT epis.nome, COUNT(*) as count
-        FROM detections
-        JOIN epis ON detections.epi_id = epis.id
-        WHERE timestamp >= ? AND timestamp <= ?
+    clause, dimension_params = dimension_filter(camera, site)
+    query = f"""
+        SELECT epis.nome, SUM(total) as count
+        FROM detection_counts
+        JOIN epis ON detection_counts.epi_id = epis.id
+        WHERE timestamp >= ? AND timestamp <= ?{clause}
         GROUP BY epis.nome
         ORDER BY count DESC
         LIMIT 1
     """
-    result = execute_db_query(query, (start_time, end_time), fetch_all=False)
+    result = execute_db_query(query, [start_time, end_time] + dimension_params, fetch_all=False,
+                              start_time=start_time, end_time=end_time)
     return result[0] if result else "Nenhum"
 
-def get_total_violations():
+def get_total_violations(camera=None, site=None):
     """
     Obtém o total geral de violações (sem filtro de data).
+
+    Args:
+        camera (str): Câmera para filtrar os resultados.
+        site (str): Site para filtrar os resultados.
     
     Returns:
         int: O número total de violações registradas.
     """
-    query = """
-        SELECT COUNT(*)
-        FROM detections
-        JOIN epis ON detections.epi_id = epis.id
+    clause, dimension_params = dimension_filter(camera, site)
+    query = f"""
+        SELECT COALESCE(SUM(total), 0)
+        FROM detection_counts
+        JOIN epis ON detection_counts.epi_id = epis.id
+        WHERE 1 = 1{clause}
     """
-    result = execute_db_query(query, fetch_all=False)
+    # Sem anexar partições: os meses particionados entram por partition_counts
+    result = execute_db_query(query, dimension_params, fetch_all=False, months=[])
     return result[0] if result else 0
 
-def get_epi_trend(epi_name, start_time=None, end_time=None):
+def get_epi_trend(epi_name, start_time=None, end_time=None, camera=None, site=None):
     """
     Calcula a tendência de violações para um EPI específico comparando com o período anterior.
     
@@ -350,6 +623,8 @@ def get_epi_trend(epi_name, start_time=None, end_time=None):
         epi_name (str): Nome do EPI para calcular a tendência
         start_time (str): Data e hora de início para filtrar os resultados
         end_time (str): Data e hora de fim para filtrar os resultados
+        camera (str): Câmera para filtrar os resultados
+        site (str): Site para filtrar os resultados
         
     Returns:
         float: Porcentagem de variação entre os períodos (positivo = aumento, negativo = diminuição)
@@ -372,33 +647,38 @@ def get_epi_trend(epi_name, start_time=None, end_time=None):
     previous_end = start_dt
     previous_start = previous_end - timedelta(days=period_days)
     
+    clause, dimension_params = dimension_filter(camera, site)
+
     # Consulta para o período atual
-    current_query = """
-        SELECT COUNT(*)
-        FROM detections
-        JOIN epis ON detections.epi_id = epis.id
+    current_query = f"""
+        SELECT COALESCE(SUM(total), 0)
+        FROM detection_counts
+        JOIN epis ON detection_counts.epi_id = epis.id
         WHERE epis.nome = ?
         AND timestamp >= ?
-        AND timestamp <= ?
+        AND timestamp <= ?{clause}
     """
     
     # Consulta para o período anterior
-    previous_query = """
-        SELECT COUNT(*)
-        FROM detections
-        JOIN epis ON detections.epi_id = epis.id
+    previous_query = f"""
+        SELECT COALESCE(SUM(total), 0)
+        FROM detection_counts
+        JOIN epis ON detection_counts.epi_id = epis.id
         WHERE epis.nome = ?
         AND timestamp >= ?
-        AND timestamp < ?
+        AND timestamp < ?{clause}
     """
     
     # Obter contagens
     current_count = execute_db_query(current_query, 
-        (epi_name, start_time, end_time), fetch_all=False)[0]
+        [epi_name, start_time, end_time] + dimension_params, fetch_all=False,
+        start_time=start_time, end_time=end_time)[0]
     
+    previous_start = previous_start.strftime('%Y-%m-%d %H:%M:%S')
+    previous_end = previous_end.strftime('%Y-%m-%d %H:%M:%S')
     previous_count = execute_db_query(previous_query,
-        (epi_name, previous_start.strftime('%Y-%m-%d %H:%M:%S'), 
-         previous_end.strftime('%Y-%m-%d %H:%M:%S')), fetch_all=False)[0]
+        [epi_name, previous_start, previous_end] + dimension_params, fetch_all=False,
+        start_time=previous_start, end_time=previous_end)[0]
     
     # Calcular a tendência
     if previous_count == 0:
@@ -409,6 +689,10 @@ def get_epi_trend(epi_name, start_time=None, end_time=None):
     trend = ((current_count - previous_count) / previous_count) * 100
     return round(trend, 1)
 
+def request_dimensions():
+    """Filtros de câmera e site da requisição (query string ou formulário)."""
+    return request.values.get('camera') or None, request.values.get('site') or None
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     """
@@ -416,16 +700,17 @@ def index():
     """
     start_time = request.form.get('start_time')
     end_time = request.form.get('end_time')
+    camera, site = request_dimensions()
 
-    data = get_data(limit=5, start_time=start_time, end_time=end_time)
-    epi_counts = get_epi_counts(start_time=start_time, end_time=end_time)
-    total_detections = get_total_count(start_time=start_time, end_time=end_time)
+    data = get_data(limit=5, start_time=start_time, end_time=end_time, camera=camera, site=site)
+    epi_counts = get_epi_counts(start_time=start_time, end_time=end_time, camera=camera, site=site)
+    total_detections = get_total_count(start_time=start_time, end_time=end_time, camera=camera, site=site)
 
     last_detection = data[0] if data else None
 
     processed_data = []
     for row in data:
-        if row[2] and not isinstance(row[2], str):
+        if row[2] and isinstance(row[2], bytes):
             row = list(row)
             row[2] = row[2].decode('utf-8', errors='ignore')
         processed_data.append(row)
@@ -434,7 +719,7 @@ def index():
     counts = [item[1] for item in epi_counts]
     chart_data = json.dumps({"labels": labels, "counts": counts})
 
-    evolution_data = get_evolution_data(start_time=start_time, end_time=end_time)
+    evolution_data = get_evolution_data(start_time=start_time, end_time=end_time, camera=camera, site=site)
     evolution_labels = [item[0] for item in evolution_data]
     evolution_counts = [item[1] for item in evolution_data]
     evolution_chart_data = json.dumps({"labels": evolution_labels, "counts": evolution_counts})
@@ -455,17 +740,20 @@ def detections():
     """
     start_time = request.form.get('start_time')
     end_time = request.form.get('end_time')
+    camera, site = request_dimensions()
     page = request.args.get('page', 1, type=int)
     per_page = 15
     offset = (page - 1) * per_page
 
     data = get_data(limit=per_page, start_time=start_time,
-                    end_time=end_time, offset=offset)
-    total_detections = get_total_count(start_time=start_time, end_time=end_time)
+                    end_time=end_time, offset=offset, camera=camera, site=site)
+    # A paginação só considera as detecções ativas (as arquivadas não têm linhas)
+    total_detections = get_total_count(start_time=start_time, end_time=end_time, include_archived=False,
+                                       camera=camera, site=site)
 
     processed_data = []
     for row in data:
-        if row[2] and not isinstance(row[2], str):  # Fixed extra parenthesis
+        if row[2] and isinstance(row[2], bytes):  # Fixed extra parenthesis
             row = list(row)
             row[2] = row[2].decode('utf-8', errors='ignore')
         processed_data.append(row)
@@ -498,15 +786,16 @@ def analytics():
         start_time = start_time.replace('T', ' ') + ':00'
     if end_time:
         end_time = end_time.replace('T', ' ') + ':00'
+    camera, site = request_dimensions()
 
     # Obter dados para os cards e gráficos
-    total_detections = get_total_count(start_time=start_time, end_time=end_time)
-    violations_count = get_total_violations()  # Agora usa o total geral sem filtro
-    compliance_rate = get_compliance_rate(start_time=start_time, end_time=end_time)
-    most_common_epi = get_most_common_epi(start_time=start_time, end_time=end_time)
+    total_detections = get_total_count(start_time=start_time, end_time=end_time, camera=camera, site=site)
+    violations_count = get_total_violations(camera, site)  # Total geral, sem filtro de data
+    compliance_rate = get_compliance_rate(start_time=start_time, end_time=end_time, camera=camera, site=site)
+    most_common_epi = get_most_common_epi(start_time=start_time, end_time=end_time, camera=camera, site=site)
 
     # Dados para o gráfico de tendência
-    trend_data = get_evolution_data(start_time=start_time, end_time=end_time)
+    trend_data = get_evolution_data(start_time=start_time, end_time=end_time, camera=camera, site=site)
     trend_labels = [item[0] for item in trend_data]
     trend_counts = [item[1] for item in trend_data]
     
@@ -524,19 +813,20 @@ def analytics():
     }
     
     # Dados para o gráfico de pizza
-    pie_data = get_epi_counts(start_time=start_time, end_time=end_time)
+    pie_data = get_epi_counts(start_time=start_time, end_time=end_time, camera=camera, site=site)
     pie_labels = [item[0] for item in pie_data]
     pie_counts = [item[1] for item in pie_data]
     
     # Dados para o gráfico mensal
-    monthly_labels, monthly_values = get_monthly_comparison(start_time=start_time, end_time=end_time)
+    monthly_labels, monthly_values = get_monthly_comparison(start_time=start_time, end_time=end_time,
+                                                            camera=camera, site=site)
 
     # Resumo por EPI
     epi_summary = []
     total_violations = sum(count for _, count in pie_data)
     for epi, count in pie_data:
         percentage = (count / total_violations * 100) if total_violations > 0 else 0
-        trend = get_epi_trend(epi, start_time, end_time)  # Calcula a tendência real
+        trend = get_epi_trend(epi, start_time, end_time, camera, site)  # Calcula a tendência real
         epi_summary.append({
             'name': epi,
             'count': count,
@@ -573,9 +863,11 @@ def get_data_for_update():
     """
     start_time = request.args.get('start_time')
     end_time = request.args.get('end_time')
-    data = get_data_json(start_time=start_time, end_time=end_time)
-    epi_counts = get_epi_counts(start_time=start_time, end_time=end_time)
-    evolution_data = get_evolution_data(start_time=start_time, end_time=end_time)  # Adicionado
+    camera, site = request_dimensions()
+    data = get_data_json(start_time=start_time, end_time=end_time, camera=camera, site=site)
+    epi_counts = get_epi_counts(start_time=start_time, end_time=end_time, camera=camera, site=site)
+    evolution_data = get_evolution_data(start_time=start_time, end_time=end_time, camera=camera, site=site)
+    camera_counts = get_camera_counts(start_time=start_time, end_time=end_time, camera=camera, site=site)
 
     labels = [item[0] for item in epi_counts]
     counts = [item[1] for item in epi_counts]
@@ -585,12 +877,14 @@ def get_data_for_update():
     evolution_counts = [item[1] for item in evolution_data]  # Adicionado
     evolution_chart_data = {"labels": evolution_labels, "counts": evolution_counts}  # Adicionado
 
-    total_detections = get_total_count(start_time=start_time, end_time=end_time)  # Adicionado
+    total_detections = get_total_count(start_time=start_time, end_time=end_time,
+                                       camera=camera, site=site)  # Adicionado
 
     return jsonify({
         "data": data,
         "chart_data": chart_data,
         "evolution_chart_data": evolution_chart_data,  # Adicionado
+        "camera_counts": [{"site": row[0], "camera": row[1], "count": row[2]} for row in camera_counts],
         "total_detections": total_detections  # Adicionado
     })
 
@@ -603,6 +897,43 @@ def about():
                          now=datetime.now(),
                          active_page='about')
 
+@app.route('/live')
+def live():
+    """
+    Rota para a página de visualização ao vivo da câmera.
+    """
+    return render_template('live.html',
+                         now=datetime.now(),
+                         camera=config.camera_name,
+                         active_page='live')
+
+@app.route('/stream/<camera>')
+def stream(camera):
+    """
+    Rota que repassa o MJPEG anotado publicado pelo app principal.
+
+    O app principal codifica cada frame uma única vez; aqui os bytes são
+    apenas repassados ao navegador, sem decodificar nem recodificar.
+    """
+    try:
+        upstream = urllib.request.urlopen(f"{STREAM_BASE_URL}/stream/{quote(camera)}", timeout=10)
+    except (urllib.error.URLError, OSError):
+        return "Transmissão indisponível", 503
+
+    def generate():
+        try:
+            while True:
+                chunk = upstream.read1(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            upstream.close()
+
+    return Response(generate(),
+                    mimetype=upstream.headers.get('Content-Type'),
+                    headers={'Cache-Control': 'no-cache, private'})
+
 @app.route('/image/<int:detection_id>')
 def display_image(detection_id):
     """
@@ -615,5 +946,364 @@ def display_image(detection_id):
         return response
     return "Imagem não encontrada", 404
 
+@app.route('/thumbnail/<int:detection_id>')
+def display_thumbnail(detection_id):
+    """
+    Rota para exibir a miniatura da imagem de uma detecção.
+    """
+    image_data = get_detection_thumbnail(detection_id)
+    if image_data:
+        response = make_response(image_data)
+        response.headers.set('Content-Type', 'image/jpeg')
+        return response
+    return "Imagem não encontrada", 404
+
+def get_heatmap_from_boxes(camera, start_time=None, end_time=None):
+    """
+    Monta o mapa de calor da câmera a partir das caixas gravadas.
+
+    Usado para períodos específicos e para câmeras sem mapa acumulado
+    (ex.: câmeras de outras estações); lê só a tabela compacta de caixas.
+
+    Returns:
+        numpy.ndarray: A grade do mapa, ou None se a câmera não tiver caixas.
+    """
+    query = """
+        SELECT detection_boxes.x1, detection_boxes.y1, detection_boxes.x2, detection_boxes.y2
+        FROM detection_boxes
+        JOIN detections ON detections.id = detection_boxes.detection_id
+        WHERE detections.camera_id = ?
+    """
+    params = [camera]
+    if start_time:
+        query += " AND timestamp >= ?"
+        params.append(start_time)
+    if end_time:
+        query += " AND timestamp <= ?"
+        params.append(end_time)
+    rows = query_all_partitions(query, params, start_time, end_time)
+    if not rows:
+        return None
+    settings = config.heatmap
+    grid = np.zeros((settings['height'], settings['width']), dtype=np.float32)
+    accumulate(grid, [[value / BOX_SCALE for value in row] for row in rows])
+    return grid
+
+def get_camera_background(camera):
+    """Imagem de evidência mais recente da câmera, usada como fundo do mapa de calor."""
+    query = """
+        SELECT image FROM snapshots
+        WHERE camera = ? AND image IS NOT NULL
+        ORDER BY timestamp DESC
+        LIMIT 1
+    """
+    months = PARTITIONS.months()[-1:] if PARTITIONS is not None else None
+    result = execute_db_query(query, (camera,), fetch_all=False, months=months)
+    return result[0] if result else None
+
+@app.route('/heatmap/<camera>')
+def heatmap(camera):
+    """
+    Rota que renderiza o mapa de calor das violações de uma câmera (JPEG).
+
+    Sem período, usa o mapa acumulado pelo app principal, sem consultar as
+    detecções; com start/end (ou sem mapa salvo), soma as caixas gravadas.
+    Parâmetros: start, end, width e background=0 para omitir a imagem de fundo.
+    """
+    start_time = normalize_datetime(request.args.get('start'))
+    end_time = normalize_datetime(request.args.get('end'), end=True)
+    width = min(max(request.args.get('width', 640, type=int), 64), 1920)
+
+    grid = None
+    if not start_time and not end_time:
+        grid = load_heatmap(config.heatmap['directory'], camera)
+    if grid is None:
+        grid = get_heatmap_from_boxes(camera, start_time, end_time)
+    if grid is None:
+        return "Mapa de calor não encontrado", 404
+
+    background = get_camera_background(camera) if request.args.get('background', '1') != '0' else None
+    response = make_response(render_heatmap(grid, background, width))
+    response.headers.set('Content-Type', 'image/jpeg')
+    response.headers.set('Cache-Control', 'no-cache')
+    return response
+
+MAX_INGEST_BYTES = 64 * 1024 * 1024
+
+def ingest_events(site, events):
+    """
+    Grava um lote de eventos enviado por uma estação, em uma única transação.
+
+    Args:
+        site (str): Nome da estação que enviou o lote.
+        events (list): Eventos com uid, camera, timestamp, epis, boxes e image (base64, opcional).
+
+    Returns:
+        tuple: (eventos gravados, eventos repetidos ignorados).
+    """
+    accepted = 0
+    duplicates = 0
+    # Com partições, cada mês é gravado na sua partição, em uma transação própria
+    groups = {}
+    for event in events:
+        groups.setdefault(month_of(event['timestamp']) if PARTITIONS is not None else None, []).append(event)
+    conn = sqlite3.connect(DATABASE_PATH, timeout=20, isolation_level=None)
+    try:
+        conn.execute("PRAGMA busy_timeout = 5000")
+        for month, month_events in groups.items():
+            schema = PARTITIONS.attach_for_write(conn, month) if month is not None else 'main'
+            month_accepted, month_duplicates = _ingest_month(conn, schema, site, month_events, month is not None)
+            accepted += month_accepted
+            duplicates += month_duplicates
+    finally:
+        conn.close()
+    return accepted, duplicates
+
+def _ingest_month(conn, schema, site, events, partitioned):
+    accepted = 0
+    duplicates = 0
+    received_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    epi_ids = {}
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for event in events:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO ingested_events (uid, site, camera, timestamp, received_at) VALUES (?, ?, ?, ?, ?)",
+                (event['uid'], site, event.get('camera'), event['timestamp'], received_at)
+            )
+            if cursor.rowcount == 0:
+                # Reenvio de um lote já gravado (a estação não recebeu a confirmação)
+                duplicates += 1
+                continue
+
+            snapshot_id = None
+            if event.get('image'):
+                snapshot_id = conn.execute(
+                    f"INSERT INTO {schema}.snapshots (camera, timestamp, image) VALUES (?, ?, ?)",
+                    (event.get('camera'), event['timestamp'], base64.b64decode(event['image']))
+                ).lastrowid
+            for epi_name in event.get('epis') or []:
+                if epi_name not in epi_ids:
+                    row = conn.execute("SELECT id FROM epis WHERE nome = ?", (epi_name,)).fetchone()
+                    epi_ids[epi_name] = row[0] if row else conn.execute(
+                        "INSERT INTO epis (nome) VALUES (?)", (epi_name,)
+                    ).lastrowid
+                detection_id = conn.execute(
+                    f"""INSERT INTO {schema}.detections (timestamp, epi_id, snapshot_id, event_uid, camera_id, site)
+                    VALUES (?, ?, ?, ?, ?, ?)""",
+                    (event['timestamp'], epi_ids[epi_name], snapshot_id, event['uid'], event.get('camera'), site)
+                ).lastrowid
+                conn.executemany(
+                    f"INSERT INTO {schema}.detection_boxes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    box_rows(detection_id, epi_name, event.get('boxes'))
+                )
+            if partitioned:
+                count_rows(conn, [(event['timestamp'], epi_ids[epi_name], event.get('camera'), site)
+                                  for epi_name in event.get('epis') or []])
+            accepted += 1
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return accepted, duplicates
+
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    """
+    Rota que recebe lotes de eventos das estações (JSON, opcionalmente gzip).
+
+    Corpo: {"site": "...", "events": [{"uid", "camera", "timestamp", "epis", "boxes", "image"}]}.
+    Sem ingest.token configurado a rota fica desativada: o servidor escuta
+    em todas as interfaces e aceitaria detecções de qualquer máquina.
+    """
+    token = config.ingest_token
+    if not token:
+        return jsonify({"error": "recebimento desativado: configure ingest.token no servidor"}), 503
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'),
+                               f"Bearer {token}".encode('utf-8')):
+        return jsonify({"error": "não autorizado"}), 401
+
+    body = request.get_data()
+    if request.headers.get('Content-Encoding') == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_INGEST_BYTES)
+        except zlib.error:
+            return jsonify({"error": "gzip inválido"}), 400
+        if decompressor.unconsumed_tail:
+            return jsonify({"error": "lote muito grande"}), 413
+
+    try:
+        payload = json.loads(body)
+        site = str(payload.get('site') or '')
+        events = payload['events']
+        if not isinstance(events, list) or not all(
+                isinstance(event, dict) and event.get('uid') and event.get('timestamp') for event in events):
+            raise ValueError("eventos sem uid ou timestamp")
+        for event in events:
+            epis = event.get('epis') or []
+            if not isinstance(epis, list) or not all(isinstance(epi, str) and epi for epi in epis):
+                raise ValueError("epis deve ser uma lista de nomes")
+        accepted, duplicates = ingest_events(site, events)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"lote inválido: {e}"}), 400
+    except sqlite3.Error as e:
+        print(f"Erro ao gravar eventos recebidos de {site}: {e}")
+        return jsonify({"error": "erro no banco"}), 503
+    return jsonify({"accepted": accepted, "duplicates": duplicates})
+
+EXPORT_COLUMNS = ['id', 'timestamp', 'epi', 'source_file', 'frame_time', 'camera_id', 'site']
+EXPORT_CHUNK_SIZE = 1000
+
+def normalize_datetime(value, end=False):
+    """
+    Converte datas vindas da URL ou de formulários para o formato do banco.
+
+    Aceita 'AAAA-MM-DD', 'AAAA-MM-DDTHH:MM' e 'AAAA-MM-DD HH:MM:SS'. Com
+    end=True, uma data sem horário é o fim do período e cobre o dia inteiro.
+    """
+    if not value:
+        return None
+    value = value.replace('T', ' ')
+    if len(value) == 10:
+        value += ' 23:59:59.999' if end else ' 00:00:00'
+    elif len(value) == 16:
+        value += ':00'
+    return value
+
+def iter_export_rows(start_time=None, end_time=None, chunk_size=EXPORT_CHUNK_SIZE, camera=None, site=None):
+    """
+    Percorre as detecções do período em blocos, em ordem de id.
+
+    Cada bloco é lido em uma consulta curta que continua a partir do último
+    id entregue, então a memória usada é constante e nenhuma leitura longa
+    mantém o banco bloqueado para o gravador durante a exportação.
+
+    Yields:
+        tuple: (id, timestamp, nome do EPI, arquivo de origem, posição no vídeo, câmera, site,
+                tem imagem, tem clipe)
+    """
+    # Banco principal e depois cada partição, em ordem: os ids das partições
+    # crescem com o mês, então a ordem de id se mantém entre os blocos
+    groups = [None]
+    if PARTITIONS is not None:
+        groups = [[]] + [[month] for month in PARTITIONS.months_between(start_time, end_time)]
+    last_id = 0
+    for months in groups:
+        while True:
+            query = """
+                SELECT detections.id, timestamp, epis.nome, source_file, frame_time, camera_id, site,
+                       frame_data IS NOT NULL OR snapshot_id IS NOT NULL, clip_path IS NOT NULL
+                FROM detections
+                LEFT JOIN epis ON detections.epi_id = epis.id
+                WHERE detections.id > ?
+            """
+            params = [last_id]
+            if start_time:
+                query += " AND timestamp >= ?"
+                params.append(start_time)
+            if end_time:
+                query += " AND timestamp <= ?"
+                params.append(end_time)
+            clause, dimension_params = dimension_filter(camera, site)
+            query += clause
+            params.extend(dimension_params)
+            query += " ORDER BY detections.id LIMIT ?"
+            params.append(chunk_size)
+
+            rows = execute_db_query(query, params, months=months)
+            if not rows:
+                break
+            yield from rows
+            last_id = rows[-1][0]
+
+@app.route('/export')
+def export():
+    """
+    Rota de exportação completa do histórico, em CSV ou NDJSON.
+
+    Parâmetros: start, end, camera, site, format=csv|ndjson e images=none|link. As linhas
+    são geradas em streaming direto do banco, sem montar o arquivo em memória.
+    """
+    start_time = normalize_datetime(request.args.get('start'))
+    end_time = normalize_datetime(request.args.get('end'), end=True)
+    camera, site = request_dimensions()
+    export_format = request.args.get('format', 'csv')
+    include_links = request.args.get('images', 'none') == 'link'
+
+    if export_format not in ('csv', 'ndjson'):
+        return "Formato inválido (use csv ou ndjson)", 400
+
+    columns = EXPORT_COLUMNS + (['image_url', 'clip_url'] if include_links else [])
+    base_url = request.url_root.rstrip('/')
+
+    def to_record(row):
+        record = list(row[:7])
+        if include_links:
+            record.append(f"{base_url}/image/{row[0]}" if row[7] else None)
+            record.append(f"{base_url}/clip/{row[0]}" if row[8] else None)
+        return record
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for count, row in enumerate(iter_export_rows(start_time, end_time, camera=camera, site=site), 1):
+            writer.writerow(to_record(row))
+            if count % EXPORT_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    def generate_ndjson():
+        lines = []
+        for row in iter_export_rows(start_time, end_time, camera=camera, site=site):
+            lines.append(json.dumps(dict(zip(columns, to_record(row))), ensure_ascii=False))
+            if len(lines) >= EXPORT_CHUNK_SIZE:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    filename = f"deteccoes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    if export_format == 'csv':
+        generator, mimetype = generate_csv(), 'text/csv'
+    else:
+        generator, mimetype = generate_ndjson(), 'application/x-ndjson'
+
+    return Response(generator,
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def get_detection_clip(detection_id):
+    """
+    Obtém o caminho do clipe de vídeo de uma detecção específica.
+
+    Args:
+        detection_id (int): O ID da detecção.
+
+    Returns:
+        str: O caminho do clipe, ou None se a detecção não tiver clipe.
+    """
+    query = "SELECT clip_path FROM detections WHERE id = ?"
+    try:
+        result = execute_db_query(query, (detection_id,), fetch_all=False, months=detection_months(detection_id))
+    except sqlite3.OperationalError:
+        # Banco ainda sem a coluna clip_path
+        return None
+    return result[0] if result else None
+
+@app.route('/clip/<int:detection_id>')
+def display_clip(detection_id):
+    """
+    Rota para baixar o clipe (pré e pós-gravação) de uma detecção.
+    """
+    clip_path = get_detection_clip(detection_id)
+    if clip_path and os.path.exists(clip_path):
+        return send_file(os.path.abspath(clip_path), conditional=True)
+    return "Clipe não encontrado", 404
+
 if __name__ == '__main__':
+    ensure_schema()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
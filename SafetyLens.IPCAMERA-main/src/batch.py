@@ -0,0 +1,299 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import cv2
+
+from src.core.config import Config
+from src.core.database import DatabaseManager
+from src.core.detection import EPIDetector, StubModel
+from src.core.inference import InferenceClient, service_supported
+from src.core.partitions import create_partitions
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.ts')
+
+# Detector carregado uma vez por processo do pool
+_detector = None
+
+
+def _init_worker(model_path, min_confidence, stub_model, threads_per_worker, service=None):
+    """
+    Inicializa um processo do pool: limita as threads e carrega o modelo.
+
+    Com `service` (caminho do socket do serviço de inferência), o processo
+    não carrega o modelo: envia os frames ao serviço, que junta os lotes de
+    todos os processos.
+    """
+    global _detector
+    # Cada processo já é uma unidade de paralelismo; evita disputar os núcleos
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+    model = StubModel() if stub_model else None
+    client = InferenceClient(*service) if service and model is None else None
+    # Sem o log de classes de cada frame: o progresso é mostrado pelo processo principal
+    _detector = EPIDetector(model_path, min_confidence, model=model, service=client, verbose=False)
+
+
+def find_videos(paths, extensions=VIDEO_EXTENSIONS):
+    """Expande arquivos e pastas (recursivamente) na lista de vídeos a analisar."""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(extensions):
+                        videos.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"⚠️ Caminho ignorado (não encontrado): {path}")
+    return videos
+
+
+def probe_video(path):
+    """Retorna (fps, total de frames) de um vídeo, ou None se não abrir."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, frame_count
+
+
+def plan_chunks(path, fps, frame_count, chunk_seconds):
+    """Divide um vídeo em trechos independentes para distribuir entre os processos."""
+    chunk_frames = max(1, int(chunk_seconds * fps))
+    if frame_count <= 0:
+        # Contagem desconhecida: o vídeo inteiro vira um único trecho
+        return [(path, 0, None)]
+    return [
+        (path, start, min(start + chunk_frames, frame_count))
+        for start in range(0, frame_count, chunk_frames)
+    ]
+
+
+def analyze_chunk(path, start_frame, end_frame, stride, batch_size, cooldown, save_images):
+    """
+    Analisa um trecho de vídeo em um processo do pool.
+
+    Decodifica com passo `stride` (os frames pulados são apenas avançados
+    com grab(), sem conversão de cor) e agrupa os frames em lotes para o
+    modelo. Retorna as detecções candidatas e a quantidade de frames lidos.
+
+    O intervalo mínimo entre registros de cada EPI é aplicado pelo processo
+    principal, sobre o vídeo inteiro, pois depende do último registro do
+    trecho anterior. Aqui só são descartadas as detecções que não seriam
+    registradas qualquer que fosse esse registro: para cada EPI, acompanha
+    as sequências de registros que começam em cada detecção do primeiro
+    `cooldown` de segundos do trecho (uma delas é a sequência real) e
+    devolve só as detecções que fazem parte de alguma.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return path, [], 0
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    detections = []
+    # EPI -> horários do último registro de cada sequência possível
+    chains = {}
+    head_end = start_frame / fps + cooldown
+    analyzed = 0
+    batch = []
+    batch_times = []
+
+    def flush():
+        for (frame, missing_epis, found_classes), frame_time in zip(_detector.detect_batch(batch), batch_times):
+            if not missing_epis:
+                continue
+            candidates = []
+            for cls in sorted({cls for cls in found_classes if cls in _detector.ausentes_ids}):
+                lasts = chains.setdefault(cls, set())
+                advanced = {last for last in lasts if frame_time - last >= cooldown}
+                if advanced or not lasts or frame_time < head_end:
+                    # Sequências que avançam aqui passam a coincidir
+                    lasts -= advanced
+                    lasts.add(frame_time)
+                    candidates.append(cls)
+            if not candidates:
+                continue
+            frame_data = None
+            if save_images:
+                _, encoded = cv2.imencode('.jpg', frame)
+                frame_data = encoded.tobytes()
+            detections.append((frame_time, candidates, frame_data))
+        batch.clear()
+        batch_times.clear()
+
+    index = start_frame
+    try:
+        while end_frame is None or index < end_frame:
+            if (index - start_frame) % stride:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            batch.append(frame)
+            batch_times.append(index / fps)
+            analyzed += 1
+            index += 1
+
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        cap.release()
+
+    return path, detections, analyzed
+
+
+def apply_cooldown(detections, cooldown):
+    """
+    Aplica o intervalo mínimo entre registros de cada EPI às detecções de
+    todos os trechos de um vídeo, em ordem de tempo de vídeo.
+    """
+    last_logged = {}
+    logged = []
+    for frame_time, candidates, frame_data in sorted(detections, key=lambda detection: detection[0]):
+        due = [cls for cls in candidates if frame_time - last_logged.get(cls, -cooldown) >= cooldown]
+        if not due:
+            continue
+        for cls in due:
+            last_logged[cls] = frame_time
+        logged.append((frame_time, due, frame_data))
+    return logged
+
+
+def recording_start(path, duration):
+    """Estima o início da gravação: data de modificação menos a duração."""
+    return datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=duration)
+
+
+def main(argv=None):
+    """
+    Analisa gravações em lote e grava as detecções no banco.
+
+    Uso: python -m src.batch ARQUIVO_OU_PASTA [...] [--workers N] [--sample-fps 2]
+    """
+    parser = argparse.ArgumentParser(description="SafetyLens - análise em lote de vídeos gravados")
+    parser.add_argument('paths', nargs='+', help="Arquivos de vídeo ou pastas")
+    parser.add_argument('--config', default='config.yaml', help="Caminho do arquivo de configuração")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processos de análise")
+    parser.add_argument('--sample-fps', type=float, default=2.0, help="Frames analisados por segundo de vídeo")
+    parser.add_argument('--batch-size', type=int, default=8, help="Frames por chamada ao modelo")
+    parser.add_argument('--chunk-seconds', type=float, default=300.0,
+                        help="Duração de cada trecho distribuído entre os processos")
+    parser.add_argument('--cooldown', type=float,
+                        help="Intervalo mínimo (s de vídeo) entre registros do mesmo EPI (padrão: alerts.delay_time)")
+    parser.add_argument('--recorded-at',
+                        help="Início da gravação (AAAA-MM-DD HH:MM:SS), só com um único vídeo; "
+                             "padrão: estimado pela data do arquivo")
+    parser.add_argument('--no-images', action='store_true', help="Não grava a imagem das detecções")
+    parser.add_argument('--stub-model', action='store_true', help="Usa um modelo falso, sem o best.pt")
+    args = parser.parse_args(argv)
+
+    config = Config(args.config)
+    extensions = tuple(set(VIDEO_EXTENSIONS) | {'.' + config.video_format})
+    videos = find_videos(args.paths, extensions)
+    if not videos:
+        print("Nenhum vídeo encontrado.")
+        return
+    if args.recorded_at and len(videos) > 1:
+        parser.error(f"--recorded-at vale para um único vídeo ({len(videos)} encontrados)")
+
+    cooldown = args.cooldown if args.cooldown is not None else max(1, config.delay_time)
+    inference = config.inference
+    service = None
+    if inference['service'] and service_supported() and not args.stub_model:
+        service = (inference['socket'], inference['timeout'])
+        InferenceClient(*service).wait_ready().close()
+    workers = max(1, args.workers)
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    chunks = []
+    starts = {}
+    total_seconds = 0.0
+    for video in videos:
+        info = probe_video(video)
+        if info is None:
+            print(f"❌ Não foi possível abrir: {video}")
+            continue
+        fps, frame_count = info
+        duration = frame_count / fps if frame_count > 0 else 0
+        total_seconds += duration
+        stride = max(1, int(round(fps / args.sample_fps)))
+        if args.recorded_at:
+            starts[video] = datetime.strptime(args.recorded_at, '%Y-%m-%d %H:%M:%S')
+        else:
+            starts[video] = recording_start(video, duration)
+        for chunk in plan_chunks(video, fps, frame_count, args.chunk_seconds):
+            chunks.append(chunk + (stride,))
+    # Trechos ainda em análise e detecções já recebidas de cada vídeo
+    remaining = {}
+    for path, _, _, _ in chunks:
+        remaining[path] = remaining.get(path, 0) + 1
+    collected = {path: [] for path in remaining}
+
+    db = DatabaseManager(config.database_path, partitions=create_partitions(config.storage), site=config.site)
+    started = time.perf_counter()
+    analyzed_total = 0
+    logged_total = 0
+
+    print(f"Analisando {len(videos)} vídeo(s) em {len(chunks)} trecho(s) com {workers} processo(s)...")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(config.model_path, config.min_confidence, args.stub_model, threads_per_worker, service)
+    ) as pool:
+        futures = {
+            pool.submit(analyze_chunk, path, start, end, stride, args.batch_size, cooldown, not args.no_images): path
+            for path, start, end, stride in chunks
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            remaining[path] -= 1
+            try:
+                _, detections, analyzed = future.result()
+            except Exception as e:
+                print(f"❌ Erro ao analisar trecho de {os.path.basename(path)}: {e}")
+                detections, analyzed = [], 0
+            else:
+                analyzed_total += analyzed
+                print(f"[{done}/{len(futures)}] {os.path.basename(path)}: {analyzed} frames")
+            collected[path].extend(detections)
+            if remaining[path]:
+                continue
+
+            # Todos os trechos do vídeo prontos: o intervalo entre registros vale para o vídeo inteiro
+            start = starts[path]
+            rows = [
+                ((start + timedelta(seconds=frame_time)).strftime("%Y-%m-%d %H:%M:%S"),
+                 found_classes, frame_data, os.path.abspath(path), round(frame_time, 3))
+                for frame_time, found_classes, frame_data in apply_cooldown(collected.pop(path), cooldown)
+            ]
+            logged_total += db.log_detections_batch(rows)
+            print(f"📼 {os.path.basename(path)}: {len(rows)} detecções")
+
+    db.close()
+    elapsed = time.perf_counter() - started
+    speed = total_seconds / elapsed if elapsed > 0 else 0
+    print(f"✅ {analyzed_total} frames analisados, {logged_total} registros gravados em {elapsed:.1f}s "
+          f"({speed:.1f}x tempo real)")
+
+
+if __name__ == "__main__":
+    main()
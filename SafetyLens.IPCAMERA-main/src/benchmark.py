@@ -0,0 +1,289 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+
+from src.core import buffers
+from src.core.config import Config
+from src.core.database import DatabaseManager
+from src.core.detection import EPIDetector, ImageProcessor, StubModel
+from src.core.encoding import JPEGEncoder
+from src.core.metrics import MetricsRegistry
+from src.core.settings import PipelineSettings
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+BENCHMARK_CAMERA = 'benchmark'
+REPORT_STAGES = ('capture', 'adjust', 'inference', 'postprocess', 'alert_encode', 'db_write')
+
+
+def iter_frames(source, max_frames=None, pool=None):
+    """
+    Lê frames de um arquivo de vídeo ou de uma pasta de imagens.
+
+    Com `pool`, os frames do vídeo são decodificados em buffers do pool e
+    quem os recebe chama buffers.release() depois de usá-los.
+    """
+    count = 0
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names:
+            if max_frames is not None and count >= max_frames:
+                return
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                count += 1
+                yield frame
+        return
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"❌ Não foi possível abrir a fonte: {source}")
+    try:
+        frame = None
+        while max_frames is None or count < max_frames:
+            target = pool.acquire(frame.shape) if pool is not None and frame is not None else None
+            ret, frame = cap.read(target)
+            if target is not None and (not ret or frame is not target):
+                buffers.release(target)
+            if not ret:
+                return
+            count += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def source_fps(source, default=25.0):
+    if os.path.isdir(source):
+        return default
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    cap.release()
+    return fps if fps and fps > 0 else default
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo, em MB."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa em KB, macOS em bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except (ImportError, AttributeError):
+            return None
+
+
+def faulted_bytes():
+    """
+    Memória nova tocada pelo processo até agora (page faults menores), em bytes.
+
+    Cada página tocada pela primeira vez gera um page fault: frames alocados
+    a cada iteração aparecem aqui, buffers reutilizados não. None se
+    indisponível (Windows).
+    """
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_minflt * resource.getpagesize()
+    except ImportError:
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    config = Config(args.config)
+    metrics = MetricsRegistry(window_size=100000)
+
+    if args.stub_model:
+        model = StubModel(latency=args.stub_latency / 1000, violation_every=args.violation_every)
+        detector = EPIDetector(None, config.min_confidence, model=model, verbose=False)
+    else:
+        detector = EPIDetector(args.model or config.model_path, config.min_confidence, verbose=False)
+    processor = ImageProcessor()
+    # Mesmo pool de buffers da estação; --no-pool compara com a alocação a cada frame
+    pool = None if args.no_pool else buffers.FramePool(config.performance['frame_buffers'])
+    encoding = config.encoding
+    encoder = JPEGEncoder(
+        {artifact: encoding[artifact] for artifact in ('evidence', 'thumbnail', 'stream')},
+        workers=encoding['workers']
+    )
+
+    db = None
+    db_path = None
+    if not args.no_db:
+        # Banco temporário para não misturar o benchmark com dados reais
+        db_path = os.path.join(tempfile.mkdtemp(prefix='safetylens-bench-'), 'bench.db')
+        db = DatabaseManager(db_path, metrics, BENCHMARK_CAMERA)
+
+    settings = PipelineSettings.from_config(config)
+    camera = metrics.camera(BENCHMARK_CAMERA)
+    frame_interval = 1.0 / source_fps(args.source, args.fps) if args.realtime else 0
+    frames = iter_frames(args.source, args.max_frames, pool)
+
+    # Aquecimento: os primeiros frames não entram nas estatísticas
+    for _ in range(args.warmup):
+        frame = next(frames, None)
+        if frame is None:
+            break
+        adjusted_frame = processor.apply(frame, settings, pool)
+        buffers.release(frame)
+        detector.detect(adjusted_frame)
+        buffers.release(adjusted_frame)
+
+    processed = 0
+    alerts = 0
+    last_alert_time = 0
+    faulted_start = faulted_bytes()
+    started = time.perf_counter()
+    next_deadline = started
+
+    while True:
+        start = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        captured = time.perf_counter()
+        adjusted_frame = processor.apply(frame, settings, pool)
+        adjusted = time.perf_counter()
+        buffers.release(frame)
+        results = detector.infer(adjusted_frame)
+        inferred = time.perf_counter()
+        annotated_frame, missing_epis, found_classes = detector.annotate(adjusted_frame, results)
+        annotated = time.perf_counter()
+
+        camera.stage('capture').observe(captured - start)
+        camera.stage('adjust').observe(adjusted - captured)
+        camera.stage('inference').observe(inferred - adjusted)
+        camera.stage('postprocess').observe(annotated - inferred)
+        processed += 1
+
+        if db is not None and missing_epis and annotated - last_alert_time >= args.alert_interval:
+            last_alert_time = annotated
+            images = encoder.encode_many(annotated_frame, ('evidence', 'thumbnail'))
+            camera.stage('alert_encode').observe(time.perf_counter() - annotated)
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            db.log_detection(timestamp, missing_epis, found_classes, images['evidence'],
+                             thumbnail=images['thumbnail'], boxes=detector.boxes(results, adjusted_frame.shape))
+            alerts += 1
+        buffers.release(adjusted_frame)
+
+        if frame_interval:
+            next_deadline += frame_interval
+            delay = next_deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    if db is not None:
+        # O tempo total inclui esvaziar a fila de gravação
+        db.close()
+    elapsed = time.perf_counter() - started
+    if db_path is not None:
+        shutil.rmtree(os.path.dirname(db_path), ignore_errors=True)
+    faulted = faulted_bytes()
+    encoder.close()
+    encoded = encoder.report()
+
+    stages = {}
+    for stage in REPORT_STAGES:
+        window = camera.stages.get(stage)
+        if window is None or window.count == 0:
+            continue
+        percentiles = window.percentiles()
+        stages[stage] = {
+            'count': window.count,
+            'mean_ms': round(window.total / window.count * 1000, 3),
+            'p50_ms': round(percentiles[0.5] * 1000, 3),
+            'p95_ms': round(percentiles[0.95] * 1000, 3),
+            'p99_ms': round(percentiles[0.99] * 1000, 3)
+        }
+
+    peak_rss = peak_rss_mb()
+    allocation = {'mb_per_s': None, 'kb_per_frame': None}
+    if faulted is not None and faulted_start is not None:
+        faulted -= faulted_start
+        allocation['mb_per_s'] = round(faulted / (1024 * 1024) / elapsed, 1) if elapsed > 0 else 0.0
+        allocation['kb_per_frame'] = round(faulted / 1024 / processed, 1) if processed else 0.0
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'source': args.source,
+        'mode': 'realtime' if args.realtime else 'max',
+        'model': 'stub' if args.stub_model else (args.model or config.model_path),
+        'frames': processed,
+        'alerts_logged': alerts,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_fps': round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+        'stages': stages,
+        # Bytes gravados por evento (evidência + miniatura) e custo de cada artefato
+        'bytes_per_event': sum(encoded[artifact]['avg_bytes'] for artifact in encoded),
+        'encoding': encoded,
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+        # Taxa de alocação: memória nova tocada (page faults menores)
+        'allocation': allocation,
+        'frame_pool': pool.stats() if pool is not None else None,
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'cpu_count': os.cpu_count()
+    }
+
+
+def main(argv=None):
+    """
+    Benchmark do pipeline a partir de um vídeo ou pasta de imagens.
+
+    Uso: python -m src.benchmark VIDEO_OU_PASTA [--stub-model] [--realtime]
+    """
+    parser = argparse.ArgumentParser(description="SafetyLens - benchmark offline do pipeline de detecção")
+    parser.add_argument('source', help="Arquivo de vídeo ou pasta com frames")
+    parser.add_argument('--config', default='config.yaml', help="Caminho do arquivo de configuração")
+    parser.add_argument('--model', help="Modelo a usar (padrão: paths.model do config)")
+    parser.add_argument('--stub-model', action='store_true', help="Usa um modelo falso, sem o best.pt")
+    parser.add_argument('--stub-latency', type=float, default=0.0, help="Latência simulada do modelo falso (ms)")
+    parser.add_argument('--violation-every', type=int, default=10,
+                        help="Modelo falso: gera um EPI ausente a cada N frames")
+    parser.add_argument('--realtime', action='store_true', help="Reproduz no ritmo do vídeo em vez de o mais rápido possível")
+    parser.add_argument('--fps', type=float, default=25.0, help="FPS usado com --realtime para pastas de imagens")
+    parser.add_argument('--max-frames', type=int, help="Limita a quantidade de frames lidos")
+    parser.add_argument('--warmup', type=int, default=5, help="Frames de aquecimento fora das estatísticas")
+    parser.add_argument('--alert-interval', type=float, default=0.0,
+                        help="Intervalo mínimo entre registros no banco (s)")
+    parser.add_argument('--no-db', action='store_true', help="Não exercita a gravação no banco")
+    parser.add_argument('--no-pool', action='store_true',
+                        help="Aloca novos frames a cada etapa, sem o pool de buffers (para comparação)")
+    parser.add_argument('--output', help="Também grava o resultado JSON neste arquivo")
+    args = parser.parse_args(argv)
+
+    # A saída padrão leva só o JSON (ex.: `> resultado.json`); os logs do
+    # pipeline (carregamento do modelo, gravações no banco) vão para stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
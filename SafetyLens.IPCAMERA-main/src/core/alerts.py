@@ -0,0 +1,288 @@
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import cv2
+
+from src.core import performance
+from src.core.dedup import dhash
+from src.core.spool import alert_event
+
+try:
+    import winsound
+except ImportError:  # Fora do Windows não há alerta sonoro
+    winsound = None
+
+
+class Alert:
+    """Um alerta de EPI ausente, com o frame anotado e (após a codificação) o JPEG e a miniatura."""
+
+    def __init__(self, camera, missing_epis, found_classes, frame, clip_path=None, timestamp=None, boxes=None):
+        self.camera = camera
+        self.missing_epis = missing_epis
+        self.found_classes = found_classes
+        self.frame = frame
+        self.clip_path = clip_path
+        # Caixas das classes do alerta, como em EPIDetector.boxes()
+        self.boxes = boxes or []
+        self.timestamp = timestamp or time.time()
+        # Identificador único do evento, usado pelo servidor central para descartar reenvios
+        self.uid = uuid.uuid4().hex
+        self.jpeg = None
+        self.thumbnail = None
+
+    @property
+    def timestamp_text(self):
+        return datetime.fromtimestamp(self.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AlertSink:
+    """Destino de alertas. needs_image indica se o sink usa o JPEG do frame."""
+
+    name = 'sink'
+    needs_image = False
+
+    def handle(self, alert):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class DatabaseSink(AlertSink):
+    """
+    Registra o alerta no banco (a gravação já é assíncrona no DatabaseManager).
+
+    O hash perceptual do frame é calculado aqui, fora do laço de frames,
+    para que o banco reaproveite imagens quase iguais da mesma câmera.
+    """
+
+    name = 'database'
+    needs_image = True
+
+    def __init__(self, db):
+        self.db = db
+
+    def handle(self, alert):
+        image_hash = dhash(alert.frame) if self.db.dedup is not None else None
+        self.db.log_detection(alert.timestamp_text, alert.missing_epis, alert.found_classes, alert.jpeg,
+                              alert.clip_path, image_hash, alert.camera, alert.thumbnail, alert.boxes)
+
+
+class SoundSink(AlertSink):
+    """
+    Toca o alerta sonoro em uma thread própria.
+
+    winsound.Beep bloqueia pela duração do som; alertas que chegam durante
+    um beep são ignorados em vez de se acumularem.
+    """
+
+    name = 'sound'
+
+    def __init__(self, settings_store):
+        self.settings_store = settings_store
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = None
+        if winsound is not None:
+            self._thread = threading.Thread(target=self._beep_loop, name="alert-sound", daemon=True)
+            self._thread.start()
+
+    def handle(self, alert):
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            pass
+
+    def _beep_loop(self):
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+            settings = self.settings_store.current
+            winsound.Beep(settings.alert_frequency, settings.alert_duration)
+
+    def close(self):
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+
+class HubSink(AlertSink):
+    """Publica o último frame de alerta em /stream/<camera>-alerts."""
+
+    name = 'hub'
+
+    def __init__(self, hub, suffix='-alerts'):
+        self.hub = hub
+        self.suffix = suffix
+
+    def handle(self, alert):
+        self.hub.publish(alert.camera + self.suffix, alert.frame)
+
+
+class SpoolSink(AlertSink):
+    """
+    Acrescenta o evento ao spool local enviado ao servidor central.
+
+    `images` escolhe a imagem enviada junto: 'thumbnail', 'evidence' ou
+    'none'.
+    """
+
+    name = 'spool'
+
+    def __init__(self, spool, epi_names, images='thumbnail'):
+        self.spool = spool
+        self.epi_names = epi_names
+        self.images = images
+        self.needs_image = images != 'none'
+
+    def handle(self, alert):
+        image = None
+        if self.images == 'evidence':
+            image = alert.jpeg
+        elif self.images == 'thumbnail':
+            image = alert.thumbnail or alert.jpeg
+        self.spool.append(alert_event(alert, self.epi_names, image))
+
+
+class CallbackSink(AlertSink):
+    """Chama uma função com o alerta (ex.: atualizar a barra de status da interface)."""
+
+    name = 'callback'
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def handle(self, alert):
+        self.callback(alert)
+
+
+class FakeSink(AlertSink):
+    """Sink para testes: guarda os alertas recebidos."""
+
+    name = 'fake'
+
+    def __init__(self, needs_image=True):
+        self.needs_image = needs_image
+        self.alerts = []
+        self._condition = threading.Condition()
+
+    def handle(self, alert):
+        with self._condition:
+            self.alerts.append(alert)
+            self._condition.notify_all()
+
+    def wait_for(self, count, timeout=5.0):
+        """Aguarda até `count` alertas terem chegado; retorna se chegaram."""
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self.alerts) >= count, timeout)
+
+
+class AlertDispatcher:
+    """
+    Distribui os alertas sem bloquear o laço de frames.
+
+    claim() aplica os intervalos mínimos por câmera e por tipo de EPI e
+    retorna só os EPIs que podem alertar agora; submit() coloca o alerta
+    em uma fila limitada, consumida por `workers` threads que codificam o
+    JPEG (uma vez, se algum sink precisar) e entregam aos sinks. Com um
+    JPEGEncoder, a evidência e a miniatura seguem as políticas de codificação
+    e são geradas em paralelo no pool do encoder. Com a fila
+    cheia, novos alertas são descartados e contados, mantendo o custo de uma
+    rajada limitado.
+    """
+
+    def __init__(self, sinks=None, cooldown=10.0, cooldowns=None, queue_size=16, workers=2,
+                 jpeg_quality=95, metrics=None, encoder=None):
+        self.sinks = list(sinks or [])
+        self.cooldown = cooldown
+        # Intervalos específicos por nome de EPI (ex.: {'Sem_Capacete': 5})
+        self.cooldowns = dict(cooldowns or {})
+        self.jpeg_quality = jpeg_quality
+        self.encoder = encoder
+        self.metrics = metrics
+        self.dropped = 0
+        self._last_alert = {}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"alert-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def claim(self, camera, missing_epis, now=None):
+        """Retorna os EPIs fora do intervalo mínimo e reinicia o intervalo deles."""
+        now = now if now is not None else time.monotonic()
+        due = []
+        for epi in dict.fromkeys(missing_epis):
+            key = (camera, epi)
+            cooldown = self.cooldowns.get(epi, self.cooldown)
+            last = self._last_alert.get(key)
+            if last is None or now - last > cooldown:
+                self._last_alert[key] = now
+                due.append(epi)
+        return due
+
+    def submit(self, alert):
+        """Enfileira o alerta; nunca bloqueia. Retorna False se foi descartado."""
+        try:
+            self._queue.put_nowait(alert)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.metrics is not None:
+                self.metrics.mark_dropped(alert.camera, 'alert')
+            return False
+
+    def _worker_loop(self):
+        # Não herda a afinidade da thread de inferência que disparou o alerta
+        performance.pin_thread()
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+            try:
+                self._deliver(alert)
+            except Exception as e:
+                print(f"Erro ao processar alerta de {alert.camera}: {e}")
+
+    def _deliver(self, alert):
+        if any(sink.needs_image for sink in self.sinks):
+            start = time.perf_counter()
+            if self.encoder is not None:
+                images = self.encoder.encode_many(alert.frame, ('evidence', 'thumbnail'))
+                alert.jpeg, alert.thumbnail = images['evidence'], images['thumbnail']
+            else:
+                ok, encoded = cv2.imencode('.jpg', alert.frame, [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)])
+                alert.jpeg = encoded.tobytes() if ok else None
+            if self.metrics is not None:
+                self.metrics.observe(alert.camera, 'alert_encode', time.perf_counter() - start)
+
+        for sink in self.sinks:
+            try:
+                sink.handle(alert)
+            except Exception as e:
+                print(f"Erro no destino de alertas {sink.name}: {e}")
+
+    def close(self):
+        """Entrega os alertas já enfileirados e encerra os workers."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+        for sink in self.sinks:
+            sink.close()
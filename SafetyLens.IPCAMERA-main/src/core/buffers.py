@@ -0,0 +1,118 @@
+import threading
+
+import numpy as np
+
+# Buffers emprestados por algum pool, por id(): retain()/release() os encontram sem saber de qual pool vieram
+_leased = {}
+_leased_lock = threading.Lock()
+
+
+def retain(frame):
+    """
+    Registra mais um dono do frame (ex.: a fila da transmissão).
+
+    Quem guarda um frame além do frame atual chama retain() e, ao terminar,
+    release(). Frames que não vieram de um FramePool são ignorados, então
+    os consumidores não precisam saber a origem do frame.
+    """
+    if frame is None:
+        return
+    with _leased_lock:
+        lease = _leased.get(id(frame))
+        if lease is not None and lease[0] is frame:
+            lease[1] += 1
+
+
+def release(frame):
+    """Libera uma referência; o buffer volta ao pool quando não resta nenhum dono."""
+    if frame is None:
+        return
+    with _leased_lock:
+        lease = _leased.get(id(frame))
+        if lease is None or lease[0] is not frame:
+            return
+        lease[1] -= 1
+        if lease[1] > 0:
+            return
+        del _leased[id(frame)]
+        pool = lease[2]
+    pool._give_back(frame)
+
+
+class FramePool:
+    """
+    Buffers de frame pré-alocados de uma stream, reutilizados a cada frame.
+
+    acquire() entrega um buffer livre do formato pedido, com um dono (quem
+    o pediu). Etapas que passam o frame adiante o fazem por referência;
+    quem precisa dele depois que o dono terminou (transmissão, clipes,
+    interface) chama retain() e depois release(), e o buffer só volta ao
+    pool quando o último dono o libera. Na primeira vez em que um formato
+    aparece, `size` buffers são alocados de uma vez; se todos estiverem em
+    uso, um novo é alocado e passa a fazer parte do pool.
+
+    scratch() devolve buffers intermediários de uso exclusivo de uma etapa
+    (ex.: a saída do cv2.LUT antes da nitidez), que nunca saem dela.
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self.allocated = 0
+        self.allocated_bytes = 0
+        self.acquired = 0
+        self.reused = 0
+        self._free = {}
+        self._scratch = {}
+        self._lock = threading.Lock()
+
+    def _allocate(self, shape, dtype):
+        buffer = np.empty(shape, dtype=dtype)
+        self.allocated += 1
+        self.allocated_bytes += buffer.nbytes
+        return buffer
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free is None:
+                # Formato novo (ex.: troca de resolução): os buffers do formato antigo são descartados
+                self._free = {}
+                free = self._free[key] = [self._allocate(key[0], dtype) for _ in range(max(0, self.size - 1))]
+            self.acquired += 1
+            if free:
+                buffer = free.pop()
+                self.reused += 1
+            else:
+                buffer = self._allocate(key[0], dtype)
+        with _leased_lock:
+            _leased[id(buffer)] = [buffer, 1, self]
+        return buffer
+
+    def _give_back(self, buffer):
+        with self._lock:
+            free = self._free.get((buffer.shape, buffer.dtype.str))
+            # Sem lista para o formato, o buffer é de uma resolução antiga e fica para o GC
+            if free is not None and len(free) < self.size:
+                free.append(buffer)
+
+    def scratch(self, name, shape, dtype=np.uint8):
+        """Buffer intermediário reutilizado de uma etapa; realocado só se o formato mudar."""
+        buffer = self._scratch.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = self._scratch[name] = self._allocate(tuple(shape), dtype)
+        return buffer
+
+    @property
+    def in_use(self):
+        with _leased_lock:
+            return sum(1 for lease in _leased.values() if lease[2] is self)
+
+    def stats(self):
+        return {
+            'allocated': self.allocated,
+            'allocated_mb': round(self.allocated_bytes / (1024 * 1024), 1),
+            'acquired': self.acquired,
+            'reused': self.reused,
+            'in_use': self.in_use
+        }
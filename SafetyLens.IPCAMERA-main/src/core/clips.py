@@ -0,0 +1,203 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from src.core import buffers, performance
+
+# Codec usado para cada formato de vídeo aceito em camera.video_format
+FOURCC_BY_FORMAT = {
+    'mp4': 'mp4v',
+    'avi': 'XVID',
+    'mkv': 'XVID'
+}
+
+
+class _Clip:
+    def __init__(self, path, start, end):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.frames = []
+        self.bytes = 0
+
+    def add(self, item):
+        self.frames.append(item)
+        self.bytes += len(item[1])
+
+
+class ClipRecorder:
+    """
+    Grava clipes de eventos com pré e pós-gravação a partir da memória.
+
+    Os frames recebidos em push() são reduzidos e comprimidos em JPEG por
+    uma thread própria e guardados em um buffer circular que cobre os
+    últimos `pre_seconds`, limitado a `max_buffer_mb`. trigger() abre um
+    clipe (ou estende o clipe em andamento, juntando eventos sobrepostos) e
+    devolve imediatamente o caminho do arquivo; a gravação do vídeo é feita
+    em segundo plano quando a pós-gravação termina. O clipe aberto também
+    fica limitado a `max_buffer_mb`: ao atingir o limite, é encerrado e
+    gravado antes do fim da pós-gravação.
+    """
+
+    def __init__(self, output_dir, camera_name, video_format='mp4', pre_seconds=5.0, post_seconds=5.0,
+                 max_buffer_mb=32, max_clip_seconds=60.0, width=960, quality=75, writers=1):
+        self.output_dir = output_dir
+        self.camera_name = camera_name
+        self.video_format = video_format
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_buffer_bytes = int(max_buffer_mb * 1024 * 1024)
+        self.max_clip_seconds = max_clip_seconds
+        self.width = width
+        self.quality = quality
+
+        self._ring = deque()
+        self._ring_bytes = 0
+        # Destino reutilizado da redução dos frames (cv2.resize com dst)
+        self._resized = None
+        self._clip = None
+        self._lock = threading.Lock()
+        # Fila curta: se a compressão atrasar, os frames excedentes são descartados
+        self._queue = queue.Queue(maxsize=2)
+        self._writer = ThreadPoolExecutor(
+            max_workers=writers, thread_name_prefix=f"clip-writer-{camera_name}",
+            initializer=performance.pin_thread, initargs=('encode',)
+        )
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._encode_loop, name=f"clips-{camera_name}", daemon=True)
+        self._thread.start()
+
+    def push(self, frame, timestamp=None):
+        """Entrega um frame ao buffer; nunca bloqueia o pipeline."""
+        # Frames de um FramePool ficam retidos até a compressão
+        buffers.retain(frame)
+        try:
+            self._queue.put_nowait((timestamp or time.time(), frame))
+        except queue.Full:
+            buffers.release(frame)
+
+    def trigger(self, timestamp=None):
+        """
+        Registra um evento e retorna o caminho do clipe que o conterá.
+
+        Eventos que chegam enquanto um clipe ainda está aberto estendem a
+        pós-gravação do mesmo clipe, até `max_clip_seconds`.
+        """
+        now = timestamp or time.time()
+        with self._lock:
+            clip = self._clip
+            if clip is not None and now <= clip.end and now - clip.start < self.max_clip_seconds:
+                clip.end = max(clip.end, now + self.post_seconds)
+                return clip.path
+
+            if clip is not None:
+                # Clipe anterior atingiu o limite: encerra antes de abrir outro
+                self._finish_clip()
+
+            # Milissegundos no nome: dois clipes no mesmo segundo não se sobrescrevem
+            moment = datetime.fromtimestamp(now)
+            name = (f"{self.camera_name}_{moment.strftime('%Y%m%d_%H%M%S')}_{moment.microsecond // 1000:03d}"
+                    f".{self.video_format}")
+            clip = _Clip(os.path.join(self.output_dir, name), now - self.pre_seconds, now + self.post_seconds)
+            for item in self._ring:
+                if item[0] >= clip.start:
+                    clip.add(item)
+            self._clip = clip
+            return clip.path
+
+    def _encode_loop(self):
+        performance.pin_thread('encode')
+        while self._running:
+            try:
+                timestamp, frame = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                self._check_clip(time.time())
+                continue
+
+            try:
+                jpeg = self._encode(frame)
+            finally:
+                buffers.release(frame)
+            if jpeg is None:
+                continue
+
+            with self._lock:
+                item = (timestamp, jpeg)
+                self._ring.append(item)
+                self._ring_bytes += len(jpeg)
+                # Mantém só a janela de pré-gravação, dentro do limite de memória
+                while self._ring and (self._ring_bytes > self.max_buffer_bytes
+                                      or self._ring[0][0] < timestamp - self.pre_seconds):
+                    _, old = self._ring.popleft()
+                    self._ring_bytes -= len(old)
+
+                clip = self._clip
+                if clip is not None and timestamp >= clip.start:
+                    clip.add(item)
+                    if clip.bytes > self.max_buffer_bytes:
+                        print(f"⚠️ Clipe {clip.path} atingiu o limite de memória "
+                              f"({self.max_buffer_bytes / (1024 * 1024):g} MB); encerrado antes do fim da pós-gravação.")
+                        self._finish_clip()
+            self._check_clip(timestamp)
+
+    def _encode(self, frame):
+        height, width = frame.shape[:2]
+        if self.width and width > self.width:
+            shape = (int(height * self.width / width), self.width) + frame.shape[2:]
+            if self._resized is None or self._resized.shape != shape:
+                self._resized = np.empty(shape, dtype=frame.dtype)
+            frame = cv2.resize(frame, (shape[1], shape[0]), dst=self._resized, interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        return encoded.tobytes() if ok else None
+
+    def _check_clip(self, now):
+        with self._lock:
+            if self._clip is not None and now > self._clip.end:
+                self._finish_clip()
+
+    def _finish_clip(self):
+        # Chamado com self._lock adquirido
+        clip, self._clip = self._clip, None
+        if clip.frames:
+            self._writer.submit(self._write_clip, clip)
+
+    def _write_clip(self, clip):
+        frames = clip.frames
+        duration = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / duration if duration > 0 else 1.0
+        fourcc = cv2.VideoWriter_fourcc(*FOURCC_BY_FORMAT.get(self.video_format, 'mp4v'))
+
+        writer = None
+        try:
+            for _, jpeg in frames:
+                frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    continue
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(clip.path, fourcc, fps, (width, height))
+                writer.write(frame)
+            print(f"🎬 Clipe gravado: {clip.path} ({len(frames)} frames)")
+        except cv2.error as e:
+            print(f"Erro ao gravar clipe {clip.path}: {e}")
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def close(self):
+        """Grava o clipe em andamento e aguarda as gravações pendentes."""
+        self._running = False
+        self._thread.join(timeout=2)
+        with self._lock:
+            if self._clip is not None:
+                self._finish_clip()
+        self._writer.shutdown(wait=True)
@@ -1,20 +1,214 @@
+import copy
+import os
+import socket
+import tempfile
+import threading
+import time
+
 import yaml
 
+from src.core.models import registry_model_path
+
 class Config:
-    def __init__(self, config_path='config.yaml'):
+    """
+    Configuração do sistema lida do config.yaml.
+
+    Alterações feitas pela interface são aplicadas na memória na hora e
+    gravadas em disco por uma thread que agrupa as mudanças (debounce),
+    sempre com escrita atômica (arquivo temporário + rename). Com
+    start_watching(), mudanças feitas no arquivo por outros processos são
+    recarregadas e avisadas aos ouvintes registrados em add_listener().
+    """
+
+    def __init__(self, config_path='config.yaml', save_delay=0.5, max_save_delay=2.0, retry_delay=5.0):
         self.config_path = config_path
+        self.save_delay = save_delay
+        self.max_save_delay = max_save_delay
+        self.retry_delay = retry_delay
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._save_requested = threading.Condition(self._lock)
+        self._pending_updates = {}
+        self._first_change_at = None
+        self._last_change_at = None
+        self._retry_at = None
+        self._saver_thread = None
+        self._watch_thread = None
+        self._watching = False
+        self._file_signature = None
         self.load_config()
 
     def load_config(self):
         with open(self.config_path, 'r') as f:
             self.config = yaml.safe_load(f)
+        self._file_signature = self._read_signature()
 
     def save_config(self):
-        with open(self.config_path, 'w') as f:
-            yaml.dump(self.config, f)
+        """
+        Grava o config de forma atômica: nunca deixa um arquivo pela metade.
+
+        Se outro processo alterou o arquivo desde a última leitura (ex.:
+        python -m src.models activate), ele é recarregado antes e as
+        mudanças locais pendentes são reaplicadas sobre ele, em vez de
+        sobrescrevê-lo. As mudanças só deixam de ser pendentes depois que a
+        gravação termina.
+        """
+        if self._file_signature is not None and self._read_signature() != self._file_signature:
+            self.reload()
+        with self._lock:
+            # Cópia tirada sob o lock: a interface continua alterando self.config durante a gravação
+            snapshot = copy.deepcopy(self.config)
+            written = dict(self._pending_updates)
+        directory = os.path.dirname(os.path.abspath(self.config_path))
+        fd, temp_path = tempfile.mkstemp(prefix='.config-', suffix='.yaml', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                yaml.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.config_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._lock:
+            # Registra a própria escrita para não recarregá-la como mudança externa
+            self._file_signature = self._read_signature()
+            # Ajustes alterados de novo durante a gravação continuam pendentes
+            for key, value in written.items():
+                if key in self._pending_updates and self._pending_updates[key] == value:
+                    del self._pending_updates[key]
+
+    def _read_signature(self):
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def add_listener(self, callback):
+        """Registra uma função chamada (com este Config) após cada recarga."""
+        self._listeners.append(callback)
+
+    def schedule_save(self):
+        """
+        Agenda a gravação em disco.
+
+        A gravação ocorre quando as mudanças param por `save_delay` segundos
+        ou, durante mudanças contínuas (ex.: arrastar um slider), no máximo
+        a cada `max_save_delay` segundos. Se a gravação falhar, as mudanças
+        continuam pendentes e são gravadas de novo após `retry_delay` segundos.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._first_change_at is None:
+                self._first_change_at = now
+            self._last_change_at = now
+            if self._saver_thread is None:
+                self._saver_thread = threading.Thread(target=self._save_loop, name="config-saver", daemon=True)
+                self._saver_thread.start()
+            self._save_requested.notify()
+
+    def _save_loop(self):
+        while True:
+            with self._lock:
+                while self._first_change_at is None:
+                    self._save_requested.wait()
+                while True:
+                    now = time.monotonic()
+                    deadline = min(self._last_change_at + self.save_delay,
+                                   self._first_change_at + self.max_save_delay)
+                    if self._retry_at is not None:
+                        deadline = max(deadline, self._retry_at)
+                    if now >= deadline:
+                        break
+                    self._save_requested.wait(deadline - now)
+                first_change_at = self._first_change_at
+                self._first_change_at = None
+                self._last_change_at = None
+                self._retry_at = None
+            if not self._save_safely():
+                with self._lock:
+                    # Mantém as mudanças pendentes e tenta de novo mais tarde
+                    if self._first_change_at is None:
+                        self._first_change_at = first_change_at
+                        self._last_change_at = first_change_at
+                    self._retry_at = time.monotonic() + self.retry_delay
+
+    def _save_safely(self):
+        try:
+            self.save_config()
+        except (OSError, yaml.YAMLError) as e:
+            print(f"Erro ao salvar configurações: {e}")
+            return False
+        return True
+
+    def flush(self):
+        """Grava imediatamente as mudanças pendentes (usado ao encerrar)."""
+        with self._lock:
+            first_change_at = self._first_change_at
+            self._first_change_at = None
+            self._last_change_at = None
+            self._retry_at = None
+        if first_change_at is not None and not self._save_safely():
+            with self._lock:
+                if self._first_change_at is None:
+                    self._first_change_at = first_change_at
+                    self._last_change_at = first_change_at
+                self._retry_at = time.monotonic() + self.retry_delay
+                self._save_requested.notify()
+
+    def start_watching(self, interval=1.0):
+        """Passa a recarregar o arquivo quando outro processo o alterar."""
+        if self._watch_thread is not None:
+            return
+        self._watching = True
+        self._watch_thread = threading.Thread(
+            target=self._watch_loop, args=(interval,), name="config-watcher", daemon=True
+        )
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        self._watching = False
+
+    def _watch_loop(self, interval):
+        while self._watching:
+            time.sleep(interval)
+            signature = self._read_signature()
+            if signature is None or signature == self._file_signature:
+                continue
+            self.reload()
+
+    def reload(self):
+        try:
+            with open(self.config_path, 'r') as f:
+                new_config = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError) as e:
+            # Arquivo em edição ou inválido: tenta de novo na próxima verificação
+            print(f"Erro ao recarregar configurações: {e}")
+            return
+        if not isinstance(new_config, dict):
+            return
+
+        with self._lock:
+            self.config = new_config
+            self._file_signature = self._read_signature()
+            # Mudanças locais ainda não gravadas continuam valendo
+            self._apply_updates(self._pending_updates)
+
+        print("🔄 Configurações recarregadas do arquivo.")
+        for callback in list(self._listeners):
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"Erro ao aplicar configurações recarregadas: {e}")
 
     @property
     def model_path(self):
+        """Modelo ativo: a versão models.active do registro ou, sem ela, paths.model."""
+        models = self.models
+        if models['active']:
+            return registry_model_path(models['registry_dir'], models['active'])
         return self.config['paths']['model']
 
     @property
@@ -29,11 +223,46 @@ class Config:
     def camera_url(self):
         return self.config['camera'].get('url', None)  # Pode não existir
 
+    @property
+    def camera_name(self):
+        """Identificador da câmera usado na transmissão e nos registros."""
+        return self.config['camera'].get('name', 'camera_01')
+
+    @property
+    def site(self):
+        """Site (instalação) desta estação: ingest.site ou, se vazio, o nome da máquina."""
+        return self.ingest['site'] or socket.gethostname()
+
     @property
     def camera_source(self):
         """Retorna a URL da câmera se existir, senão o ID."""
         return self.camera_url if self.camera_url else self.camera_id
 
+    @property
+    def camera_capture(self):
+        """Como os frames da câmera são lidos (backend, sub-stream, latência)."""
+        settings = {
+            'backend': 'opencv',
+            'use_substream': False,
+            'substream_url': None,
+            'transport': 'tcp',
+            'low_latency': True,
+            'decode_threads': 0,
+            'timeout': 5.0,
+            'stall_timeout': 10.0,
+            'reconnect_initial': 1.0,
+            'reconnect_max': 60.0,
+            'realtime': True,
+            'loop': False,
+            'fps': 25.0
+        }
+        settings.update(self.config['camera'].get('capture') or {})
+        return settings
+
+    @property
+    def video_format(self):
+        return self.config['camera'].get('video_format', 'mp4')
+
     @property
     def camera_resolution(self):
         return (
@@ -61,6 +290,10 @@ class Config:
     def min_confidence(self):
         return self.config['detection']['min_confidence']
 
+    @property
+    def tracking(self):
+        return self.config['detection'].get('tracking', False)
+
     @property
     def classes_epi_ausentes(self):
         return self.config['detection']['classes']['epi_ausentes']
@@ -81,11 +314,209 @@ class Config:
     def delay_time(self):
         return self.config['alerts']['delay_time']
 
+    @property
+    def alert_dispatch(self):
+        """Despacho de alertas: intervalos por EPI, fila e destinos."""
+        settings = {
+            'cooldowns': {},
+            'queue_size': 16,
+            'workers': 2,
+            'sound': True,
+            'stream': True
+        }
+        settings.update(self.config['alerts'].get('dispatch') or {})
+        return settings
+
+    @property
+    def inference(self):
+        """Serviço de inferência local compartilhado (socket Unix e micro-lotes)."""
+        settings = {
+            'service': False,
+            'socket': '/tmp/safetylens-inference.sock',
+            'max_batch': 8,
+            'max_wait_ms': 5,
+            'timeout': 5.0,
+            'metrics_port': 9109
+        }
+        settings.update(self.config.get('inference') or {})
+        return settings
+
+    @property
+    def ingest(self):
+        """Envio dos eventos ao servidor central (multi-site), via spool local."""
+        settings = {
+            'enabled': False,
+            'url': 'http://127.0.0.1:5000/ingest',
+            'site': '',
+            'token': '',
+            'spool_dir': 'database/spool',
+            'segment_mb': 4,
+            'max_spool_mb': 1024,
+            'fsync': True,
+            'batch_size': 200,
+            'interval': 2,
+            'timeout': 10,
+            'backoff_max': 60,
+            'images': 'thumbnail'
+        }
+        settings.update(self.config.get('ingest') or {})
+        return settings
+
+    @property
+    def streaming(self):
+        """Configurações da transmissão MJPEG, com valores padrão."""
+        settings = {
+            'enabled': True,
+            'host': '127.0.0.1',
+            'port': 8090,
+            'width': 640,
+            'quality': 70
+        }
+        settings.update(self.config.get('streaming') or {})
+        return settings
+
+    @property
+    def encoding(self):
+        """
+        Políticas de codificação JPEG por artefato (evidence, thumbnail, stream).
+
+        Cada artefato aceita max_width, max_height, quality, progressive,
+        optimize e backend (opencv, simplejpeg, turbojpeg ou auto). Sem
+        política própria, a transmissão usa a largura e a qualidade da seção
+        streaming.
+        """
+        stream = self.streaming
+        settings = {
+            'workers': 2,
+            'evidence': {'max_width': 1280, 'quality': 85, 'progressive': True, 'optimize': True},
+            'thumbnail': {'max_width': 320, 'quality': 70},
+            'stream': {'max_width': stream['width'], 'quality': stream['quality']}
+        }
+        for key, value in (self.config.get('encoding') or {}).items():
+            if isinstance(value, dict) and isinstance(settings.get(key), dict):
+                settings[key] = {**settings[key], **value}
+            else:
+                settings[key] = value
+        return settings
+
+    @property
+    def heatmap(self):
+        """Mapa de calor das violações por câmera (grade reduzida, salva em .npy)."""
+        settings = {
+            'enabled': True,
+            'directory': 'database/heatmaps',
+            'width': 64,
+            'height': 36,
+            'save_interval': 60
+        }
+        settings.update(self.config.get('heatmap') or {})
+        return settings
+
+    @property
+    def models(self):
+        """Registro de versões do modelo, versão ativa e candidata em modo sombra."""
+        settings = {
+            'registry_dir': 'model/registry',
+            'active': None,
+            'shadow': None,
+            'shadow_sample_rate': 0.1,
+            'shadow_iou': 0.5
+        }
+        settings.update(self.config.get('models') or {})
+        return settings
+
+    @property
+    def metrics(self):
+        """Configurações do endpoint de métricas (Prometheus)."""
+        settings = {
+            'enabled': True,
+            'host': '127.0.0.1',
+            'port': 9108
+        }
+        settings.update(self.config.get('metrics') or {})
+        return settings
+
+    @property
+    def clips(self):
+        """Configurações dos clipes de eventos (pré e pós-gravação)."""
+        settings = {
+            'enabled': True,
+            'directory': 'clips',
+            'pre_seconds': 5,
+            'post_seconds': 5,
+            'max_buffer_mb': 32,
+            'max_clip_seconds': 60,
+            'width': 960,
+            'quality': 75
+        }
+        settings.update(self.config.get('clips') or {})
+        return settings
+
+    @property
+    def storage(self):
+        """Particionamento das detecções: 'monthly' (um arquivo por mês) ou 'none'."""
+        settings = {
+            'partitioning': 'monthly',
+            'partition_dir': 'database/partitions'
+        }
+        settings.update(self.config.get('storage') or {})
+        return settings
+
+    @property
+    def retention(self):
+        """Política de retenção e arquivamento do banco de detecções."""
+        settings = {
+            'images_days': 90,
+            'rows_days': 730,
+            'batch_size': 500,
+            'pause': 0.05,
+            'archive_dir': 'database/archive',
+            'archive_format': 'ndjson',
+            'vacuum_pages': 2000
+        }
+        settings.update(self.config.get('retention') or {})
+        return settings
+
+    @property
+    def snapshots(self):
+        """Deduplicação das imagens de evidência por hash perceptual."""
+        settings = {
+            'dedup': True,
+            'max_distance': 6,
+            'window_seconds': 300
+        }
+        settings.update(self.config.get('snapshots') or {})
+        return settings
+
+    @property
+    def performance(self):
+        """Orçamento de threads, afinidade de CPU por etapa e buffers de frame do pipeline."""
+        settings = {
+            'opencv_threads': None,
+            'torch_threads': None,
+            'db_writers': 1,
+            'clip_writers': 1,
+            'frame_buffers': 12,
+            'affinity': {}
+        }
+        settings.update(self.config.get('performance') or {})
+        return settings
+
     def update_camera_settings(self, **kwargs):
+        """Aplica os ajustes na memória na hora e agenda a gravação em disco."""
+        with self._lock:
+            # Sob o lock para que um reload() concorrente não descarte o ajuste
+            self._apply_updates(kwargs)
+            self._pending_updates.update(kwargs)
+        self.schedule_save()
+
+    def _apply_updates(self, kwargs):
         for key, value in kwargs.items():
             # Configurações de alerta vão para a seção 'alerts'
             if key in ['alert_frequency', 'alert_duration', 'delay_time']:
                 self.config['alerts'][key.replace('alert_', '')] = value
+            elif key == 'min_confidence':
+                self.config['detection']['min_confidence'] = value
             elif key == 'url':
                 self.config['camera']['url'] = value
             elif key == 'id':
@@ -93,4 +524,3 @@ class Config:
             else:
                 # Outras configurações vão para camera.default_settings
                 self.config['camera']['default_settings'][key] = value
-        self.save_config()
@@ -1,14 +1,37 @@
 import sqlite3
 import os
+import threading
 import time
+from contextlib import closing
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 
+from src.core import performance
+from src.core.dedup import to_signed64
+from src.core.inspection import ensure_inspection_table, write_inspections
+from src.core.partitions import (box_rows, count_rows, ensure_box_table, ensure_count_tables, ensure_detection_indexes,
+                                  month_of, month_of_id)
+
 class DatabaseManager:
-    def __init__(self, database_path):
+    def __init__(self, database_path, metrics=None, metrics_label='writer', workers=1, dedup=None,
+                 partitions=None, site=None):
         self.database_path = database_path
+        # Site (instalação) gravado em cada detecção, junto com a câmera
+        self.site = site
+        # SnapshotDeduplicator opcional: imagens quase iguais reaproveitam a já gravada
+        self.dedup = dedup
+        # PartitionSet opcional: detecções e imagens em um arquivo por mês
+        self.partitions = partitions
         self.ensure_database()
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='db-writer',
+            initializer=performance.pin_thread, initargs=('db',)
+        )
+        # Métricas opcionais do gravador (latência e registros pendentes)
+        self.metrics = metrics
+        self.metrics_label = metrics_label
+        self._pending = 0
+        self._pending_lock = threading.Lock()
         # Mapeamento correto das classes
         self.epi_mapping = {
             4: 'Sem_Oculos',    # Classes que indicam ausência
@@ -22,12 +45,16 @@ class DatabaseManager:
         }
 
     def ensure_database(self):
-        if not os.path.exists(os.path.dirname(self.database_path)):
-            os.makedirs(os.path.dirname(self.database_path))
+        database_dir = os.path.dirname(self.database_path)
+        if database_dir and not os.path.exists(database_dir):
+            os.makedirs(database_dir)
             
         conn = sqlite3.connect(self.database_path)
         cursor = conn.cursor()
 
+        # Só tem efeito em bancos novos; permite a limpeza incremental da retenção
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
         # Tabela EPIs
         cursor.execute("""CREATE TABLE IF NOT EXISTS epis (
             id INTEGER PRIMARY KEY,
@@ -43,6 +70,39 @@ class DatabaseManager:
             FOREIGN KEY (epi_id) REFERENCES epis (id)
         )""")
 
+        # Colunas adicionadas depois da criação original da tabela
+        self._ensure_columns(cursor, 'detections', {
+            'source_file': 'TEXT',   # Arquivo de vídeo de origem (análise em lote)
+            'frame_time': 'REAL',    # Posição do frame no vídeo, em segundos
+            'clip_path': 'TEXT',     # Clipe do evento (pré e pós-gravação)
+            'snapshot_id': 'INTEGER', # Imagem do evento, compartilhada pelas linhas de cada classe
+            'camera_id': 'TEXT',     # Câmera que gerou a detecção
+            'site': 'TEXT'           # Site (instalação) da câmera
+        })
+
+        # Imagens de evidência, gravadas uma vez por evento
+        cursor.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            camera TEXT,
+            timestamp DATETIME,
+            image_hash INTEGER,
+            image BLOB
+        )""")
+        self._ensure_columns(cursor, 'snapshots', {
+            'thumbnail': 'BLOB'      # Miniatura da evidência (política 'thumbnail')
+        })
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_detections_snapshot ON detections (snapshot_id)")
+        ensure_detection_indexes(cursor)
+        # Caixas de cada detecção (posição normalizada, confiança e rastreamento)
+        ensure_box_table(cursor)
+
+        # Totais diários das detecções já arquivadas pela retenção (detection_rollups),
+        # das partições mensais (partition_counts) e a view detection_counts
+        ensure_count_tables(cursor)
+
+        # Frames inspecionados por minuto e câmera (taxa de conformidade)
+        ensure_inspection_table(cursor)
+
         # Tabela Configurações
         cursor.execute("""CREATE TABLE IF NOT EXISTS settings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -83,6 +143,15 @@ class DatabaseManager:
             except sqlite3.IntegrityError:
                 pass  # Ignora se já existir
 
+    @staticmethod
+    def _ensure_columns(cursor, table, columns):
+        """Adiciona colunas ausentes em bancos criados por versões anteriores."""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
     def get_connection(self):
         """
         Cria uma conexão com o banco de dados com timeout e configurações de segurança.
@@ -116,37 +185,212 @@ class DatabaseManager:
 
         raise last_error
 
-    def log_detection(self, timestamp, missing_epis, found_classes, frame_data):
+    @property
+    def pending(self):
+        """Quantidade de registros aguardando gravação."""
+        return self._pending
+
+    def log_detection(self, timestamp, missing_epis, found_classes, frame_data, clip_path=None,
+                      image_hash=None, camera=None, thumbnail=None, boxes=None):
         """Registra uma detecção no banco de dados em uma thread separada"""
-        self.executor.submit(self._log_detection_task, timestamp, missing_epis, found_classes, frame_data)
+        with self._pending_lock:
+            self._pending += 1
+        self.executor.submit(self._log_detection_task, timestamp, missing_epis, found_classes, frame_data,
+                             clip_path, image_hash, camera or self.metrics_label, thumbnail, boxes)
 
-    def _log_detection_task(self, timestamp, missing_epis, found_classes, frame_data):
+    def _log_detection_task(self, timestamp, missing_epis, found_classes, frame_data, clip_path=None,
+                            image_hash=None, camera=None, thumbnail=None, boxes=None):
+        start = time.perf_counter()
         try:
+            self._write_detection(timestamp, missing_epis, found_classes, frame_data, clip_path, image_hash,
+                                  camera, thumbnail, boxes)
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+            if self.metrics is not None:
+                self.metrics.observe(self.metrics_label, 'db_write', time.perf_counter() - start)
+
+    def _get_epi_id(self, epi_name):
+        # Verifica se o EPI já existe na tabela
+        cursor = self.execute_with_retry("SELECT id FROM epis WHERE nome = ?", (epi_name,))
+        epi_result = cursor.fetchone()
+
+        if epi_result:
+            return epi_result[0]
+        cursor = self.execute_with_retry("INSERT INTO epis (nome) VALUES (?)", (epi_name,))
+        return cursor.lastrowid
+
+    def _store_snapshot(self, camera, timestamp, frame_data, image_hash=None, thumbnail=None):
+        """Grava a imagem do evento (ou reaproveita uma quase igual) e retorna seu id."""
+        if image_hash is not None and self.dedup is not None:
+            snapshot_id = self.dedup.match(camera, image_hash)
+            if snapshot_id is not None:
+                return snapshot_id
+
+        cursor = self.execute_with_retry(
+            "INSERT INTO snapshots (camera, timestamp, image_hash, image, thumbnail) VALUES (?, ?, ?, ?, ?)",
+            (camera, timestamp, to_signed64(image_hash) if image_hash is not None else None, frame_data, thumbnail)
+        )
+        snapshot_id = cursor.lastrowid
+        if image_hash is not None and self.dedup is not None:
+            self.dedup.remember(camera, image_hash, snapshot_id)
+        return snapshot_id
+
+    def _write_detection(self, timestamp, missing_epis, found_classes, frame_data, clip_path=None,
+                         image_hash=None, camera=None, thumbnail=None, boxes=None):
+        if self.partitions is not None:
+            self._write_partitioned(timestamp, missing_epis, found_classes, frame_data, clip_path, image_hash,
+                                    camera, thumbnail, boxes)
+            return
+        try:
+            snapshot_id = None
+            if frame_data is not None and any(class_id in [4, 5, 6, 7] for class_id in found_classes):
+                snapshot_id = self._store_snapshot(camera, timestamp, frame_data, image_hash, thumbnail)
+
             for class_id in found_classes:
                 if class_id in [4, 5, 6, 7]:  # IDs das classes de EPIs ausentes
-                    epi_name = self.epi_mapping[class_id]
-                    
-                    # Verifica se o EPI já existe na tabela
-                    cursor = self.execute_with_retry("SELECT id FROM epis WHERE nome = ?", (epi_name,))
-                    epi_result = cursor.fetchone()
-                    
-                    if epi_result:
-                        epi_id = epi_result[0]
-                    else:
-                        cursor = self.execute_with_retry("INSERT INTO epis (nome) VALUES (?)", (epi_name,))
-                        epi_id = cursor.lastrowid
+                    epi_id = self._get_epi_id(self.epi_mapping[class_id])
 
-                    # Registra a detecção
-                    self.execute_with_retry(
-                        "INSERT INTO detections (timestamp, frame_data, epi_id) VALUES (?, ?, ?)",
-                        (timestamp, frame_data, epi_id)
-                    )
+                    # Registra a detecção; a imagem fica em snapshots
+                    detection_id = self.execute_with_retry(
+                        """INSERT INTO detections (timestamp, epi_id, clip_path, snapshot_id, camera_id, site)
+                        VALUES (?, ?, ?, ?, ?, ?)""",
+                        (timestamp, epi_id, clip_path, snapshot_id, camera, self.site)
+                    ).lastrowid
+                    rows = box_rows(detection_id, class_id, boxes)
+                    if rows:
+                        with closing(self.get_connection()) as conn:
+                            conn.executemany(
+                                "INSERT INTO detection_boxes VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                            )
 
             print(f"Detecção registrada com sucesso: {timestamp}, EPIs ausentes: {missing_epis}")
 
         except sqlite3.Error as e:
             print(f"Erro ao registrar detecção: {e}")
 
+    def _write_partitioned(self, timestamp, missing_epis, found_classes, frame_data, clip_path=None,
+                           image_hash=None, camera=None, thumbnail=None, boxes=None):
+        """Grava o evento na partição do mês e atualiza as contagens, em uma única transação."""
+        class_ids = [class_id for class_id in found_classes if class_id in [4, 5, 6, 7]]
+        if not class_ids:
+            return
+        month = month_of(timestamp)
+        try:
+            epi_ids = [self._get_epi_id(self.epi_mapping[class_id]) for class_id in class_ids]
+            snapshot_id = None
+            if frame_data is not None and image_hash is not None and self.dedup is not None:
+                snapshot_id = self.dedup.match(camera, image_hash)
+                if snapshot_id is not None and month_of_id(snapshot_id) != month:
+                    # A imagem parecida está na partição do mês anterior
+                    snapshot_id = None
+            new_snapshot = frame_data is not None and snapshot_id is None
+
+            with closing(self.get_connection()) as conn:
+                schema = self.partitions.attach_for_write(conn, month)
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if new_snapshot:
+                        snapshot_id = conn.execute(
+                            f"""INSERT INTO {schema}.snapshots (camera, timestamp, image_hash, image, thumbnail)
+                            VALUES (?, ?, ?, ?, ?)""",
+                            (camera, timestamp, to_signed64(image_hash) if image_hash is not None else None,
+                             frame_data, thumbnail)
+                        ).lastrowid
+                    for class_id, epi_id in zip(class_ids, epi_ids):
+                        detection_id = conn.execute(
+                            f"""INSERT INTO {schema}.detections (timestamp, epi_id, clip_path, snapshot_id, camera_id, site)
+                            VALUES (?, ?, ?, ?, ?, ?)""",
+                            (timestamp, epi_id, clip_path, snapshot_id, camera, self.site)
+                        ).lastrowid
+                        conn.executemany(
+                            f"INSERT INTO {schema}.detection_boxes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            box_rows(detection_id, class_id, boxes)
+                        )
+                    count_rows(conn, [(timestamp, epi_id, camera, self.site) for epi_id in epi_ids])
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+
+            if new_snapshot and image_hash is not None and self.dedup is not None:
+                self.dedup.remember(camera, image_hash, snapshot_id)
+            print(f"Detecção registrada com sucesso: {timestamp}, EPIs ausentes: {missing_epis}")
+
+        except sqlite3.Error as e:
+            print(f"Erro ao registrar detecção: {e}")
+
+    def log_detections_batch(self, detections, camera=None):
+        """
+        Grava várias detecções de uma vez, em uma única transação.
+
+        Usado pela análise em lote. Cada item é uma tupla
+        (timestamp, found_classes, frame_data, source_file, frame_time);
+        `camera` identifica a origem das linhas (ex.: a câmera que gravou os vídeos).
+        """
+        epi_ids = {}
+        events = []
+        for timestamp, found_classes, frame_data, source_file, frame_time in detections:
+            class_ids = [class_id for class_id in found_classes if class_id in [4, 5, 6, 7]]
+            for class_id in class_ids:
+                if class_id not in epi_ids:
+                    epi_ids[class_id] = self._get_epi_id(self.epi_mapping[class_id])
+            if class_ids:
+                events.append((timestamp, class_ids, frame_data, source_file, frame_time))
+
+        if not events:
+            return 0
+
+        # Com partições, uma transação por mês (na partição do mês)
+        groups = {}
+        for event in events:
+            groups.setdefault(month_of(event[0]) if self.partitions is not None else None, []).append(event)
+
+        rows = 0
+        try:
+            with closing(self.get_connection()) as conn:
+                for month, month_events in groups.items():
+                    schema = self.partitions.attach_for_write(conn, month) if month is not None else 'main'
+                    conn.execute("BEGIN")
+                    for timestamp, class_ids, frame_data, source_file, frame_time in month_events:
+                        snapshot_id = None
+                        if frame_data is not None:
+                            # Uma imagem por evento, compartilhada pelas linhas de cada classe
+                            snapshot_id = conn.execute(
+                                f"INSERT INTO {schema}.snapshots (camera, timestamp, image) VALUES (?, ?, ?)",
+                                (camera, timestamp, frame_data)
+                            ).lastrowid
+                        conn.executemany(
+                            f"""INSERT INTO {schema}.detections (timestamp, epi_id, source_file, frame_time, snapshot_id,
+                                                                  camera_id, site)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                            [(timestamp, epi_ids[class_id], source_file, frame_time, snapshot_id, camera, self.site)
+                             for class_id in class_ids]
+                        )
+                        if month is not None:
+                            count_rows(conn, [(timestamp, epi_ids[class_id], camera, self.site)
+                                              for class_id in class_ids])
+                    conn.execute("COMMIT")
+                    if month is not None:
+                        conn.execute(f"DETACH DATABASE {schema}")
+                    rows += sum(len(event[1]) for event in month_events)
+        except sqlite3.Error as e:
+            print(f"Erro ao registrar detecções em lote: {e}")
+        return rows
+
+    def log_inspections(self, rows):
+        """Grava os contadores de frames inspecionados (ver InspectionCounters) em uma thread separada."""
+        self.executor.submit(self._write_inspections, rows)
+
+    def _write_inspections(self, rows):
+        try:
+            with closing(self.get_connection()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                write_inspections(conn, rows)
+                conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"Erro ao registrar contadores de inspeção: {e}")
+
     def save_settings(self, **settings):
         try:
             with sqlite3.connect(self.database_path) as conn:
@@ -188,6 +432,10 @@ class DatabaseManager:
             print(f"Erro ao carregar configurações: {e}")
             return None
 
+    def close(self):
+        """Aguarda os registros pendentes e encerra o executor."""
+        self.executor.shutdown(wait=True)
+
     def __del__(self):
         """Garante que o executor seja fechado corretamente"""
         if hasattr(self, 'executor'):
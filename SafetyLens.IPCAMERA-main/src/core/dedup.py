@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+def dhash(frame, size=8):
+    """
+    Hash perceptual (dHash) de um frame, como inteiro de size*size bits.
+
+    O frame é reduzido para (size + 1) x size em tons de cinza e cada bit
+    indica se um pixel é mais claro que o vizinho à direita. Frames quase
+    iguais (mesma cena, pequenas variações de ruído ou compressão) geram
+    hashes a poucos bits de distância.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def to_signed64(value):
+    """Converte um hash de 64 bits para o intervalo do INTEGER do SQLite."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class SnapshotDeduplicator:
+    """
+    Lembra os hashes das últimas imagens de evidência de cada câmera.
+
+    match() retorna o id da imagem já gravada cujo hash está a no máximo
+    `max_distance` bits do novo, dentro de `window_seconds`; assim uma
+    violação que persiste reaproveita a mesma imagem em vez de gravar
+    cópias quase idênticas.
+    """
+
+    def __init__(self, max_distance=6, window_seconds=300.0, history=16):
+        self.max_distance = max_distance
+        self.window_seconds = window_seconds
+        self.history = history
+        self.hits = 0
+        self.misses = 0
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def match(self, camera, image_hash, now=None):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            recent = self._recent.get(camera)
+            if not recent:
+                self.misses += 1
+                return None
+            while recent and now - recent[0][0] > self.window_seconds:
+                recent.popleft()
+            for _, known_hash, snapshot_id in reversed(recent):
+                if hamming(known_hash, image_hash) <= self.max_distance:
+                    self.hits += 1
+                    return snapshot_id
+            self.misses += 1
+            return None
+
+    def remember(self, camera, image_hash, snapshot_id, now=None):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            recent = self._recent.get(camera)
+            if recent is None:
+                recent = self._recent[camera] = deque(maxlen=self.history)
+            recent.append((now, image_hash, snapshot_id))
@@ -1,10 +1,32 @@
+import threading
+import time
+
 import cv2
-from ultralytics import YOLO
 import numpy as np
 
+from src.core import buffers, performance
+
 class EPIDetector:
-    def __init__(self, model_path, min_confidence=0.5):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, min_confidence=0.5, model=None, lazy=False, service=None, verbose=True,
+                 tracking=False):
+        # Um modelo já carregado (ex.: StubModel) pode ser injetado diretamente;
+        # com lazy=True o carregamento fica para load_in_background(). Com
+        # `service` (um InferenceClient), o modelo fica no serviço de
+        # inferência compartilhado e este detector só envia os frames.
+        # verbose=False silencia o log de classes de cada frame em annotate()
+        # tracking=True usa model.track() e preenche o id de rastreamento das caixas
+        self.model_path = model_path
+        self.verbose = verbose
+        self.service = service
+        self.tracking = tracking
+        self.model = model
+        if self.model is None and not lazy:
+            self.model = service if service is not None else self.load_model(model_path)
+        self.ready = threading.Event()
+        if self.model is not None:
+            self.ready.set()
+        self.load_error = None
+        self._loader = None
         self.min_confidence = min_confidence
         # Mapeamento de classes com seus nomes corretos
         self.epi_mapping = {
@@ -20,8 +42,101 @@ class EPIDetector:
         # Define quais IDs representam EPIs ausentes
         self.ausentes_ids = {4, 5, 6, 7}  # Conjunto para busca mais eficiente
 
+    @staticmethod
+    def load_model(model_path):
+        # Importado só aqui: ultralytics carrega o torch, que leva segundos
+        from ultralytics import YOLO
+        # Quem carrega o modelo roda a inferência (inclusive sombra e troca em segundo plano)
+        performance.pin_thread('inference')
+        performance.configure_torch()
+        return YOLO(model_path)
+
+    @property
+    def is_ready(self):
+        return self.ready.is_set()
+
+    def load_in_background(self, warmup_shape=(720, 1280, 3), warmup_runs=2, on_ready=None, startup=None):
+        """
+        Carrega o modelo e faz inferências de aquecimento em uma thread.
+
+        on_ready(erro) é chamado ao final, na thread de carregamento, com
+        None em caso de sucesso. Chamadas repetidas não recarregam o modelo.
+        """
+        if self.is_ready or self._loader is not None:
+            return
+        self._loader = threading.Thread(
+            target=self._load_and_warm_up,
+            args=(warmup_shape, warmup_runs, on_ready, startup),
+            name="model-loader",
+            daemon=True
+        )
+        self._loader.start()
+
+    def _load_and_warm_up(self, warmup_shape, warmup_runs, on_ready, startup):
+        # O pool de threads do torch nasce nesta thread e herda a afinidade
+        performance.pin_thread('inference')
+        try:
+            start = time.perf_counter()
+            if self.service is not None:
+                # O serviço carrega e aquece o modelo; aqui só se espera por ele
+                model = self.service.wait_ready()
+                loaded = warmed = time.perf_counter()
+            else:
+                model = self.load_model(self.model_path)
+                loaded = time.perf_counter()
+                self.warm_up(model, warmup_shape, warmup_runs)
+                warmed = time.perf_counter()
+
+            self.model = model
+            self.ready.set()
+            if startup is not None:
+                startup.record('model_load', loaded - start)
+                startup.record('warmup', warmed - loaded)
+        except Exception as e:
+            self.load_error = e
+            print(f"❌ Erro ao carregar o modelo {self.model_path}: {e}")
+
+        if on_ready is not None:
+            on_ready(self.load_error)
+
+    @staticmethod
+    def warm_up(model, shape, runs=2):
+        # As primeiras inferências alocam memória e compilam kernels;
+        # feitas aqui, não atrasam os primeiros frames reais
+        blank = np.zeros(shape, dtype=np.uint8)
+        for _ in range(runs):
+            model(blank, verbose=False)
+
+    def swap_model(self, model, model_path=None):
+        """
+        Troca o modelo em uso por outro já carregado e aquecido.
+
+        A troca é uma única atribuição: o frame em inferência termina com o
+        modelo anterior e o seguinte já usa o novo, sem pausa no laço.
+        """
+        self.model = model
+        if model_path is not None:
+            self.model_path = model_path
+        self.ready.set()
+
     def detect(self, frame):
-        results = self.model(frame, verbose=False)
+        results = self.infer(frame)
+        return self.annotate(frame, results)
+
+    def detect_batch(self, frames):
+        """Detecta em vários frames com uma única chamada ao modelo."""
+        results = self.infer(frames)
+        return [self.annotate(frame, [result]) for frame, result in zip(frames, results)]
+
+    def infer(self, frame):
+        """Executa apenas a inferência do modelo."""
+        if self.tracking:
+            # persist=True mantém o rastreador (e os ids) entre os frames
+            return self.model.track(frame, persist=True, verbose=False)
+        return self.model(frame, verbose=False)
+
+    def annotate(self, frame, results):
+        """Filtra os resultados pela confiança e desenha as caixas no frame."""
         found_classes = []
         missing_epis = []
 
@@ -51,31 +166,129 @@ class EPIDetector:
                     if cls in self.ausentes_ids:
                         missing_epis.append(self.epi_mapping[cls])
 
-        print(f"Classes detectadas: {[self.epi_mapping[cls] for cls in found_classes]}")
+        if self.verbose:
+            print(f"Classes detectadas: {[self.epi_mapping[cls] for cls in found_classes]}")
         return frame, missing_epis, found_classes
 
+    def boxes(self, results, shape):
+        """
+        Caixas acima da confiança mínima, com coordenadas normalizadas (0 a 1).
+
+        Args:
+            results: Resultados de infer().
+            shape (tuple): Formato do frame (altura, largura, ...).
+
+        Returns:
+            list: Tuplas (classe, x1, y1, x2, y2, confiança, id de rastreamento ou None).
+        """
+        height, width = shape[:2]
+        boxes = []
+        for result in results:
+            for box in result.boxes:
+                conf = float(box.conf)
+                if conf <= self.min_confidence:
+                    continue
+                x1, y1, x2, y2 = (float(value) for value in box.xyxy[0])
+                # Só há id com rastreamento (tracking=True)
+                track_id = getattr(box, 'id', None)
+                boxes.append((int(box.cls[0]), x1 / width, y1 / height, x2 / width, y2 / height, conf,
+                              int(track_id[0]) if track_id is not None else None))
+        return boxes
+
     def update_min_confidence(self, value):
         self.min_confidence = value
 
+class _StubBox:
+    def __init__(self, cls, conf, xyxy):
+        self.cls = [cls]
+        self.conf = conf
+        self.xyxy = [xyxy]
+
+class _StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+class StubModel:
+    """
+    Modelo falso para benchmarks e testes sem o best.pt.
+
+    Gera caixas determinísticas a partir do número de chamadas, com um EPI
+    ausente a cada `violation_every` frames, e pode simular a latência da
+    inferência.
+    """
+
+    def __init__(self, latency=0.0, violation_every=10):
+        self.latency = latency
+        self.violation_every = violation_every
+        self.calls = 0
+
+    def __call__(self, frame, verbose=False):
+        if isinstance(frame, list):
+            return [self(item)[0] for item in frame]
+        self.calls += 1
+        h, w = frame.shape[:2]
+        boxes = [_StubBox(1, 0.9, (w * 0.1, h * 0.1, w * 0.3, h * 0.5))]
+        if self.violation_every and self.calls % self.violation_every == 0:
+            boxes.append(_StubBox(5, 0.85, (w * 0.5, h * 0.2, w * 0.7, h * 0.6)))
+        if self.latency:
+            time.sleep(self.latency)
+        return [_StubResult(boxes)]
+
 class ImageProcessor:
-    @staticmethod
-    def adjust_image(frame, brightness, contrast, sharpness, grayscale):
-        adjusted_frame = frame.copy()
-        
-        # Ajusta o brilho
-        adjusted_frame = cv2.convertScaleAbs(adjusted_frame, beta=brightness - 100)
-        
-        # Ajusta o contraste
-        adjusted_frame = cv2.convertScaleAbs(adjusted_frame, alpha=contrast / 100)
-        
-        # Aplica nitidez
-        if sharpness > 0:
+    """
+    Aplica os ajustes de imagem de um PipelineSettings.
+
+    Brilho e contraste viram uma única tabela (cv2.LUT) e o kernel de
+    nitidez é pré-calculado; ambos só são refeitos quando a versão dos
+    ajustes muda, não a cada frame. Com um FramePool, cada etapa escreve
+    em buffers do pool pelo parâmetro dst do OpenCV, sem alocar por frame.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._lut = None
+        self._kernel = None
+
+    def _prepare(self, settings):
+        # Passa todos os 256 níveis pelas mesmas operações de antes: o
+        # resultado da LUT é idêntico às duas chamadas a convertScaleAbs
+        levels = np.arange(256, dtype=np.uint8).reshape(1, 256)
+        levels = cv2.convertScaleAbs(levels, beta=settings.brightness - 100)
+        self._lut = cv2.convertScaleAbs(levels, alpha=settings.contrast / 100)
+
+        self._kernel = None
+        if settings.sharpness > 0:
             kernel = (1 / 16) * np.array([[1, 2, 1], [2, 4, 2], [1, 2, 1]])
-            adjusted_frame = cv2.filter2D(adjusted_frame, -1, kernel * sharpness)
-        
+            self._kernel = kernel * settings.sharpness
+        self._version = settings.version
+
+    def apply(self, frame, settings, pool=None):
+        """
+        Retorna o frame ajustado; o frame original não é alterado.
+
+        Com `pool`, o resultado é um buffer do pool e quem chamou passa a ser
+        o dono dele (buffers.release() ao terminar); sem pool, cada chamada
+        aloca um novo array.
+        """
+        if settings.version != self._version:
+            self._prepare(settings)
+        target = pool.acquire(frame.shape) if pool is not None else None
+
+        # Aplica brilho e contraste e, se houver, a nitidez
+        if self._kernel is not None:
+            lut_output = pool.scratch('lut', frame.shape) if pool is not None else None
+            lut_output = cv2.LUT(frame, self._lut, dst=lut_output)
+            adjusted_frame = cv2.filter2D(lut_output, -1, self._kernel, dst=target)
+        else:
+            adjusted_frame = cv2.LUT(frame, self._lut, dst=target)
+
         # Converte para escala de cinza se necessário
-        if grayscale:
-            adjusted_frame = cv2.cvtColor(adjusted_frame, cv2.COLOR_BGR2GRAY)
-            adjusted_frame = cv2.cvtColor(adjusted_frame, cv2.COLOR_GRAY2BGR)
-        
-        return adjusted_frame
\ No newline at end of file
+        if settings.grayscale:
+            gray = pool.scratch('gray', frame.shape[:2]) if pool is not None else None
+            gray = cv2.cvtColor(adjusted_frame, cv2.COLOR_BGR2GRAY, dst=gray)
+            adjusted_frame = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=adjusted_frame)
+
+        if target is not None and adjusted_frame is not target:
+            # O OpenCV alocou outro array (formato inesperado): o buffer volta ao pool
+            buffers.release(target)
+        return adjusted_frame
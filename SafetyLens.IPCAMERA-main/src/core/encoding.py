@@ -0,0 +1,167 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from src.core import performance
+
+try:
+    import simplejpeg
+except ImportError:  # Backend opcional (libjpeg-turbo)
+    simplejpeg = None
+
+try:
+    from turbojpeg import TJFLAG_PROGRESSIVE, TJPF_BGR, TJSAMP_420, TurboJPEG
+except ImportError:  # Backend opcional (PyTurboJPEG)
+    TurboJPEG = None
+
+# Artefatos codificados pelo sistema e sua política padrão
+DEFAULT_POLICIES = {
+    # Imagem de evidência gravada no banco
+    'evidence': {'max_width': 1280, 'max_height': None, 'quality': 85,
+                 'progressive': True, 'optimize': True, 'backend': 'opencv'},
+    # Miniatura da evidência, para listas e painéis
+    'thumbnail': {'max_width': 320, 'max_height': None, 'quality': 70,
+                  'progressive': False, 'optimize': True, 'backend': 'opencv'},
+    # Frames da transmissão MJPEG ao vivo
+    'stream': {'max_width': 640, 'max_height': None, 'quality': 70,
+               'progressive': False, 'optimize': False, 'backend': 'opencv'}
+}
+
+
+class EncodingPolicy:
+    """Resolução máxima, qualidade e opções do JPEG de um tipo de artefato."""
+
+    def __init__(self, max_width=None, max_height=None, quality=85, progressive=False, optimize=False,
+                 backend='opencv'):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = int(quality)
+        self.progressive = progressive
+        self.optimize = optimize
+        self.backend = _resolve_backend(backend)
+
+    def resize(self, frame):
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if self.max_width and width > self.max_width:
+            scale = self.max_width / width
+        if self.max_height and height * scale > self.max_height:
+            scale = self.max_height / height
+        if scale >= 1.0:
+            return frame
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def _resolve_backend(backend):
+    if backend == 'auto':
+        if simplejpeg is not None:
+            return 'simplejpeg'
+        return 'turbojpeg' if TurboJPEG is not None else 'opencv'
+    if backend == 'simplejpeg' and simplejpeg is None:
+        print("⚠️ simplejpeg não instalado; usando o OpenCV para codificar JPEG.")
+        return 'opencv'
+    if backend == 'turbojpeg' and TurboJPEG is None:
+        print("⚠️ PyTurboJPEG não instalado; usando o OpenCV para codificar JPEG.")
+        return 'opencv'
+    return backend
+
+
+class JPEGEncoder:
+    """
+    Codifica frames em JPEG conforme a política de cada artefato.
+
+    encode() codifica na thread atual; encode_many() distribui vários
+    artefatos do mesmo frame (ex.: evidência e miniatura) no pool
+    compartilhado. Bytes e tempo de cada artefato são acumulados para o
+    endpoint de métricas e o benchmark.
+    """
+
+    def __init__(self, policies=None, workers=2):
+        self.policies = {}
+        for artifact, defaults in DEFAULT_POLICIES.items():
+            settings = dict(defaults)
+            settings.update((policies or {}).get(artifact) or {})
+            self.policies[artifact] = EncodingPolicy(**settings)
+        self._turbo = None
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix='jpeg',
+            initializer=performance.pin_thread, initargs=('encode',)
+        )
+
+    def encode(self, artifact, frame):
+        """Retorna os bytes JPEG do frame para o artefato, ou None em caso de erro."""
+        policy = self.policies[artifact]
+        start = time.perf_counter()
+        try:
+            jpeg = self._encode(policy, policy.resize(frame))
+        except Exception as e:
+            print(f"Erro ao codificar JPEG ({artifact}): {e}")
+            return None
+        self._record(artifact, len(jpeg), time.perf_counter() - start)
+        return jpeg
+
+    def encode_many(self, frame, artifacts):
+        """Codifica vários artefatos do mesmo frame em paralelo; retorna {artefato: bytes}."""
+        futures = {artifact: self._pool.submit(self.encode, artifact, frame) for artifact in artifacts}
+        return {artifact: future.result() for artifact, future in futures.items()}
+
+    def _encode(self, policy, frame):
+        if policy.backend == 'simplejpeg':
+            # simplejpeg não gera JPEG progressivo; usa a DCT precisa para manter a qualidade
+            return simplejpeg.encode_jpeg(np.ascontiguousarray(frame), quality=policy.quality,
+                                          colorspace='BGR', colorsubsampling='420', fastdct=False)
+        if policy.backend == 'turbojpeg':
+            if self._turbo is None:
+                self._turbo = TurboJPEG()
+            flags = TJFLAG_PROGRESSIVE if policy.progressive else 0
+            return self._turbo.encode(frame, quality=policy.quality, pixel_format=TJPF_BGR,
+                                      jpeg_subsample=TJSAMP_420, flags=flags)
+
+        params = [cv2.IMWRITE_JPEG_QUALITY, policy.quality]
+        if policy.progressive:
+            params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+        if policy.optimize:
+            params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        ok, encoded = cv2.imencode('.jpg', frame, params)
+        if not ok:
+            raise ValueError("cv2.imencode falhou")
+        return encoded.tobytes()
+
+    def _record(self, artifact, size, seconds):
+        with self._lock:
+            stats = self._stats.setdefault(artifact, [0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += size
+            stats[2] += seconds
+
+    def report(self):
+        """Média de bytes e de tempo de codificação por artefato."""
+        with self._lock:
+            stats = {artifact: list(values) for artifact, values in self._stats.items()}
+        return {
+            artifact: {
+                'count': count,
+                'avg_bytes': round(total_bytes / count) if count else 0,
+                'avg_ms': round(seconds / count * 1000, 3) if count else 0.0
+            }
+            for artifact, (count, total_bytes, seconds) in stats.items()
+        }
+
+    def register_metrics(self, registry):
+        registry.register_gauge(
+            'safetylens_jpeg_bytes_avg', "Tamanho médio do JPEG por tipo de artefato (bytes)",
+            lambda: {(('artifact', artifact),): values['avg_bytes'] for artifact, values in self.report().items()}
+        )
+        registry.register_gauge(
+            'safetylens_jpeg_encode_ms_avg', "Tempo médio de codificação JPEG por tipo de artefato (ms)",
+            lambda: {(('artifact', artifact),): values['avg_ms'] for artifact, values in self.report().items()}
+        )
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,129 @@
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+def heatmap_path(directory, camera):
+    """Arquivo .npy do mapa de calor da câmera."""
+    return os.path.join(directory, re.sub(r'[^A-Za-z0-9_.-]', '_', camera) + '.npy')
+
+
+def load_heatmap(directory, camera):
+    """Grade salva da câmera, ou None se ainda não existir."""
+    try:
+        return np.load(heatmap_path(directory, camera))
+    except (OSError, ValueError):
+        return None
+
+
+def accumulate(grid, boxes):
+    """Soma 1 às células cobertas por cada caixa (x1, y1, x2, y2 normalizados de 0 a 1)."""
+    height, width = grid.shape
+    for x1, y1, x2, y2 in boxes:
+        left = min(width - 1, max(0, int(x1 * width)))
+        top = min(height - 1, max(0, int(y1 * height)))
+        right = min(width, max(left + 1, math.ceil(x2 * width)))
+        bottom = min(height, max(top + 1, math.ceil(y2 * height)))
+        grid[top:bottom, left:right] += 1
+
+
+def render_heatmap(grid, background=None, width=640, quality=85):
+    """
+    Desenha a grade como JPEG colorido, sobre a imagem de fundo se houver.
+
+    Args:
+        grid (numpy.ndarray): Grade do mapa de calor.
+        background (bytes): JPEG da câmera usado como fundo (opcional).
+        width (int): Largura da imagem gerada.
+        quality (int): Qualidade do JPEG.
+    """
+    peak = float(grid.max()) if grid.size else 0.0
+    levels = np.zeros(grid.shape, dtype=np.uint8)
+    if peak > 0:
+        levels = (grid * (255.0 / peak)).astype(np.uint8)
+
+    image = None
+    if background:
+        image = cv2.imdecode(np.frombuffer(background, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is not None:
+        height = max(1, round(image.shape[0] * width / image.shape[1]))
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    else:
+        height = max(1, round(width * grid.shape[0] / grid.shape[1]))
+
+    colored = cv2.applyColorMap(cv2.resize(levels, (width, height), interpolation=cv2.INTER_LINEAR),
+                                cv2.COLORMAP_JET)
+    if image is not None:
+        colored = cv2.addWeighted(image, 0.5, colored, 0.5, 0)
+    ok, encoded = cv2.imencode('.jpg', colored, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("cv2.imencode falhou")
+    return encoded.tobytes()
+
+
+class HeatmapAccumulator:
+    """
+    Mapas de calor das violações, um por câmera, em uma grade reduzida.
+
+    add() soma as caixas de violação de cada frame à grade da câmera (`width` x
+    `height` células) sem decodificar nenhuma imagem. As grades alteradas
+    são gravadas em `directory/<camera>.npy` a cada `save_interval`
+    segundos e em save(), de forma atômica, e são recarregadas ao
+    reiniciar, continuando a acumulação.
+    """
+
+    def __init__(self, directory, width=64, height=36, save_interval=60.0):
+        self.directory = directory
+        self.width = width
+        self.height = height
+        self.save_interval = save_interval
+        self._grids = {}
+        self._dirty = set()
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _grid(self, camera):
+        grid = self._grids.get(camera)
+        if grid is None:
+            grid = load_heatmap(self.directory, camera)
+            if grid is None or grid.shape != (self.height, self.width):
+                grid = np.zeros((self.height, self.width), dtype=np.float32)
+            self._grids[camera] = grid
+        return grid
+
+    def add(self, camera, boxes):
+        """Soma as caixas (tuplas de EPIDetector.boxes()) ao mapa da câmera."""
+        with self._lock:
+            accumulate(self._grid(camera), [box[1:5] for box in boxes])
+            self._dirty.add(camera)
+            due = time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def grid(self, camera):
+        """Cópia da grade atual da câmera."""
+        with self._lock:
+            return self._grid(camera).copy()
+
+    def save(self):
+        with self._lock:
+            grids = {camera: self._grids[camera].copy() for camera in self._dirty}
+            self._dirty.clear()
+            self._last_save = time.monotonic()
+        for camera, grid in grids.items():
+            fd, temp_path = tempfile.mkstemp(prefix='.heatmap-', suffix='.npy', dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, grid)
+                os.replace(temp_path, heatmap_path(self.directory, camera))
+            except OSError as e:
+                print(f"Erro ao salvar o mapa de calor de {camera}: {e}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
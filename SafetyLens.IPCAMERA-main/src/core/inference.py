@@ -0,0 +1,424 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from src.core import performance
+
+
+class InferenceError(RuntimeError):
+    """
+    O serviço respondeu com erro (ex.: modelo carregando, falha no lote).
+
+    Não é um erro de conexão: o pedido chegou e foi processado, então o
+    cliente não o repete.
+    """
+
+
+def service_supported():
+    # Sockets Unix: Linux e macOS (no Windows, cada processo usa o próprio modelo)
+    return hasattr(socket, 'AF_UNIX')
+
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n')
+
+
+def _attach(name):
+    """Abre um bloco de memória compartilhada criado por outro processo, sem assumir a posse."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: o resource_tracker apagaria o bloco do cliente ao encerrar
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def serialize_results(results):
+    """Caixas de um resultado do modelo como listas [classe, confiança, x1, y1, x2, y2, id ou None]."""
+    boxes = []
+    for result in results:
+        for box in result.boxes:
+            track_id = getattr(box, 'id', None)
+            boxes.append([int(box.cls[0]), float(box.conf), *(float(value) for value in box.xyxy[0]),
+                          int(track_id[0]) if track_id is not None else None])
+    return boxes
+
+
+class RemoteBox:
+    """Caixa recebida do serviço, com os mesmos campos usados de uma caixa do ultralytics."""
+
+    __slots__ = ('cls', 'conf', 'xyxy', 'id')
+
+    def __init__(self, cls, conf, x1, y1, x2, y2, track_id=None):
+        self.cls = [cls]
+        self.conf = conf
+        self.xyxy = [(x1, y1, x2, y2)]
+        self.id = [track_id] if track_id is not None else None
+
+
+class RemoteResult:
+    def __init__(self, boxes):
+        self.boxes = [RemoteBox(*box) for box in boxes]
+
+
+class _Request:
+    __slots__ = ('connection', 'id', 'frame', 'arrived')
+
+    def __init__(self, connection, request_id, frame):
+        self.connection = connection
+        self.id = request_id
+        self.frame = frame
+        self.arrived = time.perf_counter()
+
+
+class _Connection:
+    """Um cliente conectado: o socket e os blocos de memória compartilhada que ele usa."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.segments = {}
+        self.lock = threading.Lock()
+
+    def frame(self, name, shape):
+        segment = self.segments.get(name)
+        if segment is None:
+            segment = self.segments[name] = _attach(name)
+        return np.ndarray(tuple(shape), dtype=np.uint8, buffer=segment.buf)
+
+    def release(self, name):
+        segment = self.segments.pop(name, None)
+        if segment is not None:
+            try:
+                segment.close()
+            except BufferError:
+                pass
+
+    def reply(self, message):
+        with self.lock:
+            try:
+                _send(self.sock, message)
+            except OSError:
+                pass
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        for segment in self.segments.values():
+            try:
+                segment.close()
+            except BufferError:
+                # Ainda referenciado por um lote em andamento; o GC libera depois
+                pass
+        self.segments = {}
+
+
+class InferenceServer:
+    """
+    Serviço de inferência local: um único modelo para vários processos.
+
+    Os clientes (InferenceClient) se conectam por um socket Unix e enviam
+    apenas um cabeçalho JSON por frame; os pixels ficam em um bloco de
+    memória compartilhada criado pelo cliente e são lidos sem cópia. Os
+    pedidos de todos os clientes entram em uma única fila, e o agendador
+    monta micro-lotes por prazo: o lote parte quando tem `max_batch`
+    frames ou quando o pedido mais antigo completa `max_wait` segundos de
+    espera, o que vier primeiro. Sem concorrência, um frame espera no
+    máximo `max_wait`; com vários clientes, o modelo roda lotes maiores e
+    aproveita melhor cada chamada.
+
+    O modelo é o de um EPIDetector, então a carga em segundo plano e a
+    troca a quente (ModelManager) funcionam como no pipeline.
+    """
+
+    def __init__(self, detector, socket_path, max_batch=8, max_wait=0.005, on_batch=None):
+        self.detector = detector
+        self.socket_path = socket_path
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait
+        # Chamado com (frames, resultados, segundos) após cada lote (ex.: modo sombra)
+        self.on_batch = on_batch
+        self.batches = 0
+        self.frames = 0
+        self.clients = 0
+        self._clients_lock = threading.Lock()
+        self.batch_sizes = {}
+        self._queue = queue.Queue()
+        self._running = False
+        self._sock = None
+        self._threads = []
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            # Socket de uma execução anterior; se outro serviço estiver ativo, connect funciona
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                raise OSError(f"Já existe um serviço de inferência em {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(self.socket_path)
+            finally:
+                probe.close()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.socket_path)
+        self._sock.listen(16)
+        self._running = True
+        for target, name in ((self._accept_loop, "inference-accept"), (self._schedule_loop, "inference-batcher")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"🧠 Serviço de inferência em {self.socket_path} (lote máx. {self.max_batch}, "
+              f"espera máx. {self.max_wait * 1000:.1f} ms)")
+
+    def stop(self):
+        self._running = False
+        if self._sock is not None:
+            try:
+                # Acorda o accept() bloqueado na outra thread
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                sock, _ = self._sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(_Connection(sock),), name="inference-client",
+                             daemon=True).start()
+
+    def _serve(self, connection):
+        with self._clients_lock:
+            self.clients += 1
+        try:
+            reader = connection.sock.makefile('rb')
+            for line in reader:
+                request = json.loads(line)
+                op = request.get('op')
+                if op == 'infer':
+                    if not self.detector.is_ready:
+                        connection.reply({'id': request['id'], 'error': 'modelo carregando'})
+                        continue
+                    frame = connection.frame(request['shm'], request['shape'])
+                    self._queue.put(_Request(connection, request['id'], frame))
+                elif op == 'release':
+                    connection.release(request['shm'])
+                elif op == 'status':
+                    connection.reply({'ready': self.detector.is_ready, 'model': self.detector.model_path,
+                                      'max_batch': self.max_batch})
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self._running:
+                print(f"Cliente de inferência desconectado: {e}")
+        finally:
+            with self._clients_lock:
+                self.clients -= 1
+            connection.close()
+
+    def _schedule_loop(self):
+        performance.pin_thread('inference')
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            # O prazo conta desde a chegada do pedido mais antigo, não desde agora
+            deadline = first.arrived + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                batch.append(request)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        frames = [request.frame for request in batch]
+        start = time.perf_counter()
+        try:
+            results = self.detector.infer(frames)
+        except Exception as e:
+            print(f"❌ Erro na inferência em lote: {e}")
+            for request in batch:
+                request.connection.reply({'id': request.id, 'error': str(e)})
+            return
+        seconds = time.perf_counter() - start
+        for request, result in zip(batch, results):
+            request.connection.reply({'id': request.id, 'boxes': serialize_results([result])})
+        self.batches += 1
+        self.frames += len(batch)
+        self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+        if self.on_batch is not None:
+            self.on_batch(frames, results, seconds)
+
+    def register_metrics(self, metrics):
+        metrics.register_gauge(
+            'safetylens_inference_batches', "Lotes executados pelo serviço de inferência, por tamanho",
+            lambda: {(('size', str(size)),): count for size, count in sorted(self.batch_sizes.items())}
+        )
+        metrics.register_gauge(
+            'safetylens_inference_clients', "Clientes conectados ao serviço de inferência",
+            lambda: self.clients
+        )
+        metrics.register_gauge(
+            'safetylens_inference_queue_depth', "Frames aguardando um lote no serviço de inferência",
+            self._queue.qsize
+        )
+
+
+class InferenceClient:
+    """
+    Cliente do InferenceServer, usado no lugar do modelo em um EPIDetector.
+
+    Tem a mesma interface de chamada de um modelo YOLO (client(frame) ou
+    client([frames]) devolve os resultados), então EPIDetector, annotate()
+    e boxes() funcionam sem mudanças. Cada frame é copiado para um bloco de
+    memória compartilhada deste cliente (um por frame de um lote, reusados
+    entre chamadas) e só o cabeçalho passa pelo socket. Os frames de um
+    lote são enviados juntos, para que o serviço os agrupe com os de outros
+    clientes.
+    """
+
+    def __init__(self, socket_path, timeout=5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._segments = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+
+    def _disconnect(self):
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+        self._sock = None
+        self._reader = None
+
+    def _receive(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("O serviço de inferência encerrou a conexão")
+        return json.loads(line)
+
+    def status(self):
+        """Estado do serviço ({'ready': ..., 'model': ...}); ConnectionError se não estiver no ar."""
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self.connect()
+                _send(self._sock, {'op': 'status'})
+                return self._receive()
+            except (OSError, ValueError) as e:
+                self._disconnect()
+                raise ConnectionError(f"Serviço de inferência indisponível em {self.socket_path}: {e}") from e
+
+    def wait_ready(self, interval=0.5):
+        """Aguarda o serviço subir e terminar de carregar o modelo; retorna o próprio cliente."""
+        waiting = False
+        while True:
+            try:
+                if self.status().get('ready'):
+                    return self
+            except ConnectionError:
+                pass
+            if not waiting:
+                print(f"⏳ Aguardando o serviço de inferência em {self.socket_path}...")
+                waiting = True
+            time.sleep(interval)
+
+    def _segment(self, index, size):
+        while len(self._segments) <= index:
+            self._segments.append(None)
+        segment = self._segments[index]
+        if segment is None or segment.size < size:
+            if segment is not None:
+                # Frame maior (ex.: mudança de resolução): o serviço solta o bloco antigo
+                _send(self._sock, {'op': 'release', 'shm': segment.name})
+                segment.close()
+                segment.unlink()
+            segment = self._segments[index] = shared_memory.SharedMemory(create=True, size=size)
+        return segment
+
+    def __call__(self, frame, verbose=False):
+        frames = frame if isinstance(frame, list) else [frame]
+        with self._lock:
+            # Uma nova tentativa após reconectar (ex.: serviço reiniciado)
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self.connect()
+                    return self._infer(frames)
+                except (OSError, ValueError) as e:
+                    self._disconnect()
+                    # Após um timeout o serviço ainda pode estar lendo os blocos
+                    # enviados: a nova tentativa usa blocos novos
+                    self._discard_segments()
+                    if attempt:
+                        raise ConnectionError(f"Serviço de inferência indisponível em {self.socket_path}: {e}") from e
+
+    def _infer(self, frames):
+        ids = []
+        for index, frame in enumerate(frames):
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+            segment = self._segment(index, frame.nbytes)
+            np.ndarray(frame.shape, dtype=np.uint8, buffer=segment.buf)[...] = frame
+            self._next_id += 1
+            ids.append(self._next_id)
+            _send(self._sock, {'op': 'infer', 'id': self._next_id, 'shm': segment.name, 'shape': frame.shape})
+
+        replies = {}
+        while len(replies) < len(ids):
+            reply = self._receive()
+            replies[reply.get('id')] = reply
+        results = []
+        for request_id in ids:
+            reply = replies[request_id]
+            if 'error' in reply:
+                raise InferenceError(f"Serviço de inferência: {reply['error']}")
+            results.append(RemoteResult(reply['boxes']))
+        return results
+
+    def _discard_segments(self):
+        # O serviço mantém o próprio mapeamento até fechar a conexão; aqui só
+        # o nome é removido e a memória é liberada quando ninguém mais a usa
+        for segment in self._segments:
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+        self._segments = []
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+            self._discard_segments()
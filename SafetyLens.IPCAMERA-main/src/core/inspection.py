@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import datetime
+
+
+def ensure_inspection_table(conn):
+    """Cria a tabela com os contadores de frames inspecionados por minuto e câmera."""
+    conn.execute("""CREATE TABLE IF NOT EXISTS inspection_counts (
+        minute TEXT NOT NULL,
+        camera_id TEXT NOT NULL DEFAULT '',
+        site TEXT NOT NULL DEFAULT '',
+        frames INTEGER NOT NULL DEFAULT 0,
+        frames_detected INTEGER NOT NULL DEFAULT 0,
+        frames_violation INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (minute, camera_id, site)
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inspection_counts_camera ON inspection_counts (camera_id, minute)")
+
+
+def write_inspections(conn, rows):
+    """Soma as linhas (minuto, câmera, site, frames, com detecção, com violação) em inspection_counts."""
+    conn.executemany(
+        """INSERT INTO inspection_counts (minute, camera_id, site, frames, frames_detected, frames_violation)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(minute, camera_id, site) DO UPDATE SET
+            frames = frames + excluded.frames,
+            frames_detected = frames_detected + excluded.frames_detected,
+            frames_violation = frames_violation + excluded.frames_violation""",
+        rows
+    )
+
+
+class InspectionCounters:
+    """
+    Contadores por minuto dos frames inspecionados, por câmera.
+
+    record() é chamado no laço de frames e só incrementa os contadores do
+    minuto atual: frames inspecionados, frames com pessoas ou EPIs
+    detectados e frames com alguma violação. Quando o minuto muda, os
+    minutos fechados são entregues a `flush` (ex.: log_inspections do
+    DatabaseManager), uma linha por câmera e minuto, em vez de uma linha por
+    frame conforme. As linhas são somadas no banco, então um minuto gravado
+    em duas partes (ex.: ao reiniciar) continua correto.
+    """
+
+    def __init__(self, flush, site=None):
+        self.flush_callback = flush
+        self.site = site or ''
+        self._buckets = {}
+        self._minute = None
+        self._lock = threading.Lock()
+
+    def record(self, camera, detected, violation, timestamp=None):
+        """Conta um frame inspecionado da câmera no minuto do timestamp (time.time())."""
+        minute = int((timestamp if timestamp is not None else time.time()) // 60)
+        with self._lock:
+            counts = self._buckets.get((minute, camera))
+            if counts is None:
+                counts = self._buckets[(minute, camera)] = [0, 0, 0]
+            counts[0] += 1
+            if detected:
+                counts[1] += 1
+            if violation:
+                counts[2] += 1
+            rolled_over = self._minute is not None and minute > self._minute
+            if self._minute is None or minute > self._minute:
+                self._minute = minute
+        if rolled_over:
+            self.flush(before=minute)
+
+    def flush(self, before=None):
+        """Entrega os minutos anteriores a `before` (ou todos, inclusive o atual)."""
+        with self._lock:
+            keys = [key for key in self._buckets if before is None or key[0] < before]
+            buckets = {key: self._buckets.pop(key) for key in keys}
+        if not buckets:
+            return
+        rows = [
+            (datetime.fromtimestamp(minute * 60).strftime("%Y-%m-%d %H:%M:00"), camera or '', self.site, *counts)
+            for (minute, camera), counts in sorted(buckets.items())
+        ]
+        self.flush_callback(rows)
@@ -0,0 +1,247 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Etapas instrumentadas do pipeline, na ordem em que ocorrem
+STAGES = ('capture', 'adjust', 'inference', 'postprocess', 'display', 'encode', 'alert_encode', 'db_write')
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyWindow:
+    """
+    Guarda as últimas latências de uma etapa em uma janela circular.
+
+    A gravação custa um append em deque; os percentis só são calculados
+    quando alguém consulta (endpoint ou barra de status).
+    """
+
+    def __init__(self, size=1024):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def percentiles(self, quantiles=QUANTILES):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {q: 0.0 for q in quantiles}
+        last = len(samples) - 1
+        return {q: samples[min(last, int(round(q * last)))] for q in quantiles}
+
+
+class CameraMetrics:
+    """Contadores e latências de uma câmera."""
+
+    def __init__(self, window_size=1024):
+        self.window_size = window_size
+        self.stages = {}
+        self.frames = 0
+        self.dropped = {}
+        # Instantes dos últimos frames, para calcular o FPS
+        self._frame_times = deque(maxlen=64)
+
+    def stage(self, name):
+        window = self.stages.get(name)
+        if window is None:
+            window = self.stages.setdefault(name, LatencyWindow(self.window_size))
+        return window
+
+    def mark_frame(self, now=None):
+        self.frames += 1
+        self._frame_times.append(now if now is not None else time.perf_counter())
+
+    def mark_dropped(self, reason, count=1):
+        self.dropped[reason] = self.dropped.get(reason, 0) + count
+
+    @property
+    def fps(self):
+        times = list(self._frame_times)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        # Sem frames recentes o FPS cai para zero
+        if time.perf_counter() - times[-1] > 2.0:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas do processo.
+
+    Latências são registradas com observe(camera, etapa, segundos), medidas
+    com time.perf_counter() por quem chama. Valores que já existem em outros
+    objetos (filas, backlog do banco) são lidos por callbacks apenas na hora
+    da exportação, sem custo no caminho do frame.
+    """
+
+    def __init__(self, window_size=1024):
+        self.window_size = window_size
+        self._cameras = {}
+        self._gauges = []
+        self._lock = threading.Lock()
+
+    def camera(self, name):
+        metrics = self._cameras.get(name)
+        if metrics is None:
+            with self._lock:
+                metrics = self._cameras.setdefault(name, CameraMetrics(self.window_size))
+        return metrics
+
+    def observe(self, camera, stage, seconds):
+        self.camera(camera).stage(stage).observe(seconds)
+
+    def mark_frame(self, camera):
+        self.camera(camera).mark_frame()
+
+    def mark_dropped(self, camera, reason, count=1):
+        self.camera(camera).mark_dropped(reason, count)
+
+    def register_gauge(self, name, help_text, callback):
+        """
+        Registra um gauge lido sob demanda.
+
+        O callback retorna um número ou um dicionário {labels: valor}, onde
+        labels é uma tupla de pares (nome, valor).
+        """
+        self._gauges.append((name, help_text, callback))
+
+    def summary(self, camera):
+        """Resumo curto para a barra de status da interface."""
+        metrics = self.camera(camera)
+        inference = metrics.stage('inference').percentiles()
+        return (f"{metrics.fps:.1f} FPS | inferência p50 {inference[0.5] * 1000:.0f} ms"
+                f" / p95 {inference[0.95] * 1000:.0f} ms")
+
+    def render_prometheus(self):
+        """Exporta as métricas no formato texto do Prometheus."""
+        lines = [
+            "# HELP safetylens_stage_latency_seconds Latência por etapa do pipeline",
+            "# TYPE safetylens_stage_latency_seconds summary",
+        ]
+        with self._lock:
+            cameras = list(self._cameras.items())
+
+        for camera, metrics in cameras:
+            for stage, window in list(metrics.stages.items()):
+                labels = f'camera="{_escape(camera)}",stage="{stage}"'
+                for q, value in window.percentiles().items():
+                    lines.append(f'safetylens_stage_latency_seconds{{{labels},quantile="{q}"}} {value:.6f}')
+                lines.append(f"safetylens_stage_latency_seconds_sum{{{labels}}} {window.total:.6f}")
+                lines.append(f"safetylens_stage_latency_seconds_count{{{labels}}} {window.count}")
+
+        lines.append("# HELP safetylens_frames_total Frames processados")
+        lines.append("# TYPE safetylens_frames_total counter")
+        for camera, metrics in cameras:
+            lines.append(f'safetylens_frames_total{{camera="{_escape(camera)}"}} {metrics.frames}')
+
+        lines.append("# HELP safetylens_frames_dropped_total Frames descartados")
+        lines.append("# TYPE safetylens_frames_dropped_total counter")
+        for camera, metrics in cameras:
+            for reason, count in list(metrics.dropped.items()):
+                lines.append(f'safetylens_frames_dropped_total{{camera="{_escape(camera)}",reason="{reason}"}} {count}')
+
+        lines.append("# HELP safetylens_fps Frames por segundo")
+        lines.append("# TYPE safetylens_fps gauge")
+        for camera, metrics in cameras:
+            lines.append(f'safetylens_fps{{camera="{_escape(camera)}"}} {metrics.fps:.2f}')
+
+        for name, help_text, callback in self._gauges:
+            try:
+                value = callback()
+            except Exception as e:
+                print(f"Erro ao ler métrica {name}: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                for labels, item in value.items():
+                    label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+                    lines.append(f"{name}{{{label_text}}} {item}")
+            else:
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class StartupTimer:
+    """
+    Mede as fases da inicialização (imports, interface, câmera, modelo).
+
+    Cada fase é impressa assim que termina; fases concluídas em outras
+    threads (carga do modelo) usam record() diretamente.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.phases[name] = seconds
+        print(f"⏱️ Inicialização - {name}: {seconds:.2f}s")
+
+    def mark(self, name):
+        """Registra um marco medido desde o início do processo (ex.: primeiro frame)."""
+        if name not in self.phases:
+            self.record(name, time.perf_counter() - self.started)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsServer:
+    """Servidor HTTP local que expõe /metrics no formato do Prometheus."""
+
+    def __init__(self, registry, host='127.0.0.1', port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"📊 Métricas disponíveis em http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,448 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+from src.core.metrics import LatencyWindow
+
+MODEL_FILE = 'model.pt'
+VERSION_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+def registry_model_path(directory, version):
+    """Arquivo do modelo de uma versão do registro."""
+    return os.path.join(directory, str(version), MODEL_FILE)
+
+
+def _write_json(path, data):
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(prefix='.model-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Diretório com as versões do modelo de detecção.
+
+    Cada versão fica em `<directory>/<versão>/`, com o modelo (model.pt),
+    um info.json (origem, data, notas) e, depois de avaliada em modo
+    sombra, o shadow.json com latência e concordância. Qual versão está em
+    uso é decidido em config.yaml (models.active), não no registro.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, version):
+        return registry_model_path(self.directory, version)
+
+    def versions(self):
+        """Versões com modelo no registro, em ordem alfabética."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(name for name in names if os.path.isfile(self.path(name)))
+
+    def add(self, source, version=None, notes=''):
+        """
+        Copia um modelo para o registro e retorna a versão criada.
+
+        Sem `version`, usa a data e hora atuais (ex.: 20261019-143000). O
+        modelo é copiado para um diretório temporário e renomeado no final,
+        então uma versão nunca aparece pela metade.
+        """
+        version = str(version or time.strftime('%Y%m%d-%H%M%S'))
+        if not VERSION_PATTERN.match(version):
+            raise ValueError(f"Versão inválida: {version!r} (use letras, números, '.', '_' e '-')")
+        target = os.path.join(self.directory, version)
+        if os.path.exists(target):
+            raise ValueError(f"A versão {version} já existe no registro")
+        os.makedirs(self.directory, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix='.version-', dir=self.directory)
+        try:
+            shutil.copy2(source, os.path.join(temp_dir, MODEL_FILE))
+            _write_json(os.path.join(temp_dir, 'info.json'), {
+                'version': version,
+                'source': os.path.abspath(source),
+                'added': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'notes': notes
+            })
+            os.rename(temp_dir, target)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        return version
+
+    def info(self, version):
+        return _read_json(os.path.join(self.directory, str(version), 'info.json')) or {}
+
+    def report(self, version):
+        """Último relatório do modo sombra da versão, ou None."""
+        return _read_json(os.path.join(self.directory, str(version), 'shadow.json'))
+
+    def save_report(self, version, report):
+        _write_json(os.path.join(self.directory, str(version), 'shadow.json'), report)
+
+
+def box_iou(a, b):
+    """IoU entre duas caixas (x1, y1, x2, y2)."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def box_agreement(active, candidate, iou=0.5):
+    """
+    Concordância entre as caixas de dois modelos no mesmo frame (F1, de 0 a 1).
+
+    Cada caixa do modelo ativo é pareada com a caixa ainda livre do
+    candidato de mesma classe e maior IoU, desde que IoU >= `iou`. Frames
+    sem caixas nos dois modelos contam como concordância total.
+    """
+    if not active and not candidate:
+        return 1.0
+    used = set()
+    matched = 0
+    for box in active:
+        best, best_iou = None, iou
+        for index, other in enumerate(candidate):
+            if index in used or other[0] != box[0]:
+                continue
+            value = box_iou(box[1:5], other[1:5])
+            if value >= best_iou:
+                best, best_iou = index, value
+        if best is not None:
+            used.add(best)
+            matched += 1
+    return 2 * matched / (len(active) + len(candidate))
+
+
+def _latency_summary(window):
+    percentiles = window.percentiles((0.5, 0.95))
+    return {
+        'mean_ms': round(window.total / window.count * 1000, 2) if window.count else 0.0,
+        'p50_ms': round(percentiles[0.5] * 1000, 2),
+        'p95_ms': round(percentiles[0.95] * 1000, 2)
+    }
+
+
+class ShadowEvaluator:
+    """
+    Avalia um modelo candidato em uma fração dos frames ao vivo.
+
+    O candidato é carregado e aquecido em uma thread própria. Depois disso,
+    offer() é chamado no laço de frames com os resultados do modelo ativo e
+    separa, em média, `sample_rate` dos frames; o frame separado é copiado
+    para uma fila de uma posição e processado por outra thread. Se o
+    candidato ainda estiver ocupado com o frame anterior, o novo é ignorado,
+    então o laço de frames nunca espera pelo modo sombra.
+
+    Para cada frame avaliado são medidas a latência do candidato (comparada
+    à do modelo ativo no mesmo frame), a concordância das caixas
+    (box_agreement) e se os dois modelos concordam sobre haver violação.
+    """
+
+    def __init__(self, detector, version, model_path, warmup_shape, sample_rate=0.1, iou=0.5,
+                 registry=None, active_version=None, report_interval=30.0):
+        self.detector = detector
+        self.version = version
+        self.model_path = model_path
+        self.sample_rate = sample_rate
+        self.iou = iou
+        self.registry = registry
+        self.active_version = active_version
+        self.report_interval = report_interval
+        self.model = None
+        self.load_error = None
+        self.ready = threading.Event()
+        self.candidate_latency = LatencyWindow()
+        self.active_latency = LatencyWindow()
+        self.frames = 0
+        self.skipped = 0
+        self._agreement_total = 0.0
+        self._violation_matches = 0
+        self._credit = 0.0
+        self._pending = None
+        self._running = True
+        self._last_report = time.monotonic()
+        self._wake = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, args=(warmup_shape,), name=f"shadow-{version}", daemon=True
+        )
+        self._thread.start()
+
+    def offer(self, frame, results, seconds):
+        """Separa o frame para o candidato, conforme a taxa de amostragem."""
+        if not self.ready.is_set():
+            return
+        self._credit += self.sample_rate
+        if self._credit < 1.0:
+            return
+        self._credit -= 1.0
+        with self._wake:
+            if self._pending is not None:
+                self.skipped += 1
+                return
+            # Cópia: o frame original ainda recebe as caixas desenhadas
+            self._pending = (frame.copy(), results, seconds)
+            self._wake.notify()
+
+    def _run(self, warmup_shape):
+        try:
+            model = self.detector.load_model(self.model_path)
+            self.detector.warm_up(model, warmup_shape)
+            self.model = model
+        except Exception as e:
+            self.load_error = e
+            print(f"❌ Erro ao carregar o modelo candidato {self.version}: {e}")
+            return
+        if not self._running:
+            return
+        print(f"🕶️ Modo sombra: avaliando o modelo {self.version} em {self.sample_rate:.0%} dos frames.")
+        self.ready.set()
+
+        while True:
+            with self._wake:
+                while self._running and self._pending is None:
+                    self._wake.wait()
+                if not self._running:
+                    break
+                frame, results, active_seconds = self._pending
+            try:
+                self._evaluate(frame, results, active_seconds)
+            except Exception as e:
+                print(f"Erro no modo sombra ({self.version}): {e}")
+            with self._wake:
+                self._pending = None
+            if time.monotonic() - self._last_report >= self.report_interval:
+                self.save_report()
+
+    def _evaluate(self, frame, results, active_seconds):
+        start = time.perf_counter()
+        candidate_results = self.model(frame, verbose=False)
+        self.candidate_latency.observe(time.perf_counter() - start)
+        self.active_latency.observe(active_seconds)
+
+        active = self.detector.boxes(results, frame.shape)
+        candidate = self.detector.boxes(candidate_results, frame.shape)
+        missing = self.detector.ausentes_ids
+        self._agreement_total += box_agreement(active, candidate, self.iou)
+        if {box[0] for box in active if box[0] in missing} == {box[0] for box in candidate if box[0] in missing}:
+            self._violation_matches += 1
+        self.frames += 1
+
+    @property
+    def agreement(self):
+        return self._agreement_total / self.frames if self.frames else 0.0
+
+    @property
+    def violation_agreement(self):
+        return self._violation_matches / self.frames if self.frames else 0.0
+
+    def report(self):
+        return {
+            'version': self.version,
+            'active_version': self.active_version,
+            'updated': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'sample_rate': self.sample_rate,
+            'iou': self.iou,
+            'candidate_latency': _latency_summary(self.candidate_latency),
+            'active_latency': _latency_summary(self.active_latency),
+            'agreement': round(self.agreement, 4),
+            'violation_agreement': round(self.violation_agreement, 4)
+        }
+
+    def save_report(self):
+        self._last_report = time.monotonic()
+        if self.registry is None or not self.frames:
+            return
+        try:
+            self.registry.save_report(self.version, self.report())
+        except OSError as e:
+            print(f"Erro ao salvar o relatório do modo sombra: {e}")
+
+    def stop(self, timeout=None):
+        """Encerra a avaliação (o frame em andamento termina) e salva o relatório."""
+        with self._wake:
+            self._running = False
+            self._wake.notify()
+        # Ainda carregando: a thread termina sozinha ao fim da carga
+        if self.ready.is_set():
+            self._thread.join(timeout)
+            self.save_report()
+
+
+class ModelManager:
+    """
+    Troca a quente do modelo do detector e modo sombra, guiados pelo config.
+
+    apply() compara a seção models do config (recarregado quando o arquivo
+    muda) com o estado atual. Se o modelo ativo mudou, o novo é carregado e
+    aquecido em segundo plano enquanto o laço de frames segue com o
+    anterior, e só então entra no detector (EPIDetector.swap_model). Se a
+    versão promovida é a que está em modo sombra, o candidato já aquecido
+    é reaproveitado e a troca é imediata.
+    """
+
+    def __init__(self, detector, warmup_shape, registry, active_version=None):
+        self.detector = detector
+        self.warmup_shape = warmup_shape
+        self.registry = registry
+        self.active_version = active_version
+        self.shadow = None
+        self.swaps = 0
+        self._loading = None
+        self._lock = threading.Lock()
+
+    def apply(self, config):
+        settings = config.models
+        self.registry.directory = settings['registry_dir']
+        self._apply_active(config.model_path, settings['active'])
+
+        version = settings['shadow']
+        if version and version == settings['active']:
+            version = None
+        shadow = self.shadow
+        if shadow is not None and shadow.version != version:
+            self.stop_shadow()
+            shadow = None
+        if version and shadow is None:
+            self.start_shadow(version, settings['shadow_sample_rate'], settings['shadow_iou'])
+        elif shadow is not None:
+            shadow.sample_rate = settings['shadow_sample_rate']
+            shadow.iou = settings['shadow_iou']
+            shadow.active_version = self.active_version
+
+    def _apply_active(self, model_path, version):
+        with self._lock:
+            if model_path in (self.detector.model_path, self._loading):
+                return
+            shadow = self.shadow
+            if shadow is not None and shadow.model_path == model_path and shadow.ready.is_set():
+                # Promoção do candidato em avaliação: já está carregado e aquecido
+                self.shadow = None
+            else:
+                shadow = None
+                self._loading = model_path
+        if shadow is not None:
+            shadow.stop()
+            self._swap(shadow.model, model_path, version)
+            return
+        threading.Thread(
+            target=self._load, args=(model_path, version), name="model-swap", daemon=True
+        ).start()
+
+    def _load(self, model_path, version):
+        print(f"⏳ Carregando o modelo {version or model_path} em segundo plano...")
+        try:
+            model = self.detector.load_model(model_path)
+            self.detector.warm_up(model, self.warmup_shape)
+        except Exception as e:
+            print(f"❌ Erro ao carregar o modelo {model_path}; o modelo atual continua em uso: {e}")
+            model = None
+        with self._lock:
+            current = self._loading == model_path
+            if current:
+                self._loading = None
+        # Uma troca mais recente já foi pedida: descarta esta
+        if model is not None and current:
+            self._swap(model, model_path, version)
+
+    def _swap(self, model, model_path, version):
+        self.detector.swap_model(model, model_path)
+        self.active_version = version
+        self.swaps += 1
+        print(f"✅ Modelo trocado sem reiniciar: {version or model_path}")
+
+    def start_shadow(self, version, sample_rate=0.1, iou=0.5):
+        model_path = self.registry.path(version)
+        if not os.path.isfile(model_path):
+            print(f"⚠️ Versão {version} não encontrada no registro ({model_path}); modo sombra desativado.")
+            return
+        self.shadow = ShadowEvaluator(
+            self.detector, version, model_path, self.warmup_shape,
+            sample_rate=sample_rate, iou=iou, registry=self.registry, active_version=self.active_version
+        )
+
+    def stop_shadow(self):
+        shadow, self.shadow = self.shadow, None
+        if shadow is not None:
+            shadow.stop()
+
+    def offer(self, frame, results, seconds):
+        """Chamado no laço de frames, antes de as caixas serem desenhadas."""
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.offer(frame, results, seconds)
+
+    def register_metrics(self, metrics):
+        metrics.register_gauge(
+            'safetylens_model_swaps', "Trocas do modelo ativo sem reiniciar",
+            lambda: self.swaps
+        )
+        metrics.register_gauge(
+            'safetylens_shadow_frames', "Frames avaliados pelo modelo em modo sombra",
+            self._frames_gauge
+        )
+        metrics.register_gauge(
+            'safetylens_shadow_latency_seconds', "Latência da inferência no modo sombra (candidato e ativo)",
+            self._latency_gauge
+        )
+        metrics.register_gauge(
+            'safetylens_shadow_agreement', "Concordância do candidato com o modelo ativo (caixas e violações)",
+            self._agreement_gauge
+        )
+
+    def _frames_gauge(self):
+        shadow = self.shadow
+        if shadow is None:
+            return {}
+        return {(('version', shadow.version),): shadow.frames}
+
+    def _agreement_gauge(self):
+        shadow = self.shadow
+        if shadow is None:
+            return {}
+        return {
+            (('version', shadow.version), ('kind', 'boxes')): round(shadow.agreement, 4),
+            (('version', shadow.version), ('kind', 'violations')): round(shadow.violation_agreement, 4)
+        }
+
+    def _latency_gauge(self):
+        shadow = self.shadow
+        if shadow is None:
+            return {}
+        values = {}
+        for model, window in (('candidate', shadow.candidate_latency), ('active', shadow.active_latency)):
+            for quantile, seconds in window.percentiles((0.5, 0.95)).items():
+                labels = (('version', shadow.version), ('model', model), ('quantile', str(quantile)))
+                values[labels] = round(seconds, 6)
+        return values
+
+    def close(self):
+        self.stop_shadow()
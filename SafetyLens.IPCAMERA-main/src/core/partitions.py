@@ -0,0 +1,331 @@
+import os
+import re
+import sqlite3
+import threading
+
+# Os ids de cada partição começam em AAAAMM * ID_BASE: o id de uma detecção
+# (ou imagem) indica o mês em que ela está e nunca colide com outra partição
+# nem com os ids do banco principal
+ID_BASE = 10 ** 8
+
+# Colunas unidas pelas views temporárias (as ausentes em bancos antigos viram NULL)
+DETECTION_COLUMNS = ('id', 'timestamp', 'frame_data', 'epi_id', 'source_file', 'frame_time', 'clip_path',
+                     'snapshot_id', 'event_uid', 'camera_id', 'site')
+SNAPSHOT_COLUMNS = ('id', 'camera', 'timestamp', 'image_hash', 'image', 'thumbnail')
+BOX_COLUMNS = ('detection_id', 'x1', 'y1', 'x2', 'y2', 'confidence', 'track_id')
+
+# Coordenadas das caixas gravadas como inteiros de 0 a BOX_SCALE (frações da
+# largura/altura do frame) e confiança em milésimos: até 2 bytes por coluna
+BOX_SCALE = 10000
+
+# Bancos anexados por conexão no SQLite padrão (SQLITE_MAX_ATTACHED)
+MAX_ATTACHED = 10
+
+_FILE_PATTERN = re.compile(r'^detections-(\d{4})-(\d{2})\.db$')
+
+
+def month_of(timestamp):
+    """Mês ('AAAA-MM') de um timestamp 'AAAA-MM-DD HH:MM:SS'."""
+    return str(timestamp)[:7]
+
+
+def month_of_id(row_id):
+    """Mês da partição que contém o id, ou None para ids do banco principal."""
+    row_id = int(row_id)
+    if row_id < ID_BASE:
+        return None
+    month = row_id // ID_BASE
+    return f"{month // 100:04d}-{month % 100:02d}"
+
+
+def schema_name(month):
+    return 'p_' + month.replace('-', '_')
+
+
+def count_rows(conn, rows, sign=1, table='partition_counts'):
+    """
+    Soma (ou subtrai) linhas (timestamp, epi_id, camera_id, site) nas
+    contagens diárias de main.partition_counts (ou main.detection_rollups).
+    """
+    totals = {}
+    for timestamp, epi_id, camera_id, site in rows:
+        key = (str(timestamp)[:10], epi_id, camera_id or '', site or '')
+        totals[key] = totals.get(key, 0) + sign
+    conn.executemany(
+        f"""INSERT INTO main.{table} (day, epi_id, camera_id, site, total) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(day, epi_id, camera_id, site) DO UPDATE SET total = total + excluded.total""",
+        [key + (total,) for key, total in totals.items()]
+    )
+
+
+def ensure_detection_indexes(conn, schema='main'):
+    """Índices compostos das consultas filtradas por câmera e por site."""
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_detections_camera ON detections (camera_id, timestamp)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_detections_site ON detections (site, camera_id, timestamp)")
+
+
+def ensure_box_table(conn, schema='main'):
+    """Tabela compacta com as caixas de cada detecção (posição, confiança e rastreamento)."""
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS {schema}.detection_boxes (
+        detection_id INTEGER NOT NULL,
+        x1 INTEGER NOT NULL,
+        y1 INTEGER NOT NULL,
+        x2 INTEGER NOT NULL,
+        y2 INTEGER NOT NULL,
+        confidence INTEGER NOT NULL,
+        track_id INTEGER
+    )""")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_detection_boxes_detection ON detection_boxes (detection_id)")
+
+
+def box_rows(detection_id, class_id, boxes):
+    """
+    Linhas de detection_boxes das caixas da classe.
+
+    `boxes` são tuplas (classe, x1, y1, x2, y2, confiança, id de
+    rastreamento) com coordenadas normalizadas de 0 a 1, como as de
+    EPIDetector.boxes().
+    """
+    rows = []
+    for box in boxes or ():
+        if box[0] != class_id:
+            continue
+        coords = [round(min(1.0, max(0.0, float(value))) * BOX_SCALE) for value in box[1:5]]
+        rows.append((detection_id, *coords, round(float(box[5]) * 1000), box[6]))
+    return rows
+
+
+def ensure_count_tables(conn):
+    """
+    Cria as tabelas de contagens diárias (detection_rollups e
+    partition_counts) e a view detection_counts do banco principal.
+
+    As contagens são por dia, EPI, câmera e site ('' quando desconhecidos);
+    tabelas de versões anteriores, só por dia e EPI, são migradas com as
+    linhas antigas sem câmera.
+    """
+    view = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'view' AND name = 'detection_counts'").fetchone()
+    if view is not None and 'camera_id' not in view[0]:
+        conn.execute("DROP VIEW main.detection_counts")
+
+    for table in ('detection_rollups', 'partition_counts'):
+        existing = {row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")}
+        legacy = bool(existing) and 'camera_id' not in existing
+        if legacy:
+            conn.execute(f"ALTER TABLE main.{table} RENAME TO {table}_old")
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS main.{table} (
+            day TEXT NOT NULL,
+            epi_id INTEGER,
+            camera_id TEXT NOT NULL DEFAULT '',
+            site TEXT NOT NULL DEFAULT '',
+            total INTEGER NOT NULL,
+            PRIMARY KEY (day, epi_id, camera_id, site)
+        )""")
+        if legacy:
+            conn.execute(f"INSERT INTO main.{table} (day, epi_id, total) SELECT day, epi_id, total FROM main.{table}_old")
+            conn.execute(f"DROP TABLE main.{table}_old")
+
+    # Contagens das detecções ativas somadas às arquivadas, usada nas análises
+    conn.execute("""CREATE VIEW IF NOT EXISTS main.detection_counts AS
+        SELECT timestamp, epi_id, camera_id, site, 1 AS total FROM detections
+        UNION ALL
+        SELECT day || ' 00:00:00' AS timestamp, epi_id, camera_id, site, total FROM detection_rollups
+    """)
+
+
+def create_partitions(settings):
+    """PartitionSet conforme a seção storage do config, ou None sem particionamento."""
+    if settings.get('partitioning') != 'monthly':
+        return None
+    return PartitionSet(settings['partition_dir'])
+
+
+class PartitionSet:
+    """
+    Detecções e imagens de evidência em um arquivo SQLite por mês.
+
+    O banco principal guarda as tabelas pequenas (epis, settings, totais) e
+    a tabela partition_counts, com as contagens diárias de cada partição
+    por EPI, câmera e site.
+    attach() anexa a uma conexão só os meses pedidos e cria views
+    temporárias `detections`, `snapshots`, `detection_boxes` e
+    `detection_counts` que unem o banco principal às partições; como views
+    temporárias têm precedência, as consultas existentes funcionam sem
+    alteração. Apagar um mês antigo
+    é apagar um arquivo.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._ready = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, month):
+        return os.path.join(self.directory, f"detections-{month}.db")
+
+    def months(self):
+        """Meses com partição em disco, em ordem."""
+        months = []
+        for name in os.listdir(self.directory):
+            match = _FILE_PATTERN.match(name)
+            if match:
+                months.append(f"{match.group(1)}-{match.group(2)}")
+        return sorted(months)
+
+    def months_between(self, start_time=None, end_time=None):
+        """Meses com partição que se sobrepõem ao intervalo (limites opcionais)."""
+        start = month_of(start_time) if start_time else None
+        end = month_of(end_time) if end_time else None
+        return [month for month in self.months()
+                if (start is None or month >= start) and (end is None or month <= end)]
+
+    def ensure(self, month):
+        """Cria o arquivo do mês (esquema e sequência dos ids), se necessário."""
+        with self._lock:
+            if month in self._ready:
+                return
+            conn = sqlite3.connect(self.path(month), timeout=20)
+            try:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("""CREATE TABLE IF NOT EXISTS detections (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME,
+                    frame_data BLOB,
+                    epi_id INTEGER,
+                    source_file TEXT,
+                    frame_time REAL,
+                    clip_path TEXT,
+                    snapshot_id INTEGER,
+                    event_uid TEXT,
+                    camera_id TEXT,
+                    site TEXT
+                )""")
+                # Partições criadas antes das colunas de câmera e site
+                existing = {row[1] for row in conn.execute("PRAGMA table_info(detections)")}
+                for column in ('camera_id', 'site'):
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE detections ADD COLUMN {column} TEXT")
+                conn.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    camera TEXT,
+                    timestamp DATETIME,
+                    image_hash INTEGER,
+                    image BLOB,
+                    thumbnail BLOB
+                )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_timestamp ON detections (timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_snapshot ON detections (snapshot_id)")
+                ensure_detection_indexes(conn)
+                ensure_box_table(conn)
+                first_id = int(month.replace('-', '')) * ID_BASE
+                for table in ('detections', 'snapshots'):
+                    if conn.execute("SELECT 1 FROM sqlite_sequence WHERE name = ?", (table,)).fetchone() is None:
+                        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, first_id))
+                conn.commit()
+            finally:
+                conn.close()
+            self._ready.add(month)
+
+    def attach_for_write(self, conn, month):
+        """Anexa a partição do mês (criando-a) e retorna o nome do esquema."""
+        self.ensure(month)
+        schema = schema_name(month)
+        attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+        if schema not in attached:
+            conn.execute("ATTACH DATABASE ? AS " + schema, (self.path(month),))
+        return schema
+
+    @staticmethod
+    def attach_limit(conn=None):
+        """Quantidade de partições que uma conexão consegue anexar de uma vez."""
+        if conn is not None and hasattr(conn, 'getlimit'):
+            return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        return MAX_ATTACHED
+
+    def groups(self, months):
+        """
+        Divide os meses em grupos que cabem no limite de bancos anexados.
+
+        Retorna uma lista de (meses, inclui o banco principal): consultas de
+        linhas executadas grupo a grupo (attach(..., include_main=...))
+        cobrem todos os meses, cada linha uma única vez.
+        """
+        months = sorted(months)
+        limit = self.attach_limit()
+        chunks = [months[i:i + limit] for i in range(0, len(months), limit)] or [[]]
+        return [(chunk, index == 0) for index, chunk in enumerate(chunks)]
+
+    def attach(self, conn, months, include_main=True):
+        """
+        Anexa as partições dos meses e cria as views temporárias de leitura.
+
+        O SQLite limita a quantidade de bancos anexados; além do limite,
+        ficam os meses mais recentes e os demais entram em detection_counts
+        pelas contagens de partition_counts. Consultas de linhas de períodos
+        com mais meses que o limite devem ser feitas por grupos (groups()).
+        Com include_main=False, as views de linhas não incluem o banco
+        principal (grupos seguintes ao primeiro). Retorna os meses anexados.
+        """
+        limit = self.attach_limit(conn)
+        months = sorted(months)
+        skipped = months[:-limit] if len(months) > limit else []
+        months = months[len(skipped):]
+        for month in months:
+            # Partições de versões anteriores ganham as colunas e índices novos
+            self.ensure(month)
+            conn.execute("ATTACH DATABASE ? AS " + schema_name(month), (self.path(month),))
+
+        schemas = (['main'] if include_main else []) + [schema_name(month) for month in months]
+        self._create_view(conn, 'detections', DETECTION_COLUMNS, schemas)
+        self._create_view(conn, 'snapshots', SNAPSHOT_COLUMNS, schemas)
+        self._create_view(conn, 'detection_boxes', BOX_COLUMNS, schemas)
+
+        counts = "SELECT timestamp, epi_id, camera_id, site, 1 AS total FROM temp.detections"
+        tables = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+        if 'detection_rollups' in tables:
+            counts += " UNION ALL SELECT day || ' 00:00:00', epi_id, camera_id, site, total FROM main.detection_rollups"
+        if 'partition_counts' in tables:
+            # Meses com partição que não foram anexados entram pelas contagens diárias
+            attached = ', '.join(f"'{month}'" for month in months)
+            counts += (" UNION ALL SELECT day || ' 00:00:00', epi_id, camera_id, site, total FROM main.partition_counts"
+                       f" WHERE substr(day, 1, 7) NOT IN ({attached})")
+        conn.execute("DROP VIEW IF EXISTS temp.detection_counts")
+        conn.execute(f"CREATE TEMP VIEW detection_counts AS {counts}")
+        return months
+
+    @staticmethod
+    def _create_view(conn, table, columns, schemas):
+        selects = []
+        for schema in schemas:
+            existing = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+            if not existing:
+                continue
+            fields = ', '.join(column if column in existing else f"NULL AS {column}" for column in columns)
+            selects.append(f"SELECT {fields} FROM {schema}.{table}")
+        conn.execute(f"DROP VIEW IF EXISTS temp.{table}")
+        if not selects:
+            return
+        conn.execute(f"CREATE TEMP VIEW {table} AS " + " UNION ALL ".join(selects))
+
+    def mark_exported(self, month):
+        """Marca o mês como já exportado para o arquivo morto, à espera de ser apagado."""
+        open(self.path(month) + '.exported', 'w').close()
+
+    def is_exported(self, month):
+        return os.path.exists(self.path(month) + '.exported')
+
+    def drop(self, month):
+        """
+        Apaga a partição do mês (e os arquivos auxiliares do SQLite).
+
+        A marca de exportado é apagada por último: se a remoção falhar
+        (ex.: no Windows, com o arquivo aberto por outra conexão), o mês
+        continua marcado e a próxima execução só tenta apagá-lo de novo.
+        """
+        with self._lock:
+            self._ready.discard(month)
+            for suffix in ('', '-journal', '-wal', '-shm', '.exported'):
+                path = self.path(month) + suffix
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,126 @@
+import os
+import sys
+
+import cv2
+
+# Etapas que podem ser fixadas em núcleos específicos (performance.affinity)
+AFFINITY_STAGES = ('capture', 'inference', 'encode', 'db')
+
+# Layout aplicado por apply(); lido pelas threads de cada etapa em pin_thread()
+_layout = {
+    'torch_threads': None,
+    'affinity': {},
+    # Afinidade do processo antes de qualquer fixação
+    'default': None
+}
+
+
+def _parse_cpus(value):
+    """Aceita [0, 1, 2], "0-3" ou "0,2,4-5" e retorna um conjunto de núcleos."""
+    if isinstance(value, int):
+        return {value}
+    if isinstance(value, (list, tuple)):
+        return {int(cpu) for cpu in value}
+    cpus = set()
+    for part in str(value).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def _format_cpus(cpus):
+    return ','.join(str(cpu) for cpu in sorted(cpus))
+
+
+def affinity_supported():
+    # sched_setaffinity com pid 0 afeta só a thread atual (Linux)
+    return hasattr(os, 'sched_setaffinity') and sys.platform.startswith('linux')
+
+
+def apply(settings):
+    """
+    Aplica o orçamento de threads da seção performance do config.
+
+    Deve ser chamado antes de o torch ser importado: o limite de threads do
+    torch é aplicado por configure_torch() assim que o modelo é carregado.
+    """
+    opencv_threads = settings.get('opencv_threads')
+    if opencv_threads is not None:
+        cv2.setNumThreads(int(opencv_threads))
+
+    torch_threads = settings.get('torch_threads')
+    _layout['torch_threads'] = int(torch_threads) if torch_threads is not None else None
+    if _layout['torch_threads'] is not None:
+        # Vale também para bibliotecas que leem o ambiente ao serem importadas
+        os.environ.setdefault('OMP_NUM_THREADS', str(_layout['torch_threads']))
+        os.environ.setdefault('MKL_NUM_THREADS', str(_layout['torch_threads']))
+
+    affinity = {}
+    for stage, cpus in (settings.get('affinity') or {}).items():
+        if stage not in AFFINITY_STAGES:
+            print(f"⚠️ Etapa desconhecida em performance.affinity: {stage}")
+            continue
+        affinity[stage] = _parse_cpus(cpus)
+    if affinity and not affinity_supported():
+        print("⚠️ Afinidade de CPU só é suportada no Linux; performance.affinity ignorado.")
+        affinity = {}
+    _layout['affinity'] = affinity
+    if affinity and _layout['default'] is None:
+        _layout['default'] = os.sched_getaffinity(0)
+
+    if 'torch' in sys.modules:
+        configure_torch()
+    print(describe(settings))
+
+
+def configure_torch():
+    """Limita as threads intra-op do torch, se configurado."""
+    if _layout['torch_threads'] is None:
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(_layout['torch_threads'])
+
+
+def pin_thread(stage=None):
+    """
+    Fixa a thread atual nos núcleos configurados para a etapa.
+
+    Cada thread chama no próprio início: uma thread nova herda a afinidade
+    de quem a criou. Sem etapa (ou com uma etapa sem núcleos configurados),
+    a thread volta à afinidade original do processo.
+    """
+    if not _layout['affinity']:
+        return
+    cpus = _layout['affinity'].get(stage) or _layout['default']
+    if not cpus:
+        return
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        print(f"⚠️ Não foi possível fixar a etapa {stage or 'padrão'} nos núcleos {_format_cpus(cpus)}: {e}")
+
+
+def describe(settings):
+    """Resumo do layout ativo, impresso na inicialização."""
+    torch_threads = _layout['torch_threads'] or 'padrão'
+    opencv_threads = settings.get('opencv_threads')
+    parts = [
+        f"{os.cpu_count()} núcleos",
+        f"opencv {opencv_threads if opencv_threads is not None else cv2.getNumThreads()} threads",
+        f"torch {torch_threads} threads",
+        f"gravadores: banco {settings.get('db_writers', 1)}, clipes {settings.get('clip_writers', 1)}"
+    ]
+    if _layout['affinity']:
+        parts.append("afinidade " + ' '.join(
+            f"{stage}=[{_format_cpus(cpus)}]" for stage, cpus in sorted(_layout['affinity'].items())
+        ))
+    return "⚙️ Desempenho: " + " | ".join(parts)
@@ -0,0 +1,482 @@
+import time
+
+from src.core import buffers, performance
+from src.core.alerts import (Alert, AlertDispatcher, CallbackSink, DatabaseSink, HubSink, SoundSink,
+                             SpoolSink)
+from src.core.clips import ClipRecorder
+from src.core.database import DatabaseManager
+from src.core.dedup import SnapshotDeduplicator
+from src.core.detection import EPIDetector, ImageProcessor
+from src.core.encoding import JPEGEncoder
+from src.core.heatmap import HeatmapAccumulator
+from src.core.inference import InferenceClient, InferenceError, service_supported
+from src.core.inspection import InspectionCounters
+from src.core.metrics import MetricsRegistry, MetricsServer
+from src.core.models import ModelManager, ModelRegistry
+from src.core.partitions import create_partitions
+from src.core.settings import SettingsStore
+from src.core.sources import create_source
+from src.core.spool import EventSpool, IngestForwarder
+from src.core.supervisor import SourceSupervisor
+from src.core.streaming import FrameHub, MJPEGServer
+
+
+class DetectionPipeline:
+    """
+    Pipeline de detecção independente da interface gráfica.
+
+    Reúne captura, pré-processamento, detecção, intervalo entre alertas,
+    registro no banco e publicação na transmissão MJPEG. O modo headless
+    executa run() diretamente; a janela Tk chama process() a cada frame e
+    apenas exibe o resultado.
+    """
+
+    def __init__(self, config, startup=None):
+        self.config = config
+        self.camera_name = config.camera_name
+        self.startup = startup
+        # Aplicado antes de carregar o modelo, para valer também para o torch
+        self.performance = config.performance
+        performance.apply(self.performance)
+        self.metrics = MetricsRegistry()
+        self.processor = ImageProcessor()
+        # Buffers de frame reutilizados pela captura e pelo ajuste de imagem
+        self.frame_pool = buffers.FramePool(self.performance['frame_buffers'])
+        self._current_frame = None
+        # O modelo é carregado em segundo plano por load_model(), para que a
+        # imagem apareça antes de o torch terminar de carregar; com o serviço
+        # de inferência, o modelo fica nele e o detector só envia os frames
+        inference = config.inference
+        self.inference_client = None
+        if inference['service']:
+            if service_supported():
+                self.inference_client = InferenceClient(inference['socket'], inference['timeout'])
+            else:
+                print("⚠️ Serviço de inferência indisponível nesta plataforma; usando o modelo local.")
+        self._inference_down = False
+        tracking = config.tracking
+        if tracking and self.inference_client is not None:
+            # O serviço atende várias câmeras: um rastreador único misturaria os ids
+            print("⚠️ Rastreamento não é suportado com o serviço de inferência; detection.tracking ignorado.")
+            tracking = False
+        self.detector = EPIDetector(config.model_path, config.min_confidence, lazy=True,
+                                    service=self.inference_client, tracking=tracking)
+        # Troca do modelo sem reiniciar e modo sombra, guiados pela seção models
+        w, h = config.camera_resolution
+        models = config.models
+        self.models = ModelManager(self.detector, (h, w, 3), ModelRegistry(models['registry_dir']),
+                                   active_version=models['active'])
+        self._first_frame = True
+        snapshots = config.snapshots
+        dedup = None
+        if snapshots['dedup']:
+            dedup = SnapshotDeduplicator(snapshots['max_distance'], snapshots['window_seconds'])
+        self.db = DatabaseManager(
+            config.database_path, self.metrics, self.camera_name,
+            workers=self.performance['db_writers'], dedup=dedup,
+            partitions=create_partitions(config.storage), site=config.site
+        )
+        # Frames inspecionados por minuto, base da taxa de conformidade
+        self.inspections = InspectionCounters(self.db.log_inspections, config.site)
+
+        # Codificação JPEG da evidência, da miniatura e da transmissão
+        encoding = config.encoding
+        self.encoder = JPEGEncoder(
+            {artifact: encoding[artifact] for artifact in ('evidence', 'thumbnail', 'stream')},
+            workers=encoding['workers']
+        )
+
+        # Ajustes publicados pela interface ou pelo config recarregado; o
+        # estado derivado deles é refeito apenas quando a versão muda
+        self.settings = SettingsStore.from_config(config)
+        self._settings_version = self.settings.current.version
+        self.config.add_listener(self.on_config_reload)
+
+        self.supervisor = None
+        self._skipped = 0
+        self.last_frame_time = None
+        # Chamado com a lista de EPIs ausentes sempre que um alerta é disparado,
+        # em uma thread de alertas (nunca na thread do laço de frames)
+        self.on_alert = None
+
+        self.setup_streaming()
+        self.setup_clips()
+        self.setup_ingest()
+        self.setup_heatmaps()
+        self.setup_alerts()
+        self.setup_metrics()
+
+    def setup_streaming(self):
+        settings = self.config.streaming
+        self.stream_hub = FrameHub(settings['width'], settings['quality'], self.metrics, self.encoder)
+        self.stream_server = None
+        if settings['enabled']:
+            self.stream_server = MJPEGServer(self.stream_hub, settings['host'], settings['port'])
+            try:
+                self.stream_server.start()
+            except OSError as e:
+                print(f"❌ Erro ao iniciar a transmissão MJPEG: {e}")
+                self.stream_server = None
+
+    def setup_clips(self):
+        settings = self.config.clips
+        self.clip_recorder = None
+        if settings['enabled']:
+            self.clip_recorder = ClipRecorder(
+                settings['directory'],
+                self.camera_name,
+                video_format=self.config.video_format,
+                pre_seconds=settings['pre_seconds'],
+                post_seconds=settings['post_seconds'],
+                max_buffer_mb=settings['max_buffer_mb'],
+                max_clip_seconds=settings['max_clip_seconds'],
+                width=settings['width'],
+                quality=settings['quality'],
+                writers=self.performance['clip_writers']
+            )
+
+    def setup_ingest(self):
+        settings = self.config.ingest
+        self.spool = None
+        self.forwarder = None
+        if not settings['enabled']:
+            return
+        self.spool = EventSpool(
+            settings['spool_dir'],
+            segment_bytes=int(settings['segment_mb'] * 1024 * 1024),
+            fsync=settings['fsync'],
+            max_bytes=int(settings['max_spool_mb'] * 1024 * 1024)
+        )
+        self.forwarder = IngestForwarder(
+            self.spool,
+            settings['url'],
+            self.config.site,
+            token=settings['token'],
+            batch_size=settings['batch_size'],
+            interval=settings['interval'],
+            timeout=settings['timeout'],
+            backoff_max=settings['backoff_max']
+        )
+        self.forwarder.start()
+
+    def setup_heatmaps(self):
+        settings = self.config.heatmap
+        self.heatmaps = None
+        if settings['enabled']:
+            self.heatmaps = HeatmapAccumulator(
+                settings['directory'],
+                width=settings['width'],
+                height=settings['height'],
+                save_interval=settings['save_interval']
+            )
+
+    def setup_alerts(self):
+        settings = self.config.alert_dispatch
+        self.alerts = AlertDispatcher(
+            cooldown=self.settings.current.delay_time,
+            cooldowns=settings['cooldowns'],
+            queue_size=settings['queue_size'],
+            workers=settings['workers'],
+            metrics=self.metrics,
+            encoder=self.encoder
+        )
+        self.alerts.add_sink(DatabaseSink(self.db))
+        if self.spool is not None:
+            epi_names = {class_id: self.detector.epi_mapping[class_id] for class_id in self.detector.ausentes_ids}
+            self.alerts.add_sink(SpoolSink(self.spool, epi_names, self.config.ingest['images']))
+        if settings['sound']:
+            self.alerts.add_sink(SoundSink(self.settings))
+        if settings['stream']:
+            self.alerts.add_sink(HubSink(self.stream_hub))
+        self.alerts.add_sink(CallbackSink(self._notify_alert))
+
+    def _notify_alert(self, alert):
+        if self.on_alert is not None:
+            self.on_alert(alert.missing_epis)
+
+    def setup_metrics(self):
+        camera = (('camera', self.camera_name),)
+        self.metrics.register_gauge(
+            'safetylens_writer_backlog', "Registros aguardando gravação no banco",
+            lambda: self.db.pending
+        )
+        self.metrics.register_gauge(
+            'safetylens_queue_depth', "Itens aguardando em cada fila do pipeline",
+            lambda: {
+                camera + (('queue', 'alert'),): self.alerts.pending,
+                camera + (('queue', 'db_writer'),): self.db.pending
+            }
+        )
+        self.metrics.register_gauge(
+            'safetylens_stream_viewers', "Espectadores conectados à transmissão MJPEG",
+            lambda: {camera: self.stream_hub.viewer_count(self.camera_name)}
+        )
+        self.metrics.register_gauge(
+            'safetylens_source_up', "1 quando a câmera está conectada",
+            lambda: {camera: int(self.is_camera_open())}
+        )
+        self.metrics.register_gauge(
+            'safetylens_source_uptime_seconds', "Tempo desde a última conexão da câmera",
+            lambda: {camera: round(self.supervisor.uptime, 1) if self.supervisor is not None else 0}
+        )
+        self.metrics.register_gauge(
+            'safetylens_source_reconnects', "Reconexões da câmera desde o início",
+            lambda: {camera: self.supervisor.reconnects if self.supervisor is not None else 0}
+        )
+        self.metrics.register_gauge(
+            'safetylens_source_stalls', "Travamentos detectados (sem frames novos)",
+            lambda: {camera: self.supervisor.stalls if self.supervisor is not None else 0}
+        )
+        if self.db.dedup is not None:
+            self.metrics.register_gauge(
+                'safetylens_snapshot_dedup', "Imagens de evidência reaproveitadas (hit) ou gravadas (miss)",
+                lambda: {(('result', 'hit'),): self.db.dedup.hits, (('result', 'miss'),): self.db.dedup.misses}
+            )
+        self.encoder.register_metrics(self.metrics)
+        if self.spool is not None:
+            self.metrics.register_gauge(
+                'safetylens_ingest_pending_bytes', "Bytes no spool aguardando envio ao servidor central",
+                self.spool.pending_bytes
+            )
+            self.metrics.register_gauge(
+                'safetylens_ingest_events', "Eventos aceitos pelo servidor central (sent) e reenvios descartados",
+                lambda: {(('result', 'sent'),): self.forwarder.sent,
+                         (('result', 'duplicate'),): self.forwarder.duplicates}
+            )
+        self.metrics.register_gauge(
+            'safetylens_model_ready', "1 quando o modelo de detecção terminou de carregar",
+            lambda: int(self.detector.is_ready)
+        )
+        self.models.register_metrics(self.metrics)
+        self.metrics.register_gauge(
+            'safetylens_frame_buffers', "Buffers de frame do pool: alocados, em uso e reutilizações",
+            lambda: {camera + (('state', state),): value for state, value in self.frame_pool.stats().items()
+                     if state in ('allocated', 'in_use', 'reused')}
+        )
+        if self.startup is not None:
+            self.metrics.register_gauge(
+                'safetylens_startup_seconds', "Duração de cada fase da inicialização",
+                lambda: {(('phase', name),): round(seconds, 3) for name, seconds in dict(self.startup.phases).items()}
+            )
+
+        settings = self.config.metrics
+        self.metrics_server = None
+        if settings['enabled']:
+            self.metrics_server = MetricsServer(self.metrics, settings['host'], settings['port'])
+            try:
+                self.metrics_server.start()
+            except OSError as e:
+                print(f"❌ Erro ao iniciar o endpoint de métricas: {e}")
+                self.metrics_server = None
+
+    def load_model(self, on_ready=None):
+        """Inicia a carga e o aquecimento do modelo em segundo plano."""
+        def loaded(error):
+            if error is None:
+                print(f"✅ Modelo carregado: {self.detector.model_path}")
+                # O candidato do modo sombra só carrega depois do modelo ativo
+                self.apply_models(self.config)
+            if on_ready is not None:
+                on_ready(error)
+
+        self.detector.load_in_background(self.models.warmup_shape, on_ready=loaded, startup=self.startup)
+
+    def apply_models(self, config):
+        # Com o serviço de inferência, trocas de modelo e modo sombra são feitas por ele
+        if self.detector.is_ready and self.inference_client is None:
+            self.models.apply(config)
+
+    def on_config_reload(self, config):
+        self.settings.publish_config(config)
+        self.apply_models(config)
+
+    def open_camera(self, timeout=5.0):
+        """
+        Inicia o supervisor da câmera e aguarda a primeira conexão.
+
+        Retorna False se a câmera não conectar dentro de `timeout`; o
+        supervisor continua tentando em segundo plano.
+        """
+        if self.supervisor is None:
+            settings = self.config.camera_capture
+            started = time.perf_counter()
+
+            def connected(supervisor):
+                if self.startup is not None and 'camera' not in self.startup.phases:
+                    self.startup.record('camera', time.perf_counter() - started)
+
+            self.supervisor = SourceSupervisor(
+                lambda: create_source(self.config, self.frame_pool),
+                self.camera_name,
+                stall_timeout=settings['stall_timeout'],
+                backoff_initial=settings['reconnect_initial'],
+                backoff_max=settings['reconnect_max'],
+                on_connect=connected
+            )
+            self.supervisor.start()
+        return self.supervisor.wait_connected(timeout)
+
+    def close_camera(self):
+        if self.supervisor is not None:
+            self.supervisor.stop()
+            self.supervisor = None
+
+    def is_camera_open(self):
+        return self.supervisor is not None and self.supervisor.is_connected
+
+    def read_frame(self, timeout=1.0):
+        """
+        Retorna (ok, frame) com o frame mais recente da câmera.
+
+        ok é False quando nenhum frame novo chegou dentro de `timeout`;
+        is_camera_open() diz se a fonte ainda está conectada.
+        """
+        if self.supervisor is None:
+            return False, None
+        start = time.perf_counter()
+        frame, timestamp = self.supervisor.read_latest(timeout)
+        if frame is None:
+            return False, None
+
+        self.metrics.observe(self.camera_name, 'capture', time.perf_counter() - start)
+        self.last_frame_time = timestamp
+        skipped = self.supervisor.skipped
+        if skipped > self._skipped:
+            # Frames decodificados que envelheceram antes de serem processados
+            self.metrics.mark_dropped(self.camera_name, 'stale', skipped - self._skipped)
+            self._skipped = skipped
+        return True, frame
+
+    def process(self, frame):
+        """
+        Processa um frame e dispara o alerta se necessário.
+
+        O pipeline fica com o frame recebido (devolvido ao pool após o
+        ajuste). O frame retornado continua do pipeline e só é válido até a
+        próxima chamada; quem precisar dele por mais tempo chama
+        buffers.retain() e depois buffers.release().
+        """
+        buffers.release(self._current_frame)
+        self._current_frame = None
+        settings = self.settings.current
+        if settings.version != self._settings_version:
+            self.detector.update_min_confidence(settings.min_confidence)
+            self.alerts.cooldown = settings.delay_time
+            self._settings_version = settings.version
+        metrics = self.metrics.camera(self.camera_name)
+
+        start = time.perf_counter()
+        processed_frame = self.processor.apply(frame, settings, self.frame_pool)
+        adjusted = time.perf_counter()
+        buffers.release(frame)
+        self._current_frame = processed_frame
+        if self._first_frame:
+            self._first_frame = False
+            if self.startup is not None:
+                self.startup.mark('first_frame')
+
+        if not self.detector.is_ready:
+            # Enquanto o modelo carrega, a imagem segue para a tela e a transmissão
+            self.metrics.mark_dropped(self.camera_name, 'model_loading')
+            self.stream_hub.publish(self.camera_name, processed_frame)
+            return processed_frame, [], []
+        try:
+            results = self.detector.infer(processed_frame)
+        except (ConnectionError, InferenceError) as e:
+            # Serviço de inferência fora do ar (ou com erro): a imagem segue sem detecção até ele voltar
+            if not self._inference_down:
+                print(f"❌ {e}")
+                self._inference_down = True
+            self.metrics.mark_dropped(self.camera_name, 'inference_unavailable')
+            self.stream_hub.publish(self.camera_name, processed_frame)
+            return processed_frame, [], []
+        self._inference_down = False
+        inferred = time.perf_counter()
+        # Antes de annotate(), que desenha as caixas no próprio frame
+        self.models.offer(processed_frame, results, inferred - adjusted)
+        frame_with_detections, missing_epis, found_classes = self.detector.annotate(processed_frame, results)
+        annotated = time.perf_counter()
+        self.inspections.record(self.camera_name, bool(found_classes), bool(missing_epis), self.last_frame_time)
+
+        metrics.stage('adjust').observe(adjusted - start)
+        metrics.stage('inference').observe(inferred - adjusted)
+        metrics.stage('postprocess').observe(annotated - inferred)
+        metrics.mark_frame(annotated)
+
+        self.stream_hub.publish(self.camera_name, frame_with_detections)
+        if self.clip_recorder is not None:
+            self.clip_recorder.push(frame_with_detections, self.last_frame_time)
+
+        if missing_epis:
+            boxes = [box for box in self.detector.boxes(results, frame_with_detections.shape)
+                     if box[0] in self.detector.ausentes_ids]
+            # O mapa de calor conta todo frame com violação, não só os que geram alerta
+            if self.heatmaps is not None and boxes:
+                self.heatmaps.add(self.camera_name, boxes)
+            self.raise_alert(missing_epis, frame_with_detections, found_classes, boxes)
+
+        return frame_with_detections, missing_epis, found_classes
+
+    def raise_alert(self, missing_epis, frame, found_classes, boxes=None):
+        """
+        Envia ao despachante os EPIs ausentes que já passaram do intervalo mínimo.
+
+        Das caixas de violação do frame (EPIDetector.boxes()), as das classes
+        que alertam seguem junto com o alerta (banco e servidor central).
+        """
+        due = self.alerts.claim(self.camera_name, missing_epis)
+        if not due:
+            return
+        # Só as classes dos EPIs que alertam agora são registradas no banco
+        mapping = self.detector.epi_mapping
+        found_classes = [cls for cls in found_classes
+                         if cls not in self.detector.ausentes_ids or mapping[cls] in due]
+        if boxes is not None:
+            boxes = [box for box in boxes if mapping[box[0]] in due]
+        clip_path = self.clip_recorder.trigger() if self.clip_recorder is not None else None
+        # O alerta fica com uma cópia: é processado em outra thread, depois que o buffer já foi reutilizado
+        self.alerts.submit(Alert(self.camera_name, due, found_classes, frame.copy(), clip_path,
+                                 self.last_frame_time, boxes))
+
+    def run(self, stop_event):
+        """Laço de captura do modo headless; termina quando stop_event é sinalizado."""
+        self.load_model()
+        self.open_camera(timeout=0)
+        # Só depois de criar as outras threads: elas herdariam a afinidade
+        performance.pin_thread('inference')
+
+        while not stop_event.is_set():
+            # Sem câmera, read_frame apenas espera: o supervisor cuida da reconexão
+            ret, frame = self.read_frame()
+            if ret:
+                self.process(frame)
+            elif self.supervisor is not None and self.supervisor.ended:
+                # Fim do arquivo de vídeo (sem capture.loop): nada mais a processar
+                break
+
+    def close(self):
+        """Libera a câmera e aguarda os registros pendentes no banco."""
+        self.close_camera()
+        if self.stream_server is not None:
+            self.stream_server.stop()
+            self.stream_server = None
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        self.models.close()
+        self.alerts.close()
+        self.encoder.close()
+        if self.forwarder is not None:
+            # O que não foi enviado fica no spool para a próxima execução
+            self.forwarder.stop()
+            self.spool.close()
+        if self.clip_recorder is not None:
+            self.clip_recorder.close()
+        self.inspections.flush()
+        if self.heatmaps is not None:
+            self.heatmaps.save()
+        self.db.close()
+        buffers.release(self._current_frame)
+        self._current_frame = None
+        if self.inference_client is not None:
+            self.inference_client.close()
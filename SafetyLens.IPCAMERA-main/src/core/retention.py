@@ -0,0 +1,339 @@
+import gzip
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from src.core.partitions import count_rows, month_of
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Sem pyarrow o arquivamento usa NDJSON compactado
+    pa = None
+    pq = None
+
+# Colunas exportadas para o arquivo morto (as imagens não são arquivadas)
+ARCHIVE_COLUMNS = ('id', 'timestamp', 'epi_id', 'source_file', 'frame_time', 'clip_path', 'camera_id', 'site')
+ARCHIVE_TYPES = ('int64', 'string', 'int64', 'string', 'float64', 'string', 'string', 'string')
+
+
+class RetentionManager:
+    """
+    Aplica a política de retenção do banco de detecções.
+
+    Cada etapa trabalha em lotes pequenos, cada um em sua própria transação
+    curta, com uma pausa entre eles para que o gravador do pipeline nunca
+    fique bloqueado. Antes de apagar linhas antigas, elas são exportadas
+    para partições mensais em `archive_dir` e somadas em detection_rollups,
+    que o dashboard consulta junto com as detecções ativas.
+
+    Com partições mensais, cada partição é processada anexada à conexão do
+    banco principal; um mês inteiro mais antigo que rows_days é exportado e
+    então removido apagando o arquivo, sem DELETE nem vacuum.
+    """
+
+    def __init__(self, db, images_days=90, rows_days=730, batch_size=500, pause=0.05,
+                 archive_dir='database/archive', archive_format='ndjson', vacuum_pages=2000):
+        self.db = db
+        self.images_days = images_days
+        self.rows_days = rows_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.archive_dir = archive_dir
+        self.archive_format = archive_format
+        self.vacuum_pages = vacuum_pages
+
+        if self.archive_format == 'parquet' and pa is None:
+            print("⚠️ pyarrow não instalado; arquivando em NDJSON compactado.")
+            self.archive_format = 'ndjson'
+
+    @staticmethod
+    def _cutoff(days):
+        # Alinha ao início do dia para que um dia nunca fique dividido entre
+        # as detecções ativas e os totais arquivados
+        day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+        return day.strftime('%Y-%m-%d %H:%M:%S')
+
+    def strip_images(self, dry_run=False):
+        """Remove imagens e clipes de detecções mais antigas que images_days."""
+        if not self.images_days:
+            return 0
+        cutoff = self._cutoff(self.images_days)
+        total = 0
+        with closing(self.db.get_connection()) as conn:
+            for schema, month in self._stores(conn, cutoff):
+                total += self._strip_store(conn, schema, cutoff, dry_run)
+                if month is not None:
+                    conn.execute(f"DETACH DATABASE {schema}")
+        return total
+
+    def _stores(self, conn, cutoff):
+        """Esquemas com detecções anteriores ao cutoff: o principal e as partições (anexadas)."""
+        yield 'main', None
+        partitions = self.db.partitions
+        if partitions is not None:
+            for month in partitions.months_between(end_time=cutoff):
+                yield partitions.attach_for_write(conn, month), month
+
+    def _strip_store(self, conn, schema, cutoff, dry_run):
+        if dry_run:
+            return conn.execute(
+                f"""SELECT COUNT(*) FROM {schema}.detections
+                WHERE timestamp < ? AND (frame_data IS NOT NULL OR clip_path IS NOT NULL OR snapshot_id IS NOT NULL)""",
+                (cutoff,)
+            ).fetchone()[0]
+
+        total = 0
+        while True:
+            rows = conn.execute(
+                f"""SELECT id, clip_path, snapshot_id FROM {schema}.detections
+                WHERE timestamp < ? AND (frame_data IS NOT NULL OR clip_path IS NOT NULL OR snapshot_id IS NOT NULL)
+                LIMIT ?""",
+                (cutoff, self.batch_size)
+            ).fetchall()
+            if not rows:
+                break
+
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                f"UPDATE {schema}.detections SET frame_data = NULL, clip_path = NULL, snapshot_id = NULL WHERE id = ?",
+                [(row[0],) for row in rows]
+            )
+            self._remove_snapshots(conn, {row[2] for row in rows if row[2] is not None}, schema)
+            conn.execute("COMMIT")
+
+            for clip_path in {row[1] for row in rows if row[1]}:
+                self._remove_clip(conn, clip_path, schema)
+            total += len(rows)
+            time.sleep(self.pause)
+        return total
+
+    @staticmethod
+    def _remove_snapshots(conn, snapshot_ids, schema='main'):
+        # Uma imagem é compartilhada pelas linhas do evento (e por eventos
+        # quase iguais); só é apagada quando nenhuma detecção a referencia
+        conn.executemany(
+            f"""DELETE FROM {schema}.snapshots WHERE id = ?
+            AND NOT EXISTS (SELECT 1 FROM {schema}.detections WHERE snapshot_id = {schema}.snapshots.id)""",
+            [(snapshot_id,) for snapshot_id in snapshot_ids]
+        )
+
+    @staticmethod
+    def _remove_clip(conn, clip_path, schema='main'):
+        # Um clipe pode ser compartilhado por vários eventos; só apaga sem referências
+        still_used = conn.execute(
+            f"SELECT 1 FROM {schema}.detections WHERE clip_path = ? LIMIT 1", (clip_path,)
+        ).fetchone()
+        if not still_used and os.path.exists(clip_path):
+            try:
+                os.remove(clip_path)
+            except OSError as e:
+                print(f"Erro ao remover clipe {clip_path}: {e}")
+
+    def archive_rows(self, dry_run=False):
+        """Arquiva, resume e apaga as detecções mais antigas que rows_days."""
+        if not self.rows_days:
+            return 0
+        cutoff = self._cutoff(self.rows_days)
+        run_stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        total = 0
+        writers = {}
+
+        with closing(self.db.get_connection()) as conn:
+            try:
+                for schema, month in self._stores(conn, cutoff):
+                    if month is not None and month < month_of(cutoff):
+                        # Mês inteiro fora da retenção: exporta e apaga o arquivo. Um mês
+                        # já exportado numa execução anterior só precisa ser apagado
+                        partitions = self.db.partitions
+                        if not partitions.is_exported(month):
+                            total += self._archive_store(conn, schema, None, dry_run, writers, run_stamp)
+                            if not dry_run:
+                                # O arquivo do mês é fechado (completo) antes da marca
+                                writer = writers.pop(month, None)
+                                if writer is not None:
+                                    writer.close()
+                                partitions.mark_exported(month)
+                        conn.execute(f"DETACH DATABASE {schema}")
+                        if not dry_run:
+                            try:
+                                partitions.drop(month)
+                            except OSError as e:
+                                # Ex.: no Windows, partição aberta por outra conexão
+                                print(f"Erro ao apagar a partição {month} (será tentado de novo): {e}")
+                        continue
+                    total += self._archive_store(conn, schema, cutoff, dry_run, writers, run_stamp,
+                                                 partitioned=month is not None)
+                    if month is not None:
+                        conn.execute(f"DETACH DATABASE {schema}")
+                if not dry_run and self.db.partitions is not None:
+                    self._move_dropped_counts(conn)
+            finally:
+                for writer in writers.values():
+                    writer.close()
+        return total
+
+    def _archive_store(self, conn, schema, cutoff, dry_run, writers, run_stamp, partitioned=False):
+        """
+        Arquiva as detecções de um esquema anteriores ao cutoff.
+
+        Sem cutoff, a partição inteira é apenas exportada: o arquivo é
+        apagado em seguida e as contagens passam para detection_rollups em
+        _move_dropped_counts().
+        """
+        where = "WHERE timestamp < ?" if cutoff else ""
+        params = (cutoff,) if cutoff else ()
+        if dry_run:
+            return conn.execute(f"SELECT COUNT(*) FROM {schema}.detections {where}", params).fetchone()[0]
+
+        total = 0
+        last_id = -1
+        while True:
+            rows = conn.execute(
+                f"""SELECT {', '.join(ARCHIVE_COLUMNS)}, snapshot_id FROM {schema}.detections
+                {where or 'WHERE 1 = 1'} AND id > ? ORDER BY id LIMIT ?""",
+                params + (last_id, self.batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            # Grava no arquivo morto antes de apagar: uma falha no meio
+            # pode duplicar linhas no arquivo, mas nunca perdê-las
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(str(row[1])[:7], []).append(row)
+            for month, month_rows in by_month.items():
+                writer = writers.get(month)
+                if writer is None:
+                    writer = writers[month] = self._open_partition(month, run_stamp)
+                writer.write([row[:len(ARCHIVE_COLUMNS)] for row in month_rows])
+            total += len(rows)
+
+            if not cutoff:
+                continue
+
+            counted = [(row[1], row[2], row[6], row[7]) for row in rows]
+            conn.execute("BEGIN IMMEDIATE")
+            count_rows(conn, counted, table='detection_rollups')
+            if partitioned:
+                count_rows(conn, counted, sign=-1)
+            conn.executemany(f"DELETE FROM {schema}.detections WHERE id = ?", [(row[0],) for row in rows])
+            conn.executemany(f"DELETE FROM {schema}.detection_boxes WHERE detection_id = ?", [(row[0],) for row in rows])
+            self._remove_snapshots(conn, {row[-1] for row in rows if row[-1] is not None}, schema)
+            conn.execute("COMMIT")
+            time.sleep(self.pause)
+        return total
+
+    def _move_dropped_counts(self, conn):
+        """Passa para detection_rollups as contagens dos meses cuja partição foi apagada."""
+        existing = set(self.db.partitions.months())
+        months = [row[0] for row in conn.execute("SELECT DISTINCT substr(day, 1, 7) FROM partition_counts")]
+        for month in months:
+            if month in existing:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """INSERT INTO detection_rollups (day, epi_id, camera_id, site, total)
+                SELECT day, epi_id, camera_id, site, total FROM partition_counts
+                WHERE substr(day, 1, 7) = ? AND total > 0
+                ON CONFLICT(day, epi_id, camera_id, site) DO UPDATE SET total = total + excluded.total""",
+                (month,)
+            )
+            conn.execute("DELETE FROM partition_counts WHERE substr(day, 1, 7) = ?", (month,))
+            conn.execute("COMMIT")
+
+    def _open_partition(self, month, run_stamp):
+        directory = os.path.join(self.archive_dir, f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        if self.archive_format == 'parquet':
+            return _ParquetPartition(os.path.join(directory, f"detections-{run_stamp}.parquet"))
+        return _NDJSONPartition(os.path.join(directory, f"detections-{run_stamp}.ndjson.gz"))
+
+    def vacuum(self, convert=False):
+        """
+        Devolve ao sistema as páginas livres, aos poucos (incremental_vacuum).
+
+        Bancos de versões antigas, sem auto_vacuum incremental, só são
+        convertidos com convert=True: a conversão é um VACUUM completo, que
+        bloqueia o banco inteiro (e o gravador) até terminar.
+        """
+        with closing(self.db.get_connection()) as conn:
+            freed = self._vacuum_connection(conn, convert)
+        if self.db.partitions is not None:
+            # As partições restantes só têm páginas livres das imagens removidas
+            for month in self.db.partitions.months():
+                with closing(sqlite3.connect(self.db.partitions.path(month), timeout=20, isolation_level=None)) as conn:
+                    freed = (freed or 0) + (self._vacuum_connection(conn, convert) or 0)
+        return freed
+
+    def _vacuum_connection(self, conn, convert=False):
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            if not convert:
+                name = conn.execute("PRAGMA database_list").fetchone()[2]
+                print(f"⚠️ {name} não usa auto_vacuum incremental; vacuum ignorado. Converta uma vez, "
+                      "com o app parado: python -m src.retention --convert-vacuum")
+                return None
+            # Bancos antigos precisam de um VACUUM completo, uma única vez,
+            # para passar ao modo incremental
+            print("Convertendo o banco para auto_vacuum incremental (VACUUM completo, executado uma vez)...")
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return None
+
+        freed = 0
+        while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            # fetchall() garante que o pragma execute até o fim
+            conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+            freed += self.vacuum_pages
+            time.sleep(self.pause)
+        return freed
+
+    def run(self, dry_run=False, convert_vacuum=False):
+        started = time.perf_counter()
+        stripped = self.strip_images(dry_run)
+        archived = self.archive_rows(dry_run)
+        if not dry_run:
+            self.vacuum(convert_vacuum)
+        action = "seriam afetadas" if dry_run else "processadas"
+        print(f"Retenção: {stripped} imagens/clipes e {archived} detecções arquivadas {action} "
+              f"em {time.perf_counter() - started:.1f}s")
+        return stripped, archived
+
+
+class _NDJSONPartition:
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+
+    def write(self, rows):
+        for row in rows:
+            self._file.write(json.dumps(dict(zip(ARCHIVE_COLUMNS, row)), ensure_ascii=False) + "\n")
+        # Garante que o lote esteja no disco antes de ser apagado do banco
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetPartition:
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    def write(self, rows):
+        schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in zip(ARCHIVE_COLUMNS, ARCHIVE_TYPES)])
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(ARCHIVE_COLUMNS)}
+        columns['timestamp'] = [str(value) if value is not None else None for value in columns['timestamp']]
+        table = pa.table(columns, schema=schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, schema, compression='zstd')
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
@@ -0,0 +1,81 @@
+import threading
+from dataclasses import asdict, dataclass, fields, replace
+
+
+@dataclass(frozen=True)
+class PipelineSettings:
+    """
+    Ajustes do pipeline em um instante, imutáveis.
+
+    Cada alteração gera um novo objeto com `version` maior; quem deriva
+    estado dos ajustes (LUTs, limiares) só precisa refazê-lo quando a
+    versão muda.
+    """
+
+    brightness: int = 100
+    contrast: int = 100
+    sharpness: int = 0
+    grayscale: bool = False
+    min_confidence: float = 0.5
+    alert_frequency: int = 1000
+    alert_duration: int = 500
+    delay_time: int = 10
+    version: int = 0
+
+    @classmethod
+    def from_config(cls, config, version=0):
+        return cls(
+            brightness=int(config.default_brightness),
+            contrast=int(config.default_contrast),
+            sharpness=int(config.default_sharpness),
+            grayscale=bool(config.default_grayscale),
+            min_confidence=float(config.min_confidence),
+            alert_frequency=int(config.alert_frequency),
+            alert_duration=int(config.alert_duration),
+            delay_time=int(config.delay_time),
+            version=version
+        )
+
+    def as_dict(self):
+        values = asdict(self)
+        values.pop('version')
+        return values
+
+
+SETTING_NAMES = tuple(field.name for field in fields(PipelineSettings) if field.name != 'version')
+
+
+class SettingsStore:
+    """
+    Publica os ajustes atuais para o pipeline.
+
+    A leitura é apenas o acesso ao atributo `current` (a troca de referência
+    é atômica), sem trava no caminho do frame. publish() cria um novo
+    snapshot somente se algum valor realmente mudou.
+    """
+
+    def __init__(self, settings=None):
+        self.current = settings or PipelineSettings()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(PipelineSettings.from_config(config))
+
+    def publish(self, **changes):
+        """Aplica as alterações e retorna o snapshot em vigor."""
+        unknown = set(changes) - set(SETTING_NAMES)
+        if unknown:
+            raise ValueError(f"Ajustes desconhecidos: {', '.join(sorted(unknown))}")
+
+        with self._lock:
+            current = self.current
+            changed = {name: value for name, value in changes.items() if getattr(current, name) != value}
+            if not changed:
+                return current
+            self.current = replace(current, version=current.version + 1, **changed)
+            return self.current
+
+    def publish_config(self, config):
+        """Publica os valores de um config (ex.: após recarregar o arquivo)."""
+        return self.publish(**PipelineSettings.from_config(config).as_dict())
@@ -0,0 +1,402 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+from src.core import buffers, performance
+
+try:
+    import av
+except ImportError:  # Sem PyAV o backend 'pyav' recai no OpenCV
+    av = None
+
+BACKENDS = ('opencv', 'pyav', 'file', 'synthetic')
+
+
+class FrameSource(ABC):
+    """
+    Interface comum das fontes de frames.
+
+    read_latest(timeout) retorna (frame, timestamp) com o frame mais recente
+    ainda não entregue, ou (None, None) se nenhum chegou dentro do prazo. O
+    timestamp é o horário (time.time()) em que o frame foi decodificado.
+    `skipped` conta os frames decodificados e descartados por já existir um
+    mais novo. Fontes com FramePool decodificam em buffers do pool: o
+    frame entregue passa a ser de quem o leu, que chama buffers.release()
+    depois de usá-lo.
+    """
+
+    name = 'base'
+
+    def __init__(self, description):
+        self.description = description
+        self.skipped = 0
+        # Horário do último frame decodificado, usado para detectar travamentos
+        self.last_frame_time = None
+        # Fim normal da stream (ex.: arquivo sem loop): não há o que reconectar
+        self.ended = False
+
+    @abstractmethod
+    def open(self):
+        """Conecta à fonte; retorna False se não conseguiu."""
+
+    @abstractmethod
+    def is_open(self):
+        """True enquanto a fonte entrega frames."""
+
+    @abstractmethod
+    def read_latest(self, timeout=1.0):
+        """Retorna (frame, timestamp) ou (None, None) se nada chegou no prazo."""
+
+    def close(self):
+        pass
+
+
+class _ThreadedSource(FrameSource):
+    """
+    Decodifica em uma thread própria e guarda só o frame mais recente.
+
+    Quem consome nunca recebe frames atrasados: se o pipeline for mais lento
+    que a câmera, os frames intermediários são descartados aqui, sem se
+    acumular no buffer do decodificador.
+    """
+
+    def __init__(self, description):
+        super().__init__(description)
+        self._condition = threading.Condition()
+        self._frame = None
+        self._timestamp = None
+        self._seq = 0
+        self._delivered = 0
+        self._running = False
+        self._failed = False
+        self._thread = None
+
+    def open(self):
+        if not self._connect():
+            return False
+        self._running = True
+        self._failed = False
+        self._thread = threading.Thread(target=self._reader_loop, name=f"{self.name}-reader", daemon=True)
+        self._thread.start()
+        return True
+
+    def is_open(self):
+        return self._running and not self._failed
+
+    def _reader_loop(self):
+        performance.pin_thread('capture')
+        try:
+            for frame in self._frames():
+                if not self._running:
+                    break
+                with self._condition:
+                    if self._seq > self._delivered:
+                        self.skipped += 1
+                        # Nunca entregue: o buffer volta direto ao pool
+                        buffers.release(self._frame)
+                    self._frame = frame
+                    self._timestamp = self.last_frame_time = time.time()
+                    self._seq += 1
+                    self._condition.notify_all()
+        except Exception as e:
+            print(f"❌ Erro na leitura de {self.description}: {e}")
+        finally:
+            with self._condition:
+                self._failed = True
+                self._condition.notify_all()
+            self._disconnect()
+
+    def read_latest(self, timeout=1.0):
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._seq > self._delivered or self._failed, timeout):
+                return None, None
+            if self._seq == self._delivered:
+                return None, None
+            self._delivered = self._seq
+            return self._frame, self._timestamp
+
+    def close(self):
+        self._running = False
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2)
+
+    @abstractmethod
+    def _connect(self):
+        """Abre a conexão; retorna False se não conseguiu."""
+
+    @abstractmethod
+    def _frames(self):
+        """Gera os frames decodificados, na thread de leitura."""
+
+    def _disconnect(self):
+        pass
+
+
+class OpenCVSource(_ThreadedSource):
+    """Câmera via cv2.VideoCapture (URL RTSP/HTTP ou índice de webcam)."""
+
+    name = 'opencv'
+
+    def __init__(self, source, resolution=None, pool=None):
+        super().__init__(str(source))
+        self.source = source
+        self.resolution = resolution
+        self.pool = pool
+        self._cap = None
+
+    def _connect(self):
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            self._cap.release()
+            self._cap = None
+            return False
+        # Um frame no buffer interno basta: a thread sempre lê o mais novo
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if self.resolution:
+            w, h = self.resolution
+            self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
+            self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+        return True
+
+    def _frames(self):
+        frame = None
+        while self._running:
+            # Com pool, cada frame é decodificado direto em um buffer livre
+            target = self.pool.acquire(frame.shape) if self.pool is not None and frame is not None else None
+            ret, frame = self._cap.read(target)
+            if target is not None and (not ret or frame is not target):
+                buffers.release(target)
+            if not ret:
+                return
+            yield frame
+
+    def _disconnect(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class PyAVSource(_ThreadedSource):
+    """
+    Câmera RTSP decodificada pelo FFmpeg via PyAV.
+
+    Usa as opções de baixa latência do FFmpeg (sem buffer de entrada, sem
+    reordenação), transporte TCP ou UDP e decodificação com várias threads.
+    """
+
+    name = 'pyav'
+
+    def __init__(self, url, transport='tcp', low_latency=True, decode_threads=0, timeout=5.0):
+        super().__init__(url)
+        self.url = url
+        self.transport = transport
+        self.low_latency = low_latency
+        self.decode_threads = decode_threads
+        self.timeout = timeout
+        self._container = None
+        self._stream = None
+
+    def _options(self):
+        options = {}
+        # Tempo máximo sem dados antes de a leitura falhar (microssegundos);
+        # 'stimeout' deixou de existir no FFmpeg 5
+        timeout_us = str(int(self.timeout * 1_000_000))
+        if self.url.startswith('rtsp'):
+            options['rtsp_transport'] = self.transport
+            options['timeout'] = timeout_us
+        else:
+            options['rw_timeout'] = timeout_us
+        if self.low_latency:
+            options.update({
+                'fflags': 'nobuffer',
+                'flags': 'low_delay',
+                'max_delay': '500000',
+                'reorder_queue_size': '0'
+            })
+        return options
+
+    def _connect(self):
+        try:
+            self._container = av.open(self.url, options=self._options(), timeout=self.timeout)
+        except Exception as e:  # av.error.* variam entre versões do PyAV
+            print(f"❌ Erro ao abrir {self.url} com PyAV: {e}")
+            return False
+        if not self._container.streams.video:
+            self._container.close()
+            self._container = None
+            return False
+
+        self._stream = self._container.streams.video[0]
+        self._stream.thread_type = 'AUTO'
+        self._stream.codec_context.thread_count = int(self.decode_threads)
+        return True
+
+    def _frames(self):
+        for frame in self._container.decode(self._stream):
+            if not self._running:
+                return
+            yield frame.to_ndarray(format='bgr24')
+
+    def _disconnect(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+
+
+class FileSource(FrameSource):
+    """Arquivo de vídeo local, lido em sequência (no ritmo do vídeo, se realtime)."""
+
+    name = 'file'
+
+    def __init__(self, path, realtime=True, loop=False):
+        super().__init__(path)
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self._cap = None
+        # O supervisor fecha a fonte na thread dele, talvez no meio de uma leitura
+        self._lock = threading.Lock()
+        self._interval = 0.0
+        self._next_time = 0.0
+
+    def open(self):
+        self._cap = cv2.VideoCapture(self.path)
+        if not self._cap.isOpened():
+            self._cap = None
+            return False
+        fps = self._cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self._interval = 1.0 / fps if self.realtime else 0.0
+        self._next_time = time.perf_counter()
+        self.ended = False
+        return True
+
+    def is_open(self):
+        return self._cap is not None
+
+    def read_latest(self, timeout=1.0):
+        if self._cap is None:
+            return None, None
+        if self._interval:
+            delay = self._next_time - time.perf_counter()
+            if delay > timeout:
+                return None, None
+            if delay > 0:
+                time.sleep(delay)
+            self._next_time = max(self._next_time + self._interval, time.perf_counter() - self._interval)
+
+        with self._lock:
+            if self._cap is None:
+                return None, None
+            ret, frame = self._cap.read()
+            if not ret and self.loop:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self._cap.read()
+            if not ret:
+                self.ended = True
+                self._release()
+                return None, None
+        self.last_frame_time = time.time()
+        return frame, self.last_frame_time
+
+    def close(self):
+        with self._lock:
+            self._release()
+
+    def _release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class SyntheticSource(FrameSource):
+    """Padrão de teste gerado em memória, para testar o pipeline sem câmera."""
+
+    name = 'synthetic'
+
+    def __init__(self, resolution=(1280, 720), fps=25.0, pool=None):
+        super().__init__('synthetic')
+        self.pool = pool
+        self.width, self.height = resolution
+        self.fps = fps
+        self._open = False
+        self._count = 0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+        # Barras de cor fixas; só a faixa móvel e o texto mudam a cada frame
+        colors = np.array([[255, 255, 255], [0, 255, 255], [255, 255, 0], [0, 255, 0],
+                           [255, 0, 255], [0, 0, 255], [255, 0, 0], [0, 0, 0]], dtype=np.uint8)
+        columns = np.arange(self.width) * len(colors) // self.width
+        self._background = np.repeat(colors[columns][np.newaxis, :, :], self.height, axis=0)
+
+    def open(self):
+        self._open = True
+        self._next_time = time.perf_counter()
+        return True
+
+    def is_open(self):
+        return self._open
+
+    def read_latest(self, timeout=1.0):
+        if not self._open:
+            return None, None
+        delay = self._next_time - time.perf_counter()
+        if delay > timeout:
+            return None, None
+        if delay > 0:
+            time.sleep(delay)
+        self._next_time = max(self._next_time + 1.0 / self.fps, time.perf_counter())
+
+        with self._lock:
+            # Fechada durante a espera: não entrega mais frames
+            if not self._open:
+                return None, None
+            if self.pool is not None:
+                frame = self.pool.acquire(self._background.shape)
+                np.copyto(frame, self._background)
+            else:
+                frame = self._background.copy()
+            band = (self._count * 8) % self.width
+            frame[:, band:band + 16] = 128
+            cv2.putText(frame, f"SafetyLens {self._count}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+            self._count += 1
+        self.last_frame_time = time.time()
+        return frame, self.last_frame_time
+
+    def close(self):
+        with self._lock:
+            self._open = False
+
+
+def create_source(config, pool=None):
+    """Cria a fonte de frames da câmera conforme camera.capture no config."""
+    settings = config.camera_capture
+    backend = settings['backend']
+    source = config.camera_source
+    if settings['use_substream'] and settings['substream_url']:
+        # Sub-stream de menor resolução: decodificação bem mais barata
+        source = settings['substream_url']
+
+    if backend == 'synthetic':
+        return SyntheticSource(config.camera_resolution, settings['fps'], pool)
+    if backend == 'file' or (isinstance(source, str) and os.path.isfile(source)):
+        return FileSource(source, realtime=settings['realtime'], loop=settings['loop'])
+    if backend == 'pyav':
+        if av is None:
+            print("⚠️ PyAV não instalado; usando o OpenCV para ler a câmera.")
+        elif isinstance(source, str):
+            return PyAVSource(
+                source,
+                transport=settings['transport'],
+                low_latency=settings['low_latency'],
+                decode_threads=settings['decode_threads'],
+                timeout=settings['timeout']
+            )
+    if backend not in BACKENDS:
+        print(f"⚠️ Backend de captura desconhecido: {backend}; usando o OpenCV.")
+    resolution = None if settings['use_substream'] else config.camera_resolution
+    return OpenCVSource(source, resolution, pool)
@@ -0,0 +1,333 @@
+import base64
+import gzip
+import json
+import os
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.ndjson'
+CURSOR_FILE = 'cursor.json'
+
+
+class EventSpool:
+    """
+    Fila durável de eventos em disco, em segmentos somente de acréscimo.
+
+    append() acrescenta uma linha JSON ao segmento atual (e faz fsync, se
+    configurado); ao passar de `segment_bytes` um novo segmento é aberto.
+    read_batch() lê a partir do cursor confirmado sem avançá-lo; só ack()
+    grava o novo cursor (de forma atômica) e apaga os segmentos já
+    enviados. Se o processo cair entre o envio e o ack, o lote é reenviado
+    e o servidor central descarta as repetições pelo uid do evento.
+
+    Com `max_bytes`, o spool de uma estação que fica muito tempo sem o
+    servidor central não cresce sem limite: ao passar do limite, os
+    segmentos mais antigos ainda não enviados são descartados (contados em
+    `dropped`).
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, fsync=True, max_bytes=0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.appended = 0
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+        self._condition = threading.Condition()
+        self._cursor = self._load_cursor()
+
+        segments = self._segments()
+        self._segment = max(segments + [self._cursor[0]])
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._size = self._file.tell()
+        if self._size and not self._ends_with_newline():
+            # Gravação interrompida: a linha incompleta fica isolada no segmento anterior
+            self._rotate()
+
+    def _ends_with_newline(self):
+        with open(self._segment_path(self._segment), 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    pass
+        return sorted(segments)
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE), 'r', encoding='utf-8') as f:
+                cursor = json.load(f)
+            return cursor['segment'], cursor['offset']
+        except FileNotFoundError:
+            segments = self._segments()
+            return (segments[0] if segments else 1), 0
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ Cursor do spool inválido ({e}); reenviando desde o primeiro segmento.")
+            segments = self._segments()
+            return (segments[0] if segments else 1), 0
+
+    @property
+    def cursor(self):
+        """Posição (segmento, offset) do último envio confirmado."""
+        return self._cursor
+
+    def append(self, event):
+        line = json.dumps(event, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b"\n"
+        with self._condition:
+            if self._size and self._size + len(line) > self.segment_bytes:
+                self._rotate()
+            if self.max_bytes and self.pending_bytes() + len(line) > self.max_bytes:
+                self._drop_oldest(len(line))
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._size += len(line)
+            self.appended += 1
+            self._condition.notify_all()
+
+    def _rotate(self):
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._size = 0
+
+    def _drop_oldest(self, needed):
+        # Chamado com self._condition adquirido: descarta segmentos inteiros, do mais antigo
+        dropped = 0
+        while self.pending_bytes() + needed > self.max_bytes:
+            segment, offset = self._cursor
+            if segment >= self._segment:
+                if not self._size:
+                    break
+                # Só resta o segmento atual: fecha-o para poder descartá-lo
+                self._rotate()
+            path = self._segment_path(segment)
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    dropped += sum(1 for line in f if line.endswith(b"\n"))
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._write_cursor((segment + 1, 0))
+        if dropped:
+            self.dropped += dropped
+            print(f"⚠️ Spool acima de {self.max_bytes / (1024 * 1024):g} MB: {dropped} eventos mais antigos descartados.")
+
+    def read_batch(self, max_events=200, max_bytes=1024 * 1024):
+        """
+        Retorna (eventos, posição) a partir do cursor confirmado.
+
+        A posição deve ser passada para ack() depois que o lote for aceito.
+        Uma linha incompleta no fim do segmento atual (queda no meio de uma
+        gravação) é ignorada até ser completada.
+        """
+        with self._condition:
+            segment, offset = self._cursor
+            last_segment = self._segment
+        events = []
+        size = 0
+        while len(events) < max_events and size < max_bytes:
+            path = self._segment_path(segment)
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        try:
+                            events.append(json.loads(line))
+                        except ValueError:
+                            print(f"⚠️ Evento corrompido ignorado no spool ({path}).")
+                            continue
+                        size += len(line)
+                        if len(events) >= max_events or size >= max_bytes:
+                            break
+            except FileNotFoundError:
+                pass
+            if len(events) >= max_events or size >= max_bytes or segment >= last_segment:
+                break
+            # Segmento esgotado: continua no próximo
+            segment, offset = segment + 1, 0
+        return events, (segment, offset)
+
+    def ack(self, position):
+        """Confirma o envio até `position` e apaga os segmentos já enviados."""
+        with self._condition:
+            if tuple(position) < self._cursor:
+                # Lote lido antes de um descarte por limite de tamanho: o cursor já passou dele
+                return
+            self._write_cursor(position)
+        for segment in self._segments():
+            if segment < position[0]:
+                os.remove(self._segment_path(segment))
+
+    def _write_cursor(self, position):
+        self._cursor = tuple(position)
+        fd, temp_path = tempfile.mkstemp(prefix='.cursor-', dir=self.directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'segment': position[0], 'offset': position[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(self.directory, CURSOR_FILE))
+
+    def pending_events(self):
+        """Quantidade de eventos ainda não confirmados (lê os segmentos pendentes)."""
+        with self._condition:
+            segment, offset = self._cursor
+            segments = [current for current in self._segments() if current >= segment]
+        total = 0
+        for current in segments:
+            try:
+                with open(self._segment_path(current), 'rb') as f:
+                    if current == segment:
+                        f.seek(offset)
+                    total += sum(1 for line in f if line.endswith(b"\n"))
+            except FileNotFoundError:
+                pass
+        return total
+
+    def pending_bytes(self):
+        """Bytes ainda não confirmados pelo servidor central."""
+        with self._condition:
+            segment, offset = self._cursor
+        total = 0
+        for current in self._segments():
+            if current >= segment:
+                total += os.path.getsize(self._segment_path(current))
+        return max(0, total - offset)
+
+    def wait(self, timeout):
+        """Aguarda um novo evento (ou o prazo)."""
+        with self._condition:
+            appended = self.appended
+            return self._condition.wait_for(lambda: self.appended != appended, timeout)
+
+    def close(self):
+        with self._condition:
+            self._file.close()
+
+
+class IngestForwarder:
+    """
+    Envia os eventos do spool ao servidor central em lotes compactados.
+
+    Uma thread lê lotes de até `batch_size` eventos, envia como JSON gzip
+    para POST /ingest e só confirma o lote no spool quando o servidor o
+    aceita. Com o servidor fora do ar, os eventos continuam acumulando no
+    spool e o envio é retomado com espera exponencial até `backoff_max`.
+    """
+
+    def __init__(self, spool, url, site, token=None, batch_size=200, interval=2.0, timeout=10.0,
+                 backoff_max=60.0):
+        self.spool = spool
+        self.url = url
+        self.site = site
+        self.token = token
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.backoff_max = backoff_max
+        self.sent = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.failures = 0
+        self.bytes_sent = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-forwarder", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        initial_delay = min(1.0, self.backoff_max)
+        delay = initial_delay
+        while not self._stop.is_set():
+            events, position = self.spool.read_batch(self.batch_size)
+            if not events:
+                if position != self.spool.cursor:
+                    # Só havia segmentos vazios ou linhas corrompidas
+                    self.spool.ack(position)
+                self.spool.wait(self.interval)
+                continue
+            try:
+                self.send(events)
+            except urllib.error.HTTPError as e:
+                if e.code in (400, 413, 422):
+                    # O lote nunca será aceito; descartá-lo evita travar a fila
+                    print(f"❌ Lote de {len(events)} eventos recusado pelo servidor central ({e.code}); descartado.")
+                    self.spool.ack(position)
+                    continue
+                self._failed(e, delay)
+                delay = min(delay * 2, self.backoff_max)
+                continue
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                self._failed(e, delay)
+                delay = min(delay * 2, self.backoff_max)
+                continue
+            self.spool.ack(position)
+            delay = initial_delay
+
+    def _failed(self, error, delay):
+        self.failures += 1
+        self.last_error = str(error)
+        print(f"⚠️ Falha ao enviar eventos ao servidor central: {error}; nova tentativa em {delay:g}s")
+        self._stop.wait(delay)
+
+    def send(self, events):
+        """Envia um lote; retorna a resposta do servidor ({'accepted', 'duplicates'})."""
+        body = gzip.compress(json.dumps({'site': self.site, 'events': events}).encode('utf-8'))
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            result = json.loads(response.read() or b'{}')
+        self.batches += 1
+        self.bytes_sent += len(body)
+        self.sent += result.get('accepted', len(events))
+        self.duplicates += result.get('duplicates', 0)
+        return result
+
+    def stop(self):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=self.timeout + 1)
+
+
+def alert_event(alert, epi_names, image=None):
+    """Converte um alerta no evento enviado ao servidor central."""
+    event = {
+        'uid': alert.uid,
+        'camera': alert.camera,
+        'timestamp': alert.timestamp_text,
+        'epis': [epi_names[class_id] for class_id in alert.found_classes if class_id in epi_names]
+    }
+    if alert.boxes:
+        # [EPI, x1, y1, x2, y2, confiança, id de rastreamento], coordenadas normalizadas
+        event['boxes'] = [[epi_names[box[0]]] + [round(value, 4) for value in box[1:6]] + [box[6]]
+                          for box in alert.boxes if box[0] in epi_names]
+    if image:
+        event['image'] = base64.b64encode(image).decode('ascii')
+    return event
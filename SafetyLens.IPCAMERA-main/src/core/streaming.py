@@ -0,0 +1,239 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import cv2
+
+from src.core import buffers, performance
+
+BOUNDARY = 'frame'
+
+
+class _StreamChannel:
+    """Estado de transmissão de uma câmera."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Sinaliza a thread de codificação que há um frame novo
+        self.frame_ready = threading.Condition(self.lock)
+        # Sinaliza os clientes que há um JPEG novo
+        self.jpeg_ready = threading.Condition(self.lock)
+        self.raw_frame = None
+        self.raw_seq = 0
+        self.part = None
+        self.part_seq = 0
+        self.viewers = 0
+
+
+class FrameHub:
+    """
+    Distribui os frames anotados do pipeline para os clientes MJPEG.
+
+    Cada frame é codificado uma única vez por uma thread dedicada da câmera
+    e o mesmo buffer (já com o cabeçalho multipart) é entregue a todos os
+    espectadores. Sem espectadores, publish() retorna sem codificar nada.
+    Cada cliente recebe sempre o JPEG mais recente quando termina de enviar
+    o anterior, então um cliente lento descarta frames sem atrasar os demais.
+    Com um JPEGEncoder, a política 'stream' substitui width e quality.
+    Frames de um FramePool ficam retidos (buffers.retain) até serem
+    codificados ou substituídos por um mais novo.
+    """
+
+    def __init__(self, width=640, quality=70, metrics=None, encoder=None):
+        self.width = width
+        self.quality = quality
+        self.metrics = metrics
+        self.encoder = encoder
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._running = True
+
+    def _get_channel(self, camera_id):
+        with self._lock:
+            channel = self._channels.get(camera_id)
+            if channel is None:
+                channel = _StreamChannel()
+                self._channels[camera_id] = channel
+                threading.Thread(
+                    target=self._encode_loop,
+                    args=(camera_id, channel),
+                    name=f"mjpeg-{camera_id}",
+                    daemon=True
+                ).start()
+            return channel
+
+    def viewer_count(self, camera_id):
+        channel = self._channels.get(camera_id)
+        return channel.viewers if channel else 0
+
+    def publish(self, camera_id, frame):
+        """Entrega um frame anotado; custo praticamente nulo sem espectadores."""
+        channel = self._channels.get(camera_id)
+        if channel is None or channel.viewers == 0:
+            return
+        buffers.retain(frame)
+        with channel.lock:
+            if channel.raw_frame is not None:
+                # O frame anterior ainda não foi codificado e será descartado
+                buffers.release(channel.raw_frame)
+                if self.metrics is not None:
+                    self.metrics.mark_dropped(camera_id, 'stream')
+            # Mantém apenas a referência ao frame mais recente
+            channel.raw_frame = frame
+            channel.raw_seq += 1
+            channel.frame_ready.notify()
+
+    def _encode_loop(self, camera_id, channel):
+        performance.pin_thread('encode')
+        last_seq = 0
+        while self._running:
+            with channel.lock:
+                channel.frame_ready.wait_for(
+                    lambda: not self._running or (channel.viewers > 0 and channel.raw_seq != last_seq),
+                    timeout=1.0
+                )
+                if not self._running:
+                    return
+                if channel.viewers == 0 or channel.raw_seq == last_seq:
+                    continue
+                frame = channel.raw_frame
+                last_seq = channel.raw_seq
+                channel.raw_frame = None
+
+            start = time.perf_counter()
+            try:
+                part = self._encode(frame)
+            finally:
+                buffers.release(frame)
+            if self.metrics is not None:
+                self.metrics.observe(camera_id, 'encode', time.perf_counter() - start)
+            if part is None:
+                continue
+
+            with channel.lock:
+                channel.part = part
+                channel.part_seq += 1
+                channel.jpeg_ready.notify_all()
+
+    def _encode(self, frame):
+        if self.encoder is not None:
+            jpeg = self.encoder.encode('stream', frame)
+            if jpeg is None:
+                return None
+            return self._part(jpeg)
+        try:
+            height, width = frame.shape[:2]
+            if self.width and width > self.width:
+                new_height = int(height * self.width / width)
+                frame = cv2.resize(frame, (self.width, new_height), interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+            if not ok:
+                return None
+            jpeg = encoded.tobytes()
+        except cv2.error as e:
+            print(f"Erro ao codificar frame para transmissão: {e}")
+            return None
+        return self._part(jpeg)
+
+    @staticmethod
+    def _part(jpeg):
+        header = (
+            f"--{BOUNDARY}\r\n"
+            f"Content-Type: image/jpeg\r\n"
+            f"Content-Length: {len(jpeg)}\r\n\r\n"
+        ).encode('ascii')
+        return header + jpeg + b"\r\n"
+
+    def parts(self, camera_id):
+        """
+        Gera as partes multipart de uma câmera para um cliente.
+
+        O ritmo é definido pelo consumidor: o gerador só avança quando o
+        cliente pede a próxima parte, pulando os frames intermediários.
+        """
+        channel = self._get_channel(camera_id)
+        with channel.lock:
+            channel.viewers += 1
+        try:
+            last_seq = 0
+            while self._running:
+                with channel.lock:
+                    ready = channel.jpeg_ready.wait_for(
+                        lambda: not self._running or (channel.part is not None and channel.part_seq != last_seq),
+                        timeout=5.0
+                    )
+                    if not ready or not self._running:
+                        continue
+                    part = channel.part
+                    last_seq = channel.part_seq
+                yield part
+        finally:
+            with channel.lock:
+                channel.viewers -= 1
+                if channel.viewers == 0:
+                    # Evita entregar um frame antigo ao próximo espectador
+                    channel.part = None
+                    channel.raw_frame = None
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            with channel.lock:
+                channel.frame_ready.notify_all()
+                channel.jpeg_ready.notify_all()
+
+
+class MJPEGServer:
+    """Servidor HTTP local que expõe /stream/<camera> a partir de um FrameHub."""
+
+    def __init__(self, hub, host='127.0.0.1', port=8090):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        hub = self.hub
+
+        class StreamHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.startswith('/stream/'):
+                    self.send_error(404)
+                    return
+                camera_id = unquote(self.path[len('/stream/'):].split('?', 1)[0])
+
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                self.send_header('Cache-Control', 'no-cache, private')
+                self.send_header('Pragma', 'no-cache')
+                self.end_headers()
+
+                parts = hub.parts(camera_id)
+                try:
+                    for part in parts:
+                        self.wfile.write(part)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    parts.close()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), StreamHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mjpeg-server", daemon=True)
+        self._thread.start()
+        print(f"📡 Transmissão MJPEG disponível em http://{self.host}:{self.port}/stream/<camera>")
+
+    def stop(self):
+        self.hub.stop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
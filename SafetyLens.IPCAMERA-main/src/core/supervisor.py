@@ -0,0 +1,162 @@
+import threading
+import time
+
+from src.core import performance
+
+
+class SourceSupervisor:
+    """
+    Mantém uma fonte de frames conectada sem bloquear o pipeline.
+
+    Uma thread própria abre a fonte, verifica se os frames continuam
+    chegando e, se a conexão cair ou nenhum frame novo chegar em
+    `stall_timeout` segundos, fecha a fonte e reconecta com espera
+    exponencial (de `backoff_initial` até `backoff_max`). Enquanto a câmera
+    está fora do ar, read_latest() apenas espera o prazo e retorna vazio,
+    então o laço de frames nunca fica preso em uma leitura travada.
+
+    Quando a fonte termina normalmente (`ended`, ex.: fim de um arquivo de
+    vídeo sem capture.loop), o supervisor encerra em vez de reconectar.
+    """
+
+    def __init__(self, factory, name, stall_timeout=10.0, backoff_initial=1.0, backoff_max=60.0, on_connect=None):
+        self.factory = factory
+        self.name = name
+        self.stall_timeout = stall_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        # Chamado na thread do supervisor a cada conexão bem-sucedida
+        self.on_connect = on_connect
+
+        self.state = 'stopped'
+        self.attempts = 0
+        self.reconnects = 0
+        self.stalls = 0
+        self.connected_since = None
+        self.total_uptime = 0.0
+        self.next_attempt = None
+
+        self._source = None
+        self._skipped_before = 0
+        self._ever_connected = False
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"supervisor-{self.name}", daemon=True)
+        self._thread.start()
+
+    def wait_connected(self, timeout=None):
+        return self._connected.wait(timeout)
+
+    @property
+    def is_connected(self):
+        return self._connected.is_set()
+
+    @property
+    def ended(self):
+        """True quando a fonte chegou ao fim e não será reaberta."""
+        return self.state == 'ended'
+
+    @property
+    def description(self):
+        source = self._source
+        return f"{source.name}: {source.description}" if source is not None else self.name
+
+    @property
+    def uptime(self):
+        """Segundos desde a conexão atual (0 se desconectado)."""
+        since = self.connected_since
+        return time.monotonic() - since if since is not None else 0.0
+
+    @property
+    def skipped(self):
+        source = self._source
+        return self._skipped_before + (source.skipped if source is not None else 0)
+
+    def read_latest(self, timeout=1.0):
+        source = self._source
+        if source is None:
+            # Câmera fora do ar: espera a reconexão sem ocupar a CPU
+            self._connected.wait(timeout)
+            return None, None
+        return source.read_latest(timeout)
+
+    def _run(self):
+        performance.pin_thread()
+        delay = self.backoff_initial
+        while not self._stop.is_set():
+            self.state = 'connecting'
+            self.attempts += 1
+            source = self.factory()
+            if source.open():
+                self._attach(source)
+                delay = self.backoff_initial
+                self._watch(source)
+                self._detach(source)
+                if source.ended:
+                    self.state = 'ended'
+                    return
+            else:
+                source.close()
+                print(f"❌ Falha ao conectar na câmera {self.name} ({source.description})")
+
+            if self._stop.is_set():
+                break
+            self.state = 'down'
+            self.next_attempt = time.time() + delay
+            print(f"🔄 Nova tentativa de conexão com {self.name} em {delay:g}s")
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.backoff_max)
+        self.state = 'stopped'
+
+    def _attach(self, source):
+        if self._ever_connected:
+            self.reconnects += 1
+        self._ever_connected = True
+        self._source = source
+        self.connected_since = time.monotonic()
+        self.next_attempt = None
+        self.state = 'up'
+        self._connected.set()
+        print(f"✅ Câmera conectada ({source.name}): {source.description}")
+        if self.on_connect is not None:
+            self.on_connect(self)
+
+    def _watch(self, source):
+        opened = time.time()
+        interval = min(1.0, self.stall_timeout / 4)
+        while not self._stop.wait(interval):
+            if source.ended:
+                print(f"🏁 Fim da stream da câmera {self.name} ({source.description}).")
+                return
+            if not source.is_open():
+                print(f"⚠️ Conexão com a câmera {self.name} perdida.")
+                return
+            last = source.last_frame_time or opened
+            if time.time() - last > self.stall_timeout:
+                self.stalls += 1
+                print(f"⚠️ Câmera {self.name} sem frames novos há {self.stall_timeout:g}s; reconectando.")
+                return
+
+    def _detach(self, source):
+        self._connected.clear()
+        self.total_uptime += self.uptime
+        self.connected_since = None
+        self._skipped_before += source.skipped
+        self._source = None
+        # Uma leitura travada pode segurar o fechamento; isso ocorre aqui, fora do laço de frames.
+        # As fontes sincronizam close() com uma leitura em andamento no pipeline
+        source.close()
+
+    def stop(self):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            # Se a fonte estiver travada, a thread a fecha sozinha ao sair de _watch()
+            thread.join(timeout=5)
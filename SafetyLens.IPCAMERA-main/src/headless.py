@@ -0,0 +1,45 @@
+import argparse
+import signal
+import threading
+
+from src.core.config import Config
+from src.core.metrics import StartupTimer
+from src.core.pipeline import DetectionPipeline
+
+
+def main(argv=None):
+    """
+    Executa a detecção sem interface gráfica, como serviço.
+
+    Uso: python -m src.headless [--config config.yaml]
+    """
+    parser = argparse.ArgumentParser(description="SafetyLens - detecção de EPIs sem interface gráfica")
+    parser.add_argument('--config', default='config.yaml', help="Caminho do arquivo de configuração")
+    args = parser.parse_args(argv)
+
+    startup = StartupTimer()
+    with startup.phase('config'):
+        config = Config(args.config)
+    config.start_watching()
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        print(f"Sinal {signal.Signals(signum).name} recebido, encerrando...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    with startup.phase('pipeline'):
+        pipeline = DetectionPipeline(config, startup)
+    print("SafetyLens em execução sem interface gráfica.")
+    try:
+        pipeline.run(stop_event)
+    finally:
+        config.stop_watching()
+        pipeline.close()
+        print("SafetyLens encerrado.")
+
+
+if __name__ == "__main__":
+    main()
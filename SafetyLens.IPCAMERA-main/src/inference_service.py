@@ -0,0 +1,101 @@
+import argparse
+import signal
+import sys
+import threading
+
+from src.core import performance
+from src.core.config import Config
+from src.core.detection import EPIDetector
+from src.core.inference import InferenceServer, service_supported
+from src.core.metrics import MetricsRegistry, MetricsServer
+from src.core.models import ModelManager, ModelRegistry
+
+
+def main(argv=None):
+    """
+    Executa o serviço de inferência local compartilhado.
+
+    Carrega o modelo uma única vez e atende, por um socket Unix, a estação
+    (app principal ou headless), a análise em lote e outros processos com
+    inference.service: true no config.yaml.
+
+    Uso: python -m src.inference_service [--config config.yaml]
+    """
+    parser = argparse.ArgumentParser(description="SafetyLens - serviço de inferência compartilhado")
+    parser.add_argument('--config', default='config.yaml', help="Caminho do arquivo de configuração")
+    args = parser.parse_args(argv)
+
+    if not service_supported():
+        print("❌ O serviço de inferência precisa de sockets Unix (Linux ou macOS).")
+        sys.exit(1)
+
+    config = Config(args.config)
+    settings = config.inference
+    performance.apply(config.performance)
+    config.start_watching()
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        print(f"Sinal {signal.Signals(signum).name} recebido, encerrando...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    detector = EPIDetector(config.model_path, config.min_confidence, lazy=True)
+    w, h = config.camera_resolution
+    models = config.models
+    manager = ModelManager(detector, (h, w, 3), ModelRegistry(models['registry_dir']),
+                           active_version=models['active'])
+
+    def offer_batch(frames, results, seconds):
+        # O modo sombra recebe a latência do lote dividida entre os frames
+        for frame, result in zip(frames, results):
+            manager.offer(frame, [result], seconds / len(frames))
+
+    server = InferenceServer(detector, settings['socket'], max_batch=settings['max_batch'],
+                             max_wait=settings['max_wait_ms'] / 1000, on_batch=offer_batch)
+
+    def loaded(error):
+        if error is None:
+            print(f"✅ Modelo carregado: {detector.model_path}")
+            manager.apply(config)
+
+    config.add_listener(lambda reloaded: manager.apply(reloaded) if detector.is_ready else None)
+
+    metrics = MetricsRegistry()
+    server.register_metrics(metrics)
+    manager.register_metrics(metrics)
+    metrics.register_gauge(
+        'safetylens_model_ready', "1 quando o modelo de detecção terminou de carregar",
+        lambda: int(detector.is_ready)
+    )
+    metrics_server = None
+    if config.metrics['enabled']:
+        metrics_server = MetricsServer(metrics, config.metrics['host'], settings['metrics_port'])
+        try:
+            metrics_server.start()
+        except OSError as e:
+            print(f"❌ Erro ao iniciar o endpoint de métricas: {e}")
+            metrics_server = None
+
+    try:
+        server.start()
+    except OSError as e:
+        print(f"❌ Erro ao iniciar o serviço de inferência: {e}")
+        sys.exit(1)
+    detector.load_in_background((h, w, 3), on_ready=loaded)
+    try:
+        while not stop_event.wait(1.0):
+            pass
+    finally:
+        config.stop_watching()
+        server.stop()
+        manager.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+        print("Serviço de inferência encerrado.")
+
+
+if __name__ == "__main__":
+    main()
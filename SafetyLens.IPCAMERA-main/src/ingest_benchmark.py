@@ -0,0 +1,196 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.core.spool import EventSpool, IngestForwarder
+
+EPI_NAMES = ('Sem_Oculos', 'Sem_Capacete', 'Sem_Luva', 'Sem_Abafador')
+
+
+class StandInIngestServer:
+    """
+    Servidor local que imita o POST /ingest do servidor central.
+
+    Guarda só os uids recebidos, para medir a vazão do lado da estação sem
+    o custo do banco. Com `fail_every`, a cada N lotes o lote é gravado mas
+    a resposta é um erro 503, simulando uma confirmação perdida: a estação
+    reenvia o lote e os uids repetidos precisam ser descartados.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, fail_every=0):
+        self.fail_every = fail_every
+        self.uids = set()
+        self.duplicates = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                events = json.loads(body)['events']
+                status, result = server.receive(events)
+                payload = json.dumps(result).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/ingest"
+
+    def receive(self, events):
+        with self._lock:
+            self.requests += 1
+            accepted = 0
+            duplicates = 0
+            for event in events:
+                if event['uid'] in self.uids:
+                    duplicates += 1
+                else:
+                    self.uids.add(event['uid'])
+                    accepted += 1
+            self.duplicates += duplicates
+            if self.fail_every and self.requests % self.fail_every == 0:
+                return 503, {'error': 'confirmação perdida (simulada)'}
+        return 200, {'accepted': accepted, 'duplicates': duplicates}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ingest-stand-in", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def make_event(index, image_bytes=0):
+    event = {
+        'uid': uuid.uuid4().hex,
+        'camera': 'benchmark',
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'epis': [EPI_NAMES[index % len(EPI_NAMES)]]
+    }
+    if image_bytes:
+        # Conteúdo aleatório: não comprime, como um JPEG real
+        event['image'] = base64.b64encode(os.urandom(image_bytes)).decode('ascii')
+    return event
+
+
+def run_benchmark(args):
+    spool_dir = tempfile.mkdtemp(prefix='safetylens-spool-')
+    server = None
+    url = args.url
+    if not url:
+        server = StandInIngestServer(fail_every=args.fail_every)
+        server.start()
+        url = server.url
+
+    try:
+        spool = EventSpool(spool_dir, segment_bytes=int(args.segment_mb * 1024 * 1024), fsync=not args.no_fsync)
+        # Fase 1: a estação acumula eventos com o servidor central fora do ar
+        started = time.perf_counter()
+        for index in range(args.events):
+            spool.append(make_event(index, args.image_bytes))
+        append_elapsed = time.perf_counter() - started
+        spooled_bytes = spool.pending_bytes()
+
+        # Fase 2: o servidor volta e o spool é reenviado
+        forwarder = IngestForwarder(spool, url, 'benchmark', token=args.token, batch_size=args.batch_size,
+                                    interval=0.1, timeout=args.timeout, backoff_max=0.1)
+        started = time.perf_counter()
+        deadline = started + args.replay_timeout
+        forwarder.start()
+        # Com o servidor inacessível, o reenvio desiste no prazo e informa o que ficou no spool
+        while spool.pending_bytes() > 0 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        replay_elapsed = time.perf_counter() - started
+        forwarder.stop()
+        undelivered = spool.pending_events()
+        spool.close()
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    report = {
+        'url': args.url or 'stand-in',
+        'events': args.events,
+        'batch_size': args.batch_size,
+        'image_bytes': args.image_bytes,
+        'fsync': not args.no_fsync,
+        'spool_append_events_s': round(args.events / append_elapsed, 1) if append_elapsed > 0 else None,
+        'spooled_bytes': spooled_bytes,
+        'replay_elapsed_s': round(replay_elapsed, 3),
+        'replay_events_s': round((args.events - undelivered) / replay_elapsed, 1) if replay_elapsed > 0 else None,
+        'replay_complete': undelivered == 0,
+        'undelivered_events': undelivered,
+        'batches': forwarder.batches,
+        'failed_batches': forwarder.failures,
+        'last_error': forwarder.last_error,
+        'bytes_sent': forwarder.bytes_sent,
+        'compression_ratio': round(spooled_bytes / forwarder.bytes_sent, 2) if forwarder.bytes_sent else None
+    }
+    if server is not None:
+        # Reenvios após confirmações perdidas não podem gerar eventos repetidos
+        report['received_unique'] = len(server.uids)
+        report['duplicates_discarded'] = server.duplicates
+        report['lost'] = args.events - len(server.uids)
+    return report
+
+
+def main(argv=None):
+    """
+    Benchmark do envio de eventos ao servidor central (spool + /ingest).
+
+    Sem --url, usa um servidor local que imita o /ingest.
+
+    Uso: python -m src.ingest_benchmark [--events 10000] [--fail-every 5]
+    """
+    parser = argparse.ArgumentParser(description="SafetyLens - benchmark do envio de eventos ao servidor central")
+    parser.add_argument('--url', help="URL do /ingest real (padrão: servidor local simulado)")
+    parser.add_argument('--token', help="Token do /ingest")
+    parser.add_argument('--events', type=int, default=10000, help="Quantidade de eventos")
+    parser.add_argument('--batch-size', type=int, default=200, help="Eventos por lote")
+    parser.add_argument('--image-bytes', type=int, default=0, help="Tamanho da imagem simulada por evento")
+    parser.add_argument('--segment-mb', type=float, default=4, help="Tamanho dos segmentos do spool (MB)")
+    parser.add_argument('--no-fsync', action='store_true', help="Não faz fsync a cada evento")
+    parser.add_argument('--fail-every', type=int, default=0,
+                        help="Servidor simulado: perde a confirmação a cada N lotes")
+    parser.add_argument('--timeout', type=float, default=10.0, help="Timeout de cada envio (s)")
+    parser.add_argument('--replay-timeout', type=float, default=120.0,
+                        help="Prazo para reenviar todo o spool (s); o que sobrar é informado no resultado")
+    parser.add_argument('--output', help="Também grava o resultado JSON neste arquivo")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
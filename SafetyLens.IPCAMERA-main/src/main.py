@@ -1,7 +1,25 @@
-from src.ui.main_window import MainWindow
+import argparse
+
+from src.core.metrics import StartupTimer
+
 
 def main():
-    app = MainWindow()
+    parser = argparse.ArgumentParser(description="SafetyLens - Sistema de Detecção de EPIs")
+    parser.add_argument('--headless', action='store_true',
+                        help="Executa a detecção sem a janela Tk")
+    args, remaining = parser.parse_known_args()
+
+    if args.headless:
+        from src.headless import main as headless_main
+        headless_main(remaining)
+        return
+
+    startup = StartupTimer()
+    with startup.phase('imports'):
+        # Importado aqui para que o modo headless não dependa do Tk
+        from src.ui.main_window import MainWindow
+
+    app = MainWindow(startup)
     try:
         app.run()
     finally:
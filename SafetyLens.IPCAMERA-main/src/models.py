@@ -0,0 +1,114 @@
+import argparse
+import sys
+
+from src.core.config import Config
+from src.core.models import ModelRegistry
+
+
+def _set_models(config, **values):
+    # A estação em execução recarrega o config.yaml e aplica a mudança; a
+    # releitura logo antes evita desfazer algo que a estação acabou de gravar
+    config.load_config()
+    config.config.setdefault('models', {}).update(values)
+    config.save_config()
+
+
+def _print_report(report):
+    candidate = report['candidate_latency']
+    active = report['active_latency']
+    print(f"  frames avaliados: {report['frames']} (ignorados: {report['skipped']}), atualizado em {report['updated']}")
+    print(f"  latência candidato: média {candidate['mean_ms']} ms, p50 {candidate['p50_ms']} ms, p95 {candidate['p95_ms']} ms")
+    print(f"  latência ativo ({report['active_version'] or 'paths.model'}): média {active['mean_ms']} ms, "
+          f"p50 {active['p50_ms']} ms, p95 {active['p95_ms']} ms")
+    print(f"  concordância das caixas: {report['agreement']:.1%}, das violações: {report['violation_agreement']:.1%}")
+
+
+def main(argv=None):
+    """
+    Gerencia o registro de versões do modelo.
+
+    activate, shadow e promote apenas alteram a seção models do
+    config.yaml; a estação em execução percebe a mudança e troca o modelo
+    (ou inicia o modo sombra) sem reiniciar.
+
+    Uso: python -m src.models [--config config.yaml] {list,add,activate,shadow,promote,report} ...
+    """
+    parser = argparse.ArgumentParser(description="SafetyLens - registro de versões do modelo")
+    parser.add_argument('--config', default='config.yaml', help="Caminho do arquivo de configuração")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="Lista as versões do registro")
+    add = commands.add_parser('add', help="Copia um modelo (.pt) para o registro")
+    add.add_argument('path', help="Arquivo do modelo")
+    add.add_argument('--version', help="Nome da versão (padrão: data e hora)")
+    add.add_argument('--notes', default='', help="Observações sobre a versão")
+    activate = commands.add_parser('activate', help="Troca o modelo ativo")
+    activate.add_argument('version', help="Versão do registro, ou 'none' para voltar ao paths.model")
+    shadow = commands.add_parser('shadow', help="Avalia uma versão em modo sombra")
+    shadow.add_argument('version', help="Versão do registro, ou 'none' para encerrar o modo sombra")
+    shadow.add_argument('--sample-rate', type=float, help="Fração dos frames avaliados (0 a 1)")
+    commands.add_parser('promote', help="Torna ativa a versão em modo sombra")
+    report = commands.add_parser('report', help="Mostra o relatório do modo sombra")
+    report.add_argument('version', nargs='?', help="Versão (padrão: a que está em modo sombra)")
+    args = parser.parse_args(argv)
+
+    config = Config(args.config)
+    settings = config.models
+    registry = ModelRegistry(settings['registry_dir'])
+
+    if args.command == 'list':
+        versions = registry.versions()
+        if not versions:
+            print(f"Nenhuma versão em {registry.directory}.")
+        for version in versions:
+            marks = [name for name, value in (('ativa', settings['active']), ('sombra', settings['shadow']))
+                     if value == version]
+            info = registry.info(version)
+            line = f"{version:<24} {info.get('added', ''):<20} {info.get('notes', '')}"
+            print(line + (f" [{', '.join(marks)}]" if marks else ''))
+
+    elif args.command == 'add':
+        try:
+            version = registry.add(args.path, args.version, args.notes)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Versão {version} adicionada em {registry.path(version)}")
+
+    elif args.command in ('activate', 'shadow'):
+        version = None if args.version.lower() == 'none' else args.version
+        if version is not None and version not in registry.versions():
+            print(f"❌ Versão {version} não encontrada em {registry.directory}")
+            sys.exit(1)
+        if args.command == 'activate':
+            _set_models(config, active=version)
+            print(f"✅ Modelo ativo: {version or config.config['paths']['model']}")
+        else:
+            values = {'shadow': version}
+            if args.sample_rate is not None:
+                values['shadow_sample_rate'] = args.sample_rate
+            _set_models(config, **values)
+            print(f"✅ Modo sombra: {version or 'desativado'}")
+
+    elif args.command == 'promote':
+        version = settings['shadow']
+        if not version:
+            print("❌ Nenhuma versão em modo sombra.")
+            sys.exit(1)
+        report = registry.report(version)
+        if report is not None:
+            _print_report(report)
+        _set_models(config, active=version, shadow=None)
+        print(f"✅ Versão {version} promovida a modelo ativo.")
+
+    elif args.command == 'report':
+        version = args.version or settings['shadow']
+        report = registry.report(version) if version else None
+        if report is None:
+            print(f"Sem relatório do modo sombra para {version or '(nenhuma versão)'}.")
+            sys.exit(1)
+        print(f"Versão {version}:")
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+
+from src.core.config import Config
+from src.core.database import DatabaseManager
+from src.core.partitions import create_partitions
+from src.core.retention import RetentionManager
+
+
+def main(argv=None):
+    """
+    Executa a retenção do banco: imagens antigas, arquivamento e vacuum.
+
+    Pensado para rodar agendado (cron ou Agendador de Tarefas), com o app
+    principal em execução.
+
+    Uso: python -m src.retention [--config config.yaml] [--dry-run] [--convert-vacuum]
+    """
+    parser = argparse.ArgumentParser(description="SafetyLens - retenção e arquivamento das detecções")
+    parser.add_argument('--config', default='config.yaml', help="Caminho do arquivo de configuração")
+    parser.add_argument('--dry-run', action='store_true', help="Apenas informa o que seria processado")
+    parser.add_argument('--convert-vacuum', action='store_true',
+                        help="Converte bancos antigos para auto_vacuum incremental (VACUUM completo, "
+                             "bloqueia o banco: use com o app parado)")
+    args = parser.parse_args(argv)
+
+    config = Config(args.config)
+    db = DatabaseManager(config.database_path, partitions=create_partitions(config.storage))
+    try:
+        RetentionManager(db, **config.retention).run(dry_run=args.dry_run, convert_vacuum=args.convert_vacuum)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,15 @@ import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
 import cv2
-from src.core.config import Config
+import numpy as np
+
+from src.core import buffers
 
 class CameraFrame(ttk.LabelFrame):
-    def __init__(self, parent):
+    def __init__(self, parent, config):
         super().__init__(parent, text="Visualização da Câmera", style="Custom.TLabelframe")
-        # Carrega a configuração para obter a resolução real
-        self.config = Config()
+        # Usa a configuração compartilhada para obter a resolução real
+        self.config = config
         self.real_width, self.real_height = self.config.camera_resolution
         
         # Configura o grid para expansão
@@ -18,6 +20,8 @@ class CameraFrame(ttk.LabelFrame):
         self.setup_ui()
         self._last_size = None
         self._last_frame = None
+        # Destino reutilizado do redimensionamento (cv2.resize com dst)
+        self._resized = None
         
         self.bind('<Configure>', self._on_resize)
 
@@ -62,7 +66,10 @@ class CameraFrame(ttk.LabelFrame):
     def update_frame(self, frame):
         """Atualiza o frame da câmera na interface com redimensionamento responsivo"""
         if frame is not None:
-            self._last_frame = frame.copy()
+            # Sem cópia: o frame fica retido até chegar o próximo
+            buffers.retain(frame)
+            buffers.release(self._last_frame)
+            self._last_frame = frame
             self._update_display()
 
     def _update_display(self):
@@ -89,9 +96,13 @@ class CameraFrame(ttk.LabelFrame):
                 new_height = int(img_height * scale)
 
                 # Redimensiona o frame
+                shape = (new_height, new_width) + self._last_frame.shape[2:]
+                if self._resized is None or self._resized.shape != shape:
+                    self._resized = np.empty(shape, dtype=self._last_frame.dtype)
                 resized_frame = cv2.resize(
                     self._last_frame, 
                     (new_width, new_height),
+                    dst=self._resized,
                     interpolation=cv2.INTER_LANCZOS4
                 )
                 
@@ -1,22 +1,21 @@
+import queue
 import tkinter as tk
 from tkinter import ttk
 import cv2
-from datetime import datetime
-import threading
 import time
-import winsound
-from concurrent.futures import ThreadPoolExecutor
 import sv_ttk
 
 from src.ui.camera_frame import CameraFrame
 from src.ui.settings_frame import SettingsFrame
-from src.core.detection import EPIDetector, ImageProcessor
+from src.core import performance
 from src.core.config import Config
-from src.core.database import DatabaseManager
+from src.core.metrics import StartupTimer
+from src.core.pipeline import DetectionPipeline
 
 
 class MainWindow:
-    def __init__(self):
+    def __init__(self, startup=None):
+        self.startup = startup or StartupTimer()
         self.root = tk.Tk()
         self.root.title("SafetyLens - Sistema de Detecção de EPIs")
         self.root.geometry("1600x900")  # Tamanho inicial maior
@@ -28,16 +27,20 @@ class MainWindow:
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_columnconfigure(0, weight=1)
 
-        self.setup_config()
-        self.setup_detector()
-        self.setup_database()
-        self.setup_components()  # Criar componentes (incluindo status_label) antes da câmera
-        self.setup_camera()
+        # O Tk não é thread-safe: outras threads só enfileiram chamadas,
+        # que a thread do Tk executa em poll_ui_events()
+        self._ui_events = queue.Queue()
+
+        with self.startup.phase('config'):
+            self.setup_config()
+        with self.startup.phase('pipeline'):
+            self.setup_pipeline()
+        with self.startup.phase('ui'):
+            self.setup_components()  # Criar componentes (incluindo status_label) antes da câmera
+        self.load_model()
 
         self.is_running = True
-        self.alert_thread = None
-        self.last_alert_time = 0
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        self._camera_lost = False
 
     def setup_styles(self):
         style = ttk.Style()
@@ -64,10 +67,12 @@ class MainWindow:
         content_container.grid_columnconfigure(1, weight=1)
         content_container.grid_rowconfigure(0, weight=1)
 
-        self.camera_frame = CameraFrame(content_container)
+        self.camera_frame = CameraFrame(content_container, self.config)
         self.camera_frame.grid(row=0, column=0, sticky="nsew", padx=(0, 5))
 
-        self.settings_frame = SettingsFrame(content_container, self.config, self.on_settings_change)
+        self.settings_frame = SettingsFrame(
+            content_container, self.config, self.pipeline.settings, self.on_settings_change
+        )
         self.settings_frame.grid(row=0, column=1, sticky="nsew", padx=(5, 0))
 
         self.setup_status_bar(main_container)
@@ -96,105 +101,127 @@ class MainWindow:
         self.status_label = ttk.Label(status_frame, text="Sistema Iniciado", style="Status.TLabel")
         self.status_label.grid(row=0, column=0, sticky="w")
 
+        # Métricas de desempenho do pipeline (FPS e latência de inferência)
+        self.metrics_label = ttk.Label(status_frame, text="", style="Status.TLabel")
+        self.metrics_label.grid(row=0, column=1, sticky="e", padx=10)
+
         version_label = ttk.Label(status_frame, text="v1.0.0", style="Status.TLabel")
         version_label.grid(row=0, column=2, sticky="e")
 
     def setup_config(self):
         self.config = Config()
+        # Mudanças feitas por outros processos (ex.: servidor web) são recarregadas
+        self.config.add_listener(self.on_config_reload)
+        self.config.start_watching()
+
+    def setup_pipeline(self):
+        # O pipeline faz todo o processamento; a janela apenas exibe os frames
+        self.pipeline = DetectionPipeline(self.config, self.startup)
+        # Os alertas chegam em threads do despachante; a interface é atualizada na thread do Tk
+        self.pipeline.on_alert = lambda missing_epis: self.post_ui_event(self.show_alert, missing_epis)
+        self.detector = self.pipeline.detector
+
+    def load_model(self):
+        self.update_status("⏳ Carregando modelo de detecção...")
+        self.settings_frame.update_detection_status("Carregando modelo...")
+        # on_model_ready roda na thread de carregamento; a interface é atualizada na thread do Tk
+        self.pipeline.load_model(lambda error: self.post_ui_event(self.on_model_ready, error))
+
+    def on_model_ready(self, error):
+        if error is not None:
+            self.update_status("❌ Erro ao carregar o modelo de detecção.")
+            self.settings_frame.update_detection_status("Modelo indisponível")
+            return
+        self.update_status("✅ Modelo carregado. Sistema Monitorando...")
+        self.settings_frame.update_detection_status()
 
     def setup_camera(self):
-        self.cap = cv2.VideoCapture(self.config.camera_url)
-
-        if not self.cap.isOpened():
-            self.update_status("❌ Erro: Não foi possível conectar à câmera.")
-            print(f"❌ Erro ao conectar na câmera RTSP: {self.config.camera_url}")
+        if not self.pipeline.open_camera():
+            self.update_status("❌ Erro: Não foi possível conectar à câmera. Tentando novamente...")
             return
 
-        w, h = self.config.camera_resolution
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
-
         self.update_status("✅ Câmera conectada com sucesso.")
-        print(f"✅ Câmera conectada: {self.config.camera_url}")
-
-    def setup_detector(self):
-        self.detector = EPIDetector(self.config.model_path, self.config.min_confidence)
-        self.processor = ImageProcessor()
-
-    def setup_database(self):
-        self.db = DatabaseManager(self.config.database_path)
 
     def update_status(self, message):
         self.status_label.config(text=message)
 
-    def play_alert(self):
-        # Alerta sonoro
-        winsound.Beep(self.config.alert_frequency, self.config.alert_duration)
-
-    def show_alert(self, missing_epis, frame, found_classes):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        _, frame_encoded = cv2.imencode('.jpg', frame)
-        frame_data = frame_encoded.tobytes()
-
-        self.db.log_detection(timestamp, missing_epis, found_classes, frame_data)
-
-        threading.Thread(target=self.play_alert, daemon=True).start()
+    def update_metrics(self):
+        self.metrics_label.config(text=self.pipeline.metrics.summary(self.pipeline.camera_name))
+        if self.is_running:
+            self.root.after(1000, self.update_metrics)
 
+    def show_alert(self, missing_epis):
         epi_list = ", ".join(missing_epis)
         self.update_status(f"⚠️ EPIs ausentes: {epi_list}")
         self.root.after(2000, lambda: self.update_status("Sistema Monitorando..."))
 
+    def on_config_reload(self, config):
+        # Chamado pela thread de monitoramento; os widgets são atualizados na thread do Tk
+        self.post_ui_event(self.settings_frame.refresh_from_config)
+
+    def post_ui_event(self, callback, *args):
+        """Agenda `callback(*args)` na thread do Tk; pode ser chamado de qualquer thread."""
+        self._ui_events.put((callback, args))
+
+    def poll_ui_events(self):
+        while True:
+            try:
+                callback, args = self._ui_events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Erro ao atualizar a interface: {e}")
+        if self.is_running:
+            self.root.after(50, self.poll_ui_events)
+
     def on_settings_change(self, **settings):
-        if 'min_confidence' in settings:
-            self.detector.update_min_confidence(settings['min_confidence'])
+        # O pipeline já recebeu o novo snapshot; aqui só persiste no config
         self.config.update_camera_settings(**settings)
 
     def process_frame(self):
-        if not self.cap.isOpened():
-            self.update_status("❌ Sem conexão com a câmera.")
-            self.root.after(1000, self.process_frame)
+        if not self.pipeline.is_camera_open():
+            # A reconexão acontece na thread do supervisor; aqui só se informa o estado
+            supervisor = self.pipeline.supervisor
+            attempts = supervisor.attempts if supervisor is not None else 0
+            self.update_status(f"❌ Sem conexão com a câmera. Reconectando (tentativa {attempts})...")
+            self._camera_lost = True
+            self.root.after(250, self.process_frame)
             return
+        if self._camera_lost:
+            self._camera_lost = False
+            self.update_status("✅ Câmera reconectada.")
 
-        ret, frame = self.cap.read()
+        # Espera curta: a leitura da câmera roda em outra thread e o Tk não pode travar
+        ret, frame = self.pipeline.read_frame(timeout=0.05)
         if ret:
-            settings = self.settings_frame.get_settings()
-            processed_frame = self.processor.adjust_image(
-                frame,
-                settings['brightness'],
-                settings['contrast'],
-                settings['sharpness'],
-                settings['grayscale']
-            )
-
-            frame_with_detections, missing_epis, found_classes = self.detector.detect(processed_frame)
-
+            frame_with_detections, _, _ = self.pipeline.process(frame)
+            start = time.perf_counter()
             self.camera_frame.update_frame(frame_with_detections)
+            self.pipeline.metrics.observe(self.pipeline.camera_name, 'display', time.perf_counter() - start)
 
-            if missing_epis and time.time() - self.last_alert_time > self.config.delay_time:
-                self.last_alert_time = time.time()
-                if self.alert_thread is None or not self.alert_thread.is_alive():
-                    self.alert_thread = threading.Thread(
-                        target=self.show_alert,
-                        args=(missing_epis, frame_with_detections, found_classes)
-                    )
-                    self.alert_thread.start()
-
-        else:
-            self.update_status("⚠️ Frame não capturado. Verifique a câmera.")
 
         if self.is_running:
             self.root.after(10, self.process_frame)
 
     def run(self):
+        # Desenha a janela antes de conectar à câmera, que pode demorar
+        self.root.update()
+        self.setup_camera()
+        # A inferência roda na thread do Tk (process_frame)
+        performance.pin_thread('inference')
+        self.poll_ui_events()
         self.process_frame()
+        self.update_metrics()
         self.root.mainloop()
 
     def cleanup(self):
         self.is_running = False
-        if self.cap is not None:
-            self.cap.release()
+        self.config.stop_watching()
+        self.config.flush()
+        self.pipeline.close()
         cv2.destroyAllWindows()
-        self.executor.shutdown(wait=True)
 
 
 if __name__ == "__main__":
@@ -2,10 +2,14 @@ import tkinter as tk
 from tkinter import ttk
 
 class SettingsFrame(ttk.LabelFrame):
-    def __init__(self, parent, config, on_settings_change):
+    def __init__(self, parent, config, settings_store, on_settings_change):
         super().__init__(parent, text="Configurações do Sistema", style="Custom.TLabelframe")
         self.config = config
+        # Recebe um novo snapshot imutável somente quando um valor muda
+        self.settings_store = settings_store
         self.on_settings_change = on_settings_change
+        # Evita reenviar como alteração os valores vindos de uma recarga do config
+        self._refreshing = False
         
         # Configuração de expansão do frame
         self.grid_rowconfigure(0, weight=1)
@@ -161,27 +165,42 @@ class SettingsFrame(ttk.LabelFrame):
         )
 
     def _update_setting(self, setting_name, value):
+        if self._refreshing:
+            return
         try:
             if setting_name in ['brightness', 'contrast', 'sharpness', 'alert_frequency', 'alert_duration', 'delay_time']:
                 value = int(float(value))
             elif setting_name == 'min_confidence':
                 value = float(value)
-            
+
+            current = self.settings_store.current
+            if self.settings_store.publish(**{setting_name: value}) is current:
+                # O slider se moveu sem mudar o valor inteiro; nada a publicar
+                return
             self.on_settings_change(**{setting_name: value})
         except Exception as e:
             print(f"Erro ao atualizar configuração {setting_name}: {e}")
 
+    def refresh_from_config(self):
+        """Atualiza os controles com os valores do config recarregado."""
+        saved_settings = self.config.config['camera']['default_settings']
+        alerts = self.config.config['alerts']
+        self._refreshing = True
+        try:
+            # ttk.Scale.set() dispara o callback, que também atualiza o valor exibido
+            self.brightness_scale.set(saved_settings['brightness'])
+            self.contrast_scale.set(saved_settings['contrast'])
+            self.sharpness_scale.set(saved_settings['sharpness'])
+            self.grayscale_var.set(saved_settings['grayscale'])
+            self.confidence_scale.set(self.config.config['detection']['min_confidence'])
+            self.alert_freq_scale.set(alerts['frequency'])
+            self.alert_duration_scale.set(alerts['duration'])
+            self.delay_scale.set(alerts['delay_time'])
+        finally:
+            self._refreshing = False
+
     def get_settings(self):
-        return {
-            'brightness': self.brightness_scale.get(),
-            'contrast': self.contrast_scale.get(),
-            'sharpness': self.sharpness_scale.get(),
-            'grayscale': self.grayscale_var.get(),
-            'min_confidence': self.confidence_scale.get(),
-            'alert_frequency': self.alert_freq_scale.get(),
-            'alert_duration': self.alert_duration_scale.get(),
-            'delay_time': self.delay_scale.get()
-        }
+        return self.settings_store.current.as_dict()
 
     def update_detection_status(self, status="Normal"):
         icon = "✅" if status == "Normal" else "⚠️"
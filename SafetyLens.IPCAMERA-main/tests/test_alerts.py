@@ -0,0 +1,76 @@
+import threading
+import unittest
+
+import numpy as np
+
+from src.core.alerts import Alert, AlertDispatcher, AlertSink, FakeSink
+
+
+class _BlockingSink(AlertSink):
+    """Segura o worker no primeiro alerta até `release` ser sinalizado."""
+
+    name = 'blocking'
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def handle(self, alert):
+        self.started.set()
+        self.release.wait(5)
+
+
+def _alert(camera='cam1', missing=('Sem_Capacete',)):
+    return Alert(camera, list(missing), [], np.zeros((8, 8, 3), dtype=np.uint8))
+
+
+class AlertDispatcherTest(unittest.TestCase):
+    def test_cooldown_per_camera_and_epi(self):
+        dispatcher = AlertDispatcher([FakeSink(needs_image=False)], cooldown=10.0,
+                                     cooldowns={'Sem_Luva': 2.0})
+        try:
+            self.assertEqual(dispatcher.claim('cam1', ['Sem_Capacete', 'Sem_Luva'], now=0.0),
+                             ['Sem_Capacete', 'Sem_Luva'])
+            # Mesma câmera dentro do intervalo: nada a alertar
+            self.assertEqual(dispatcher.claim('cam1', ['Sem_Capacete', 'Sem_Luva'], now=1.0), [])
+            # Outra câmera tem os próprios intervalos
+            self.assertEqual(dispatcher.claim('cam2', ['Sem_Capacete'], now=1.0), ['Sem_Capacete'])
+            # Intervalo específico do EPI vence antes do padrão
+            self.assertEqual(dispatcher.claim('cam1', ['Sem_Capacete', 'Sem_Luva'], now=3.0), ['Sem_Luva'])
+            self.assertEqual(dispatcher.claim('cam1', ['Sem_Capacete'], now=10.5), ['Sem_Capacete'])
+        finally:
+            dispatcher.close()
+
+    def test_delivers_to_sinks(self):
+        sink = FakeSink(needs_image=False)
+        dispatcher = AlertDispatcher([sink], workers=2)
+        try:
+            for camera in ('cam1', 'cam2', 'cam3'):
+                self.assertTrue(dispatcher.submit(_alert(camera)))
+            self.assertTrue(sink.wait_for(3))
+            self.assertEqual(sorted(alert.camera for alert in sink.alerts), ['cam1', 'cam2', 'cam3'])
+        finally:
+            dispatcher.close()
+
+    def test_drops_when_queue_is_full(self):
+        blocking = _BlockingSink()
+        sink = FakeSink(needs_image=False)
+        dispatcher = AlertDispatcher([blocking, sink], queue_size=1, workers=1)
+        try:
+            self.assertTrue(dispatcher.submit(_alert('cam1')))
+            self.assertTrue(blocking.started.wait(5))
+            # O worker está ocupado: um alerta cabe na fila, o seguinte é descartado
+            self.assertTrue(dispatcher.submit(_alert('cam2')))
+            self.assertFalse(dispatcher.submit(_alert('cam3')))
+            self.assertEqual(dispatcher.dropped, 1)
+
+            blocking.release.set()
+            self.assertTrue(sink.wait_for(2))
+            self.assertEqual([alert.camera for alert in sink.alerts], ['cam1', 'cam2'])
+        finally:
+            blocking.release.set()
+            dispatcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()